@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQLCompiler throughput over representative query shapes.
+
+Each query is translated to an ``ast.Select`` once; only the
+AST -> SQL step is timed, with the statement cache switched off so
+every call really compiles. Run from a checkout::
+
+    python benchmarks/bench_compiler.py [--number N]
+
+Compare two revisions by running the script against each checkout.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from functools import reduce
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydal import DAL, Field  # noqa: E402
+from pydal.ast_translate import set_to_select  # noqa: E402
+
+
+def setup_db():
+    db = DAL("sqlite:memory")
+    db.define_table(
+        "a", Field("name"), Field("n", "integer"), Field("created", "datetime")
+    )
+    db.define_table("b", Field("a_id", "reference a"), Field("name"))
+    db.define_table("c", Field("b_id", "reference b"), Field("name"))
+    db.define_table("d", Field("c_id", "reference c"), Field("name"))
+    return db
+
+
+def shapes(db):
+    a, b, c, d = db.a, db.b, db.c, db.d
+    yield "point lookup", db(a.id == 42), (a.name,), {}
+    yield "3 predicates + orderby/limit", db(
+        (a.n > 3) & (a.name.like("x%")) & (a.created != None)
+    ), (a.id, a.name, a.n), dict(orderby=~a.n | a.id, limitby=(0, 20))
+    yield "4-way join", db(a.n > 0), (a.name, b.name, c.name, d.name), dict(
+        join=[
+            b.on(b.a_id == a.id),
+            c.on(c.b_id == b.id),
+            d.on(d.c_id == c.id),
+        ]
+    )
+    yield "aggregate + groupby/having", db(a.n > 0), (
+        a.name, a.n.sum(), a.id.count()
+    ), dict(groupby=a.name, having=a.n.sum() > 10)
+    yield "belongs, 100 values", db(a.n.belongs(list(range(100)))), (a.id,), {}
+    yield "OR chain, 50 terms", db(
+        reduce(lambda x, y: x | y, [a.n == i for i in range(50)])
+    ), (a.id,), {}
+    yield "AND chain, 5000 terms", db(
+        reduce(lambda x, y: x & y, [a.n != i for i in range(5000)])
+    ), (a.id,), {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    db = setup_db()
+    db._adapter.statement_cache = None
+    compiler = db._adapter.compiler
+    for label, dbset, fields, attrs in shapes(db):
+        try:
+            node = set_to_select(dbset, fields, attrs)
+            compiler.compile_select(node)
+        except RecursionError:
+            print("%-32s %14s" % (label, "RecursionError"))
+            continue
+        # Scale the loop down for the very large shapes.
+        big = len(compiler.compile_select(node)) > 10000
+        number = max(1, args.number // 100) if big else args.number
+        best = min(
+            timeit.repeat(
+                lambda: compiler.compile_select(node),
+                number=number,
+                repeat=args.repeat,
+            )
+        )
+        print("%-32s %11.1f us/op" % (label, best / number * 1e6))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+Row parsing: driver tuples -> Rows, over 1M rows of mixed types.
+
+The raw rows are built in memory, shaped like what sqlite3 returns for
+the columns (ints, strings, ISO dates and datetimes, floats, booleans
+stored as "T"/"F", JSON text, NULLs), so only ``adapter.parse`` is
+timed. ``per-cell`` is the generic ``_parse`` loop that decides what to
+do with every value; ``cached`` is the row parser ``parse`` uses. Run
+from a checkout::
+
+    python benchmarks/bench_parse.py [--rows N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydal import DAL, Field  # noqa: E402
+
+
+def setup_db():
+    db = DAL("sqlite:memory")
+    db.define_table(
+        "item",
+        Field("name"),
+        Field("qty", "integer"),
+        Field("price", "double"),
+        Field("active", "boolean"),
+        Field("added", "date"),
+        Field("changed", "datetime"),
+        Field("data", "json"),
+        Field("note", "text"),
+    )
+    return db
+
+
+def raw_rows(n):
+    return [
+        (
+            k,
+            "item %d" % k,
+            k % 100,
+            k * 0.5,
+            "T" if k % 2 else "F",
+            "2024-01-%02d" % (k % 28 + 1),
+            "2024-01-02 10:%02d:00" % (k % 60),
+            '{"k": %d}' % k,
+            None,
+        )
+        for k in range(n)
+    ]
+
+
+def per_cell(adapter, rows, fields, colnames):
+    fields_virtual, fields_lazy, tmps = adapter._parse_expand_colnames(fields)
+    return [
+        adapter._parse(row, tmps, fields, colnames, True, False,
+                       fields_virtual, fields_lazy)
+        for row in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    db = setup_db()
+    adapter = db._adapter
+    fields = list(db.item)
+    colnames = [f.longname for f in fields]
+    rows = raw_rows(args.rows)
+    timings = []
+    for label, fn in (
+        ("per-cell", lambda: per_cell(adapter, rows, fields, colnames)),
+        ("cached", lambda: adapter.parse(rows, fields, colnames)),
+    ):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        print("%-10s %8.2f s  %6.2f us/row" % (
+            label, timings[-1], timings[-1] / args.rows * 1e6
+        ))
+    print("speed-up   %8.2fx" % (timings[0] / timings[1]))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rows operations: ``&``, ``|``, ``exclude`` and lookups by key.
+
+Two overlapping ``Rows`` of the ``bench_parse`` table (half of their
+rows in common) are combined with the hashed set operations, and
+``rows.index_by(field)`` lookups are compared with scanning the rows
+with ``find``. The list-scanning set operations they replace are
+quadratic, so they only run on ``--baseline`` rows. Run from a
+checkout::
+
+    python benchmarks/bench_rows_ops.py [--rows N] [--baseline N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_parse import raw_rows, setup_db  # noqa: E402
+
+
+def old_and(rows, other):
+    records = []
+    other_records = list(other.records)
+    for record in rows.records:
+        if record in other_records:
+            records.append(record)
+            other_records.remove(record)
+    return records
+
+
+def old_or(rows, other):
+    return rows.records + [
+        record for record in other.records if record not in rows.records
+    ]
+
+
+def old_exclude(rows, f):
+    removed = []
+    i = 0
+    while i < len(rows):
+        row = rows[i]
+        if f(row):
+            removed.append(rows.records[i])
+            del rows.records[i]
+        else:
+            i += 1
+    return removed
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def pair(adapter, fields, colnames, n):
+    raw = raw_rows(n + n // 2)
+    rows = adapter.parse(raw[:n], fields, colnames)
+    other = adapter.parse(raw[n // 2:], fields, colnames)
+    return rows, other
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--baseline", type=int, default=1000)
+    args = parser.parse_args()
+    db = setup_db()
+    adapter = db._adapter
+    fields = list(db.item)
+    colnames = [f.longname for f in fields]
+    odd = lambda row: row.id % 2
+    for n, label, ops in (
+        (args.baseline, "scanning", (
+            ("&", lambda a, b: old_and(a, b)),
+            ("|", lambda a, b: old_or(a, b)),
+            ("exclude", lambda a, b: old_exclude(a, odd)),
+        )),
+        (args.baseline, "hashed", (
+            ("&", lambda a, b: a & b),
+            ("|", lambda a, b: a | b),
+            ("exclude", lambda a, b: a.exclude(odd)),
+        )),
+        (args.rows, "hashed", (
+            ("&", lambda a, b: a & b),
+            ("|", lambda a, b: a | b),
+            ("exclude", lambda a, b: a.exclude(odd)),
+        )),
+    ):
+        for op, fn in ops:
+            rows, other = pair(adapter, fields, colnames, n)
+            print("%-8s %-8s %7d rows %9.3f s" % (
+                label, op, n, timed(lambda: fn(rows, other))
+            ))
+    rows, _ = pair(adapter, fields, colnames, args.rows)
+    keys = ["item %d" % k for k in range(0, args.rows, max(args.rows // 100, 1))]
+    scan = timed(lambda: [rows.find(lambda row, key=key: row.name == key) for key in keys])
+    start = time.perf_counter()
+    index = rows.index_by(db.item.name)
+    built = time.perf_counter() - start
+    lookup = timed(lambda: [index[key] for key in keys])
+    print("find     %d lookups in %d rows %9.3f s" % (len(keys), args.rows, scan))
+    print("index_by %d lookups in %d rows %9.3f s (+ %.3f s to build)" % (
+        len(keys), args.rows, lookup, built
+    ))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+Result row types: ``Rows`` vs ``rowtype="tuple"`` / ``"namedtuple"``.
+
+Uses the raw rows of ``bench_parse`` and times each processor over
+them, then measures (with ``tracemalloc``, on a tenth of the rows) the
+memory the parsed result holds on to. Run from a checkout::
+
+    python benchmarks/bench_rowtype.py [--rows N]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_parse import raw_rows, setup_db  # noqa: E402
+
+
+def retained(fn):
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    db = setup_db()
+    adapter = db._adapter
+    fields = list(db.item)
+    colnames = [f.longname for f in fields]
+    rows = raw_rows(args.rows)
+    sample = rows[: max(args.rows // 10, 1)]
+    results = []
+    for label, processor in (
+        ("Rows", adapter.parse),
+        ("tuple", adapter.parse_tuples),
+        ("namedtuple", adapter.parse_namedtuples),
+    ):
+        start = time.perf_counter()
+        processor(rows, fields, colnames)
+        elapsed = time.perf_counter() - start
+        memory = retained(lambda: processor(sample, fields, colnames))
+        results.append((elapsed, memory))
+        print("%-10s %8.2f s  %6.2f us/row  %8.1f MB / %d rows" % (
+            label, elapsed, elapsed / args.rows * 1e6, memory / 2.0 ** 20,
+            len(sample),
+        ))
+    for label, (elapsed, memory) in zip(("tuple", "namedtuple"), results[1:]):
+        print("%-10s %6.2fx faster, %5.2fx less memory than Rows" % (
+            label, results[0][0] / elapsed, results[0][1] / float(memory)
+        ))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
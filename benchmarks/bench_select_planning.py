@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-select Python overhead: single-table vs 4-way join.
+
+Tables hold a single row each so the time is dominated by pyDAL's own
+work (table discovery, field expansion, translation, compilation,
+colnames, parsing) rather than by SQLite. Run from a checkout::
+
+    python benchmarks/bench_select_planning.py [--number N]
+
+Compare two revisions by running the script against each checkout.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydal import DAL, Field  # noqa: E402
+
+
+def setup_db():
+    db = DAL("sqlite:memory")
+    db.define_table("a", Field("name"), Field("n", "integer"))
+    db.define_table("b", Field("a_id", "reference a"), Field("name"))
+    db.define_table("c", Field("b_id", "reference b"), Field("name"))
+    db.define_table("d", Field("c_id", "reference c"), Field("name"))
+    a = db.a.insert(name="a", n=1)
+    b = db.b.insert(a_id=a, name="b")
+    c = db.c.insert(b_id=b, name="c")
+    db.d.insert(c_id=c, name="d")
+    return db
+
+
+def cases(db):
+    def single():
+        return db((db.a.n > 0) & (db.a.name != "x")).select(db.a.id, db.a.name)
+
+    def join4():
+        return db(db.a.n > 0).select(
+            db.a.name, db.b.name, db.c.name, db.d.name,
+            join=[
+                db.b.on(db.b.a_id == db.a.id),
+                db.c.on(db.c.b_id == db.b.id),
+                db.d.on(db.d.c_id == db.c.id),
+            ],
+        )
+
+    def single_sql():
+        return db((db.a.n > 0) & (db.a.name != "x"))._select(db.a.id, db.a.name)
+
+    return [
+        ("select, single table", single),
+        ("select, 4-way join", join4),
+        ("_select (SQL only), single table", single_sql),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    db = setup_db()
+    for label, fn in cases(db):
+        fn()  # warm up (and check it runs)
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        print("%-36s %8.1f us/op" % (label, best / args.number * 1e6))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
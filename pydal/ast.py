@@ -79,6 +79,21 @@ class Literal(Node):
     type: Optional[str] = None
 
 
+@dataclass(frozen=True)
+class Param(Node):
+    """
+    A named placeholder whose value is supplied at execution time.
+
+    Produced from ``db.Param("name")`` in the DSL and used by prepared
+    statements (``Set.prepare_select``). The compiler always renders it
+    as a bound placeholder; ``type`` is the pydal field type inferred
+    from the other operand, used to adapt the value when it's bound.
+    """
+
+    name: str
+    type: Optional[str] = None
+
+
 @dataclass(frozen=True)
 class Raw(Node):
     """
@@ -172,7 +187,9 @@ class FuncCall(Node):
 
     ``name`` is one of: ``cast``, ``replace``, ``extract``, ``coalesce``,
     ``substring``, ``aggregate`` (with ``("kind", "SUM"|"AVG"|...)`` in opts),
-    ``case``, ``st_asgeojson``, ``st_dwithin``.
+    ``case``, ``st_asgeojson``, ``st_dwithin``, ``window`` (a window-only
+    function: ``("kind", "ROW_NUMBER"|"RANK"|"LAG"|...)``, only valid
+    inside a Window).
     """
 
     name: str
@@ -180,6 +197,23 @@ class FuncCall(Node):
     opts: Opts = ()
 
 
+@dataclass(frozen=True)
+class Window(Node):
+    """
+    ``func OVER (PARTITION BY ... ORDER BY ... <frame>)``.
+
+    ``func`` is an aggregate or a ``window`` FuncCall; ``order_by``
+    items may be ``invert`` UnaryOps (DESC). ``frame`` is the frame
+    clause as SQL, e.g. ``"ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT
+    ROW"``.
+    """
+
+    func: Node
+    partition_by: Tuple[Node, ...] = ()
+    order_by: Tuple[Node, ...] = ()
+    frame: Optional[str] = None
+
+
 @dataclass(frozen=True)
 class InList(Node):
     """
@@ -296,12 +330,30 @@ class Insert(Node):
     use verbatim (matches ``table._rname``). When None, the compiler
     falls back to quoting ``table``. Required for aliased writes —
     INSERT always targets the underlying physical table, not the alias.
+    ``returning`` names columns of the written rows to send back.
     """
 
     table: str
     cols: Tuple[str, ...]
     rows: Tuple[Tuple[Node, ...], ...]
     sqlsafe: Optional[str] = None
+    returning: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class Upsert(Node):
+    """
+    INSERT that updates the existing row instead when it collides with
+    a unique constraint.
+
+    ``conflict`` names the columns of that constraint; ``update`` the
+    columns overwritten with the incoming row's values. An empty
+    ``update`` leaves the existing row untouched.
+    """
+
+    insert: Insert
+    conflict: Tuple[str, ...]
+    update: Tuple[str, ...] = ()
 
 
 @dataclass(frozen=True)
@@ -314,21 +366,39 @@ class Update(Node):
     UPDATE/DELETE typically pass through ``dialect.writing_alias`` so
     the alias is preserved (``"orig" AS "alias"``) or rejected on
     dialects that don't allow aliased writes (SQLite).
+    ``returning`` is as in Insert (the rows after the update).
     """
 
     table: str
     sets: Tuple[Tuple[str, Node], ...]
     where: Optional[Node] = None
     sqlsafe: Optional[str] = None
+    returning: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class BulkUpdate(Node):
+    """
+    UPDATE of many rows, each to its own values: every row of ``rows``
+    is the value of the ``key`` column followed by one value per column
+    of ``cols``. ``sqlsafe`` is as in Insert.
+    """
+
+    table: str
+    key: str
+    cols: Tuple[str, ...]
+    rows: Tuple[Tuple[Node, ...], ...]
+    sqlsafe: Optional[str] = None
 
 
 @dataclass(frozen=True)
 class Delete(Node):
-    """DELETE statement."""
+    """DELETE statement; ``returning`` as in Insert (the deleted rows)."""
 
     table: str
     where: Optional[Node] = None
     sqlsafe: Optional[str] = None
+    returning: Tuple[str, ...] = ()
 
 
 @dataclass(frozen=True)
@@ -352,19 +422,23 @@ class Count(Node):
 NODE_TYPES: Tuple[type, ...] = (
     FieldRef,
     Literal,
+    Param,
     Raw,
     Star,
     TableRef,
     BinOp,
     UnaryOp,
     FuncCall,
+    Window,
     InList,
     Aliased,
     Join,
     Cte,
     Select,
     Insert,
+    Upsert,
     Update,
+    BulkUpdate,
     Delete,
     Count,
 )
@@ -0,0 +1,531 @@
+"""
+Algebraic simplification of statement ASTs.
+
+An optional pass that sits between the translator (``set_to_select`` and
+friends) and the compiler. Generated filters — RestAPI query strings,
+``_common_filter`` callbacks, record-versioning ``is_active`` guards —
+tend to arrive with redundant structure: the same predicate twice, a
+``TRUE`` and-ed in for convenience, a run of ``x == 1 | x == 2 | ...``.
+The rewrites here are pure AST -> AST and never change the result set:
+
+* nested ``and``/``or`` chains are flattened; long ones are rebuilt as
+  a balanced tree (a 5000-term ``reduce(operator.or_, ...)`` nests 13
+  deep instead of 5000, which is what SQLite's parser can take);
+* duplicate terms are dropped (first occurrence wins);
+* ``Literal(True)``/``Literal(False)`` terms are folded away, and a
+  WHERE/HAVING that folds to ``TRUE`` disappears;
+* inside an ``or``, equality tests of one column against scalar
+  literals (and literal ``IN`` lists on it) merge into one ``InList``;
+* a ``LEFT JOIN`` whose table nothing else references is dropped, when
+  its ``ON`` matches a unique column (so it can't multiply rows);
+* comparisons on ``year()`` of a date/datetime column become half-open
+  ranges on the column itself (``year(d) == 2024`` is ``d >= 2024-01-01
+  AND d < 2025-01-01``), as do ``year() == Y`` and-ed with
+  ``month() == M`` (and ``day() == D``), so an index on the column can
+  be used;
+* ``lower(col) == 'x'`` (``upper(col) == 'X'``) becomes
+  ``col = 'x' COLLATE <nocase>`` on backends with an ASCII
+  case-insensitive collation.
+
+The AST doesn't carry schema information, so the caller supplies it:
+``unique(tablename, fieldname) -> bool`` enables join pruning,
+``column_type(tablename, fieldname) -> type`` the date-part rewrites and
+``nocase`` (a collation name) the case-folding one. The SQL adapter
+passes all three from the table definitions and its compiler.
+
+Every decision may depend on literal values, so the pass runs before the
+statement cache computes its fingerprint — the cache then keys on the
+simplified shape.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, cast
+
+from . import ast
+from .compilers.cache import fingerprint
+
+
+# ``unique(tablename, fieldname)``: True when the column holds unique values.
+Unique = Callable[[str, str], bool]
+# ``column_type(tablename, fieldname)``: the pydal type of a column, or None.
+ColumnType = Callable[[str, str], Optional[str]]
+
+TRUE = ast.Literal(True)
+FALSE = ast.Literal(False)
+
+# Column types whose ``=`` and ``IN`` renderings agree value for value.
+# JSON, list:* and the geo types have bespoke comparisons and stay as-is.
+_SCALAR_TYPES = frozenset(
+    {
+        "id", "string", "text", "password",
+        "integer", "bigint", "float", "double", "boolean",
+        "date", "time", "datetime",
+    }
+)
+
+
+# Longest and/or chain kept in the left-deep shape; longer ones are
+# rebuilt as a balanced tree.
+_MAX_DEPTH = 32
+
+
+# Comparisons on ``year(col)`` with their range form on ``col``: which
+# year's first instant is the bound, and the operator against it.
+_YEAR_BOUNDS = {
+    "lt": ((0, "lt"),),
+    "lte": ((1, "lt"),),
+    "gt": ((1, "gte"),),
+    "gte": ((0, "gte"),),
+    "eq": ((0, "gte"), (1, "lt")),
+}
+
+
+def _never(_node) -> bool:
+    return False
+
+
+def _is_const(node: Any, value: bool) -> bool:
+    return (
+        node.__class__ is ast.Literal
+        and node.type is None
+        and node.value is value
+    )
+
+
+def _scalar_literal(node: Any) -> bool:
+    if node.__class__ is not ast.Literal or node.value is None:
+        return False
+    t = node.type
+    return isinstance(t, str) and (
+        t in _SCALAR_TYPES or t.startswith("reference ") or t.startswith("decimal")
+    )
+
+
+def _terms(node: ast.Node, op: str) -> List[ast.Node]:
+    """The operands of a (possibly nested) ``op`` chain, left to right."""
+    terms: List[ast.Node] = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if item.__class__ is ast.BinOp and item.op == op:
+            stack.append(item.right)
+            stack.append(item.left)
+        else:
+            terms.append(item)
+    return terms
+
+
+def _rebuild(op: str, terms: List[ast.Node]) -> ast.Node:
+    """
+    Join ``terms`` with ``op``, keeping their order: left-deep (the shape
+    ``&``/``|`` build) up to ``_MAX_DEPTH`` terms, pairwise beyond that.
+    """
+    if len(terms) <= _MAX_DEPTH:
+        node = terms[0]
+        for term in terms[1:]:
+            node = ast.BinOp(op, node, term)
+        return node
+    while len(terms) > 1:
+        paired: List[ast.Node] = [
+            ast.BinOp(op, terms[i], terms[i + 1]) for i in range(0, len(terms) - 1, 2)
+        ]
+        if len(terms) % 2:
+            paired.append(terms[-1])
+        terms = paired
+    return terms[0]
+
+
+def _term_key(node: ast.Node) -> Any:
+    """Equality key for dedupe: a fingerprint keeps ``1``/``True``/``1.0`` apart."""
+    key = fingerprint(node, _never)[0]
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable literal value (a list, ...): never a duplicate.
+        return id(node)
+    return key
+
+
+def _eq_column(node: ast.Node) -> Optional[ast.FieldRef]:
+    """The column of ``col = literal`` or ``col IN (literals)``, else None."""
+    if node.__class__ is ast.BinOp:
+        if (
+            node.op == "eq"
+            and not node.opts
+            and node.left.__class__ is ast.FieldRef
+            and _scalar_literal(node.right)
+        ):
+            return node.left
+    elif node.__class__ is ast.InList:
+        if (
+            node.expr.__class__ is ast.FieldRef
+            and node.values
+            and all(_scalar_literal(v) for v in node.values)
+        ):
+            return node.expr
+    return None
+
+
+def _merge_eqs(terms: List[ast.Node]) -> List[ast.Node]:
+    """Fold ``c = v1 OR c = v2 OR c IN (v3)`` into ``c IN (v1, v2, v3)``."""
+    groups: Dict[ast.FieldRef, List[int]] = {}
+    for i, term in enumerate(terms):
+        column = _eq_column(term)
+        if column is not None:
+            groups.setdefault(column, []).append(i)
+    drop: Set[int] = set()
+    for column, positions in groups.items():
+        if len(positions) < 2:
+            continue
+        values: List[ast.Node] = []
+        seen = set()
+        for i in positions:
+            term = terms[i]
+            if isinstance(term, ast.InList):
+                literals = cast(Tuple[ast.Literal, ...], term.values)
+            else:
+                literals = (cast(ast.Literal, cast(ast.BinOp, term).right),)
+            for value in literals:
+                key = (value.type, type(value.value), value.value)
+                if key not in seen:
+                    seen.add(key)
+                    values.append(value)
+        if len(values) > 1:
+            terms[positions[0]] = ast.InList(column, tuple(values))
+        drop.update(positions[1:])
+    return [t for i, t in enumerate(terms) if i not in drop] if drop else terms
+
+
+def _references(*nodes: Any) -> Tuple[Set[str], bool]:
+    """
+    Table names referenced anywhere under ``nodes`` (nested selects
+    included), plus whether the set is open-ended — a ``Raw`` fragment
+    or an unqualified ``*`` could mention any table.
+    """
+    names: Set[str] = set()
+    stack = [n for n in nodes if n is not None]
+    while stack:
+        item = stack.pop()
+        cls = item.__class__
+        if cls is ast.FieldRef:
+            names.add(item.table)
+        elif cls is ast.Raw:
+            return names, True
+        elif cls is ast.Star:
+            if item.table is None:
+                return names, True
+            names.add(item.table)
+        elif cls is ast.TableRef:
+            names.add(item.alias or item.name)
+        elif isinstance(item, ast.Node):
+            stack.extend(
+                getattr(item, f.name) for f in dataclasses.fields(cast(Any, item))
+            )
+        elif cls is tuple or cls is list:
+            stack.extend(item)
+    return names, False
+
+
+def _instant(column_type: str, year: int, month: int = 1, day: int = 1) -> ast.Literal:
+    """Midnight of the given day, typed for a ``date``/``datetime`` column."""
+    if column_type == "date":
+        return ast.Literal(datetime.date(year, month, day), "date")
+    return ast.Literal(datetime.datetime(year, month, day), "datetime")
+
+
+class _Optimizer:
+    def __init__(
+        self,
+        unique: Optional[Unique],
+        column_type: Optional[ColumnType],
+        nocase: Optional[str],
+    ):
+        self.unique = unique
+        self.column_type = column_type
+        self.nocase = nocase
+
+    # ------------------------------------------------------------ statements
+
+    def statement(self, n: ast.Node) -> ast.Node:
+        if isinstance(n, ast.Select):
+            return self.select(n)
+        if isinstance(n, ast.Count):
+            query = self.select(n.query)
+            return n if query is n.query else dataclasses.replace(n, query=query)
+        if isinstance(n, (ast.Update, ast.Delete)):
+            where = self.predicate(n.where)
+            return n if where is n.where else dataclasses.replace(n, where=where)
+        return self.expr(n)
+
+    def select(self, n: ast.Select) -> ast.Select:
+        changes: Dict[str, Any] = {}
+        for name in ("where", "having"):
+            value = getattr(n, name)
+            new = self.predicate(value)
+            if new is not value:
+                changes[name] = new
+        for name in ("fields", "sources", "joins", "groupby", "orderby", "with_cte"):
+            value = getattr(n, name)
+            new = self.expr(value)
+            if new is not value:
+                changes[name] = new
+        if isinstance(n.distinct, ast.Node):
+            distinct = self.expr(n.distinct)
+            if distinct is not n.distinct:
+                changes["distinct"] = distinct
+        if changes:
+            n = dataclasses.replace(n, **changes)
+        return self.prune_left_joins(n)
+
+    def predicate(self, node: Optional[ast.Node]) -> Optional[ast.Node]:
+        """Simplify a WHERE/HAVING condition; one that is always true is dropped."""
+        if node is None:
+            return None
+        node = self.expr(node)
+        return None if _is_const(node, True) else node
+
+    # ----------------------------------------------------------- expressions
+
+    def expr(self, node: Any) -> Any:
+        """Simplify every condition under ``node``, rebuilding only what changed."""
+        cls = node.__class__
+        if cls is ast.BinOp:
+            if node.op in ("and", "or"):
+                return self.logical(node)
+            rewritten = self.sargable(node)
+            if rewritten is not None:
+                return rewritten
+        if cls is ast.UnaryOp and node.op == "not":
+            operand = self.expr(node.operand)
+            if _is_const(operand, True):
+                return FALSE
+            if _is_const(operand, False):
+                return TRUE
+            return node if operand is node.operand else ast.UnaryOp("not", operand, node.opts)
+        if cls is ast.Select:
+            return self.select(node)
+        if cls is tuple:
+            items = tuple(self.expr(item) for item in node)
+            return node if all(a is b for a, b in zip(items, node)) else items
+        if not isinstance(node, ast.Node) or cls in (
+            ast.FieldRef, ast.Literal, ast.Param, ast.Raw, ast.Star, ast.TableRef,
+        ):
+            return node
+        changes = {}
+        for f in dataclasses.fields(cast(Any, node)):
+            value = getattr(node, f.name)
+            new = self.expr(value)
+            if new is not value:
+                changes[f.name] = new
+        return dataclasses.replace(cast(Any, node), **changes) if changes else node
+
+    def logical(self, node: ast.BinOp) -> ast.Node:
+        op = node.op
+        # ``x AND FALSE`` is FALSE, ``x OR TRUE`` is TRUE; the other
+        # constant is the identity and simply drops out.
+        absorbing = op == "or"
+        original = _terms(node, op)
+        terms: List[ast.Node] = []
+        for term in self.date_ranges(original) if op == "and" else original:
+            term = self.expr(term)
+            if term.__class__ is ast.BinOp and term.op == op:
+                terms.extend(_terms(term, op))
+            else:
+                terms.append(term)
+        kept: List[ast.Node] = []
+        for term in terms:
+            if _is_const(term, absorbing):
+                return TRUE if absorbing else FALSE
+            if not _is_const(term, not absorbing):
+                kept.append(term)
+        if op == "or":
+            kept = _merge_eqs(kept)
+        seen = set()
+        unique_terms = []
+        for term in kept:
+            key = _term_key(term)
+            if key not in seen:
+                seen.add(key)
+                unique_terms.append(term)
+        if not unique_terms:
+            return FALSE if absorbing else TRUE
+        if (
+            len(unique_terms) == len(original) <= _MAX_DEPTH
+            and all(a is b for a, b in zip(unique_terms, original))
+        ):
+            return node
+        return _rebuild(op, unique_terms)
+
+    # ----------------------------------------------------------- sargability
+
+    def date_part(self, node: ast.Node) -> Optional[Tuple[str, ast.FieldRef, str, int]]:
+        """``(unit, column, column type, value)`` for ``<unit>(column) <op> int``."""
+        if self.column_type is None or not isinstance(node, ast.BinOp):
+            return None
+        fn, value = node.left, node.right
+        if (
+            fn.__class__ is not ast.FuncCall
+            or fn.name != "extract"
+            or len(fn.args) != 1
+            or fn.args[0].__class__ is not ast.FieldRef
+            or value.__class__ is not ast.Literal
+            or value.value.__class__ is not int
+        ):
+            return None
+        unit = dict(fn.opts).get("unit")
+        if unit not in ("year", "month", "day"):
+            return None
+        column = fn.args[0]
+        ctype = self.column_type(column.table, column.name)
+        if ctype not in ("date", "datetime"):
+            return None
+        return unit, column, ctype, value.value
+
+    def sargable(self, node: ast.BinOp) -> Optional[ast.Node]:
+        """An index-friendly equivalent of one comparison, or None."""
+        if node.op in _YEAR_BOUNDS:
+            part = self.date_part(node)
+            if part is not None and part[0] == "year":
+                _, column, ctype, year = part
+                if not datetime.MINYEAR <= year < datetime.MAXYEAR:
+                    return None
+                return _rebuild("and", [
+                    ast.BinOp(op, column, _instant(ctype, year + offset))
+                    for offset, op in _YEAR_BOUNDS[node.op]
+                ])
+        if node.op == "eq" and self.nocase and not node.opts:
+            fn, value = node.left, node.right
+            if (
+                fn.__class__ is ast.UnaryOp
+                and fn.op in ("lower", "upper")
+                and fn.operand.__class__ is ast.FieldRef
+                and value.__class__ is ast.Literal
+                and isinstance(value.value, str)
+                and value.value.isascii()
+                and value.value == getattr(value.value, fn.op)()
+            ):
+                return ast.BinOp(
+                    "eq", fn.operand, value, opts=(("collate", self.nocase),)
+                )
+        return None
+
+    def date_ranges(self, terms: List[ast.Node]) -> List[ast.Node]:
+        """
+        Within one conjunction, fold ``year(c) == Y AND month(c) == M``
+        (plus an optional ``day(c) == D``) into one range on ``c``.
+        """
+        found: Dict[ast.FieldRef, Dict[str, Tuple[int, str, int]]] = {}
+        for i, term in enumerate(terms):
+            if term.__class__ is ast.BinOp and term.op == "eq":
+                part = self.date_part(term)
+                if part is not None:
+                    unit, column, ctype, value = part
+                    found.setdefault(column, {}).setdefault(unit, (i, ctype, value))
+        replace: Dict[int, List[ast.Node]] = {}
+        for column, units in found.items():
+            if "year" not in units or "month" not in units:
+                continue
+            (i, ctype, year), month = units["year"], units["month"][2]
+            try:
+                if "day" in units:
+                    start = datetime.date(year, month, units["day"][2])
+                    end = start + datetime.timedelta(days=1)
+                else:
+                    start = datetime.date(year, month, 1)
+                    end = datetime.date(year + month // 12, month % 12 + 1, 1)
+            except (ValueError, OverflowError):
+                # No such day (or past year 9999): leave it to the database.
+                continue
+            replace[i] = [
+                ast.BinOp("gte", column, _instant(ctype, start.year, start.month, start.day)),
+                ast.BinOp("lt", column, _instant(ctype, end.year, end.month, end.day)),
+            ]
+            for unit in ("month", "day"):
+                if unit in units:
+                    replace[units[unit][0]] = []
+        if not replace:
+            return terms
+        out: List[ast.Node] = []
+        for i, term in enumerate(terms):
+            out.extend(replace.get(i, (term,)))
+        return out
+
+    # ----------------------------------------------------------------- joins
+
+    def prune_left_joins(self, n: ast.Select) -> ast.Select:
+        """Drop LEFT JOINs that contribute nothing and match at most one row."""
+        if self.unique is None or not any(j.kind == "left" for j in n.joins):
+            return n
+        used, open_ended = _references(
+            n.fields, n.sources, n.where, n.groupby, n.having, n.orderby,
+            n.distinct, n.with_cte,
+        )
+        if open_ended:
+            return n
+        joins = list(n.joins)
+        pruned = True
+        while pruned:
+            pruned = False
+            for join in reversed(joins):
+                if join.kind != "left" or join.target.__class__ is not ast.TableRef:
+                    continue
+                name = join.target.alias or join.target.name
+                if name in used:
+                    continue
+                others, open_ended = _references(
+                    *[(j.target, j.on) for j in joins if j is not join]
+                )
+                if open_ended or name in others:
+                    continue
+                if self._matches_one(join, name):
+                    joins.remove(join)
+                    pruned = True
+                    break
+        if len(joins) == len(n.joins):
+            return n
+        return dataclasses.replace(n, joins=tuple(joins))
+
+    def _matches_one(self, join: ast.Join, name: str) -> bool:
+        """True when ``join.on`` pins a unique column of the joined table."""
+        unique = self.unique
+        if join.on is None or unique is None:
+            return False
+        # prune_left_joins only asks about plain table targets
+        target = cast(ast.TableRef, join.target)
+        for term in _terms(join.on, "and"):
+            if term.__class__ is not ast.BinOp or term.op != "eq":
+                continue
+            for mine, other in ((term.left, term.right), (term.right, term.left)):
+                if mine.__class__ is not ast.FieldRef or mine.table != name:
+                    continue
+                names, open_ended = _references(other)
+                if (
+                    not open_ended
+                    and name not in names
+                    and unique(target.name, mine.name)
+                ):
+                    return True
+        return False
+
+
+def optimize(
+    node: ast.Node,
+    unique: Optional[Unique] = None,
+    column_type: Optional[ColumnType] = None,
+    nocase: Optional[str] = None,
+) -> ast.Node:
+    """
+    Return a simplified, semantically equivalent copy of ``node``.
+
+    Accepts any statement (``Select``, ``Count``, ``Update``, ``Delete``)
+    or a bare expression. Sub-trees that don't change are returned as
+    the very same objects. ``unique``, ``column_type`` and ``nocase``
+    enable the schema-dependent rewrites (see the module docstring).
+    """
+    return _Optimizer(unique, column_type, nocase).statement(node)
+
+
+__all__ = ["optimize"]
@@ -18,11 +18,11 @@ left as a placeholder until the statement-level translator lands.
 
 from __future__ import annotations
 
-from typing import Any, Mapping, Optional, Sequence, Tuple
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 
 from . import ast
 from .helpers.methods import merge_tablemaps, use_common_filters, xorify
-from .objects import DialectOp, Expression, Field, Query, Select, Table
+from .objects import DialectOp, Expression, Field, Param, Query, Select, Table
 
 
 # Op names that translate as straight BinOp(name, left, right) with no
@@ -81,10 +81,11 @@ def to_ast(value: Any, type_hint: Optional[str] = None) -> ast.Node:
 
     Accepts ``Field``, ``Expression``, ``Query``, ``Select`` (pydal's
     ``nested_select`` object), an already-built ``ast.Node`` (from
-    ``Set.subselect``), plus plain Python values (treated as
-    ``Literal``). ``type_hint`` is the expected pydal type for primitive
-    values; it propagates through to ``Literal.type`` so the compiler
-    can pick the right representation.
+    ``Set.subselect``), ``db.Param`` placeholders (as ``ast.Param``),
+    plus plain Python values (treated as ``Literal``). ``type_hint`` is
+    the expected pydal type for primitive values; it propagates through
+    to ``Literal.type`` so the compiler can pick the right
+    representation.
     """
     if isinstance(value, ast.Node):
         # Already an AST node (e.g. from set.subselect()). Pass through.
@@ -99,9 +100,47 @@ def to_ast(value: Any, type_hint: Optional[str] = None) -> ast.Node:
         return _select_to_ast(value)
     if isinstance(value, (Expression, Query)):
         return _expr_to_ast(value)
+    if isinstance(value, Param):
+        # Named placeholder: the type comes from the other operand unless
+        # the caller pinned one on ``db.Param(name, type)``.
+        return ast.Param(value.name, value.type or type_hint)
     return ast.Literal(value, type_hint)
 
 
+_LOGICAL_OPS = {"_and": "and", "_or": "or"}
+
+
+def _is_logical(value: Any) -> bool:
+    return (
+        isinstance(value, (Expression, Query))
+        and getattr(value.op, "__name__", None) in _LOGICAL_OPS
+    )
+
+
+def _logical_to_ast(expr) -> ast.Node:
+    """
+    Translate a tree of ``&``/``|`` queries into nested and/or BinOps.
+
+    ``reduce(operator.or_, many_queries)`` nests one level per term, so
+    this walks the tree with an explicit stack instead of recursing
+    through ``to_ast``; the leaves still go through ``to_ast``.
+    """
+    out: List[ast.Node] = []
+    todo: List[Tuple[Any, bool]] = [(expr, False)]
+    while todo:
+        value, operands_done = todo.pop()
+        if operands_done:
+            right = out.pop()
+            out[-1] = ast.BinOp(_LOGICAL_OPS[value.op.__name__], out[-1], right)
+        elif _is_logical(value):
+            todo.append((value, True))
+            todo.append((value.second, False))
+            todo.append((value.first, False))
+        else:
+            out.append(to_ast(value))
+    return out[0]
+
+
 def _select_to_ast(sel: Select) -> ast.Node:
     """
     Translate pydal's ``Select`` (from ``nested_select``) into ast.Select.
@@ -145,10 +184,8 @@ def _expr_to_ast(expr) -> ast.Node:
         return ast.FuncCall(repr(op), _args_of(f, s))
 
     # ---------- logical ----------
-    if name == "_and":
-        return ast.BinOp("and", to_ast(f), to_ast(s))
-    if name == "_or":
-        return ast.BinOp("or", to_ast(f), to_ast(s))
+    if name in _LOGICAL_OPS:
+        return _logical_to_ast(expr)
     if name == "_not":
         return ast.UnaryOp("not", to_ast(f))
 
@@ -237,6 +274,26 @@ def _expr_to_ast(expr) -> ast.Node:
         # second is a kind string: "SUM", "AVG", "MIN", "MAX", "ABS"
         return ast.FuncCall("aggregate", (to_ast(f),), opts=(("kind", s),))
 
+    if name == "window":
+        # second is (partition_by, orderby, frame); see Expression.over
+        partition_by, orderby, frame = s
+        return ast.Window(
+            to_ast(f),
+            tuple(to_ast(x) for x in partition_by),
+            tuple(to_ast(x) for x in orderby),
+            frame,
+        )
+
+    if name == "window_function":
+        # second is (kind, offset, default); first the operand, if any
+        kind, offset, default = s
+        args: Tuple[ast.Node, ...] = () if f is None else (to_ast(f),)
+        if offset is not None:
+            args += (to_ast(offset, type_hint="integer"),)
+            if default is not None:
+                args += (to_ast(default, type_hint=_field_type(f)),)
+        return ast.FuncCall("window", args, opts=(("kind", kind),))
+
     if name == "cast":
         # second is the destination SQL type fragment
         return ast.FuncCall("cast", (to_ast(f),), opts=(("to", s),))
@@ -316,6 +373,70 @@ def _args_of(f, s):
 _UNSUPPORTED_SELECT_ATTRS = ("with_cte", "cte_collector")
 
 
+class SelectPlan(NamedTuple):
+    """
+    Everything a select needs before it hits the cursor, computed in a
+    single pass by ``plan_select``.
+
+    * ``node``: the ``ast.Select`` to compile.
+    * ``fields``: the expanded field list (``SQLALL`` resolved).
+    * ``colnames``: result column names, as ``_select_wcols`` returns.
+    * ``tablemap``: tables of the query and fields (after common filters).
+    * ``parse_plan``: ``adapter._parse_expand_colnames(fields)``, ready
+      for ``adapter._parse_with_plan``.
+    """
+
+    node: ast.Select
+    fields: List[Any]
+    colnames: List[str]
+    tablemap: Dict[str, Any]
+    parse_plan: Tuple[Any, ...]
+
+
+def plan_select(
+    s,
+    fields=(),
+    attrs: Optional[Mapping[str, Any]] = None,
+) -> SelectPlan:
+    """
+    Translate ``Set.select(*fields, **attrs)`` into a ``SelectPlan``.
+
+    Table discovery and field expansion run once and feed both the AST
+    and the colnames; ``fields`` may already be expanded (``Set.select``
+    does it) in which case the expansion is a no-op.
+    """
+    attrs = dict(attrs) if attrs else {}
+    node, expanded, tablemap = _translate_select(s, fields, attrs, False)
+    adapter = s.db._adapter
+    query_env = None
+    colnames = []
+    for field in expanded:
+        if query_env is None and not isinstance(field, Field):
+            # Only expressions need the scope to render their colname.
+            outer_scoped = list(attrs.get("outer_scoped") or ())
+            scope = merge_tablemaps(
+                adapter.tables(
+                    s.query, attrs.get("join"), attrs.get("left"),
+                    attrs.get("orderby"), attrs.get("groupby"),
+                ),
+                tablemap,
+            )
+            for item in outer_scoped:
+                scope.pop(item, None)
+            query_env = dict(
+                current_scope=outer_scoped + list(scope),
+                parent_scope=outer_scoped,
+            )
+        colnames.append(adapter._colexpand(field, query_env))
+    return SelectPlan(
+        node=node,
+        fields=expanded,
+        colnames=colnames,
+        tablemap=tablemap,
+        parse_plan=adapter._parse_expand_colnames(expanded),
+    )
+
+
 def set_to_select(
     s,
     fields=(),
@@ -341,6 +462,16 @@ def set_to_select(
       * simultaneous ``join=`` and ``left=`` (uncommon)
     """
     attrs = dict(attrs) if attrs else {}
+    return _translate_select(s, fields, attrs, _in_cte_body)[0]
+
+
+def _translate_select(s, fields, attrs, _in_cte_body):
+    """
+    Shared body of ``set_to_select``/``plan_select``.
+
+    Returns ``(node, expanded_fields, tablemap)``. ``attrs`` is a
+    private copy and may be mutated.
+    """
     # ``correlated`` is a per-Select hint, not a SQL clause; pop it
     # before validation and apply at the end. Default True matches the
     # ast.Select default.
@@ -361,13 +492,9 @@ def set_to_select(
             "set_to_select: simultaneous join= and left= not yet supported"
         )
 
-    # ---- 1) expand_all needs the WIDE tablemap (including joins) so
-    # SQLALL placeholders can resolve. ----
-    expand_scope = adapter.tables(
-        query, join_param, left_param,
-        attrs.get("orderby"), attrs.get("groupby"),
-    )
-    expanded_fields = list(adapter.expand_all(fields, expand_scope))
+    # ---- 1) expansion needs the WIDE tablemap (including joins) so
+    # SQLALL placeholders can resolve; skipped for concrete fields. ----
+    expanded_fields = adapter.expand_select(query, fields, attrs)
 
     # ---- 2) but ``query_tables`` (drives default-orderby-on-limit etc.)
     # is captured from JUST query+fields, mirroring _select_wcols. ----
@@ -422,7 +549,7 @@ def set_to_select(
             distinct = xorify(distinct)
         ast_distinct = to_ast(distinct)
 
-    return ast.Select(
+    node = ast.Select(
         fields=ast_fields,
         sources=sources,
         joins=joins,
@@ -437,6 +564,7 @@ def set_to_select(
         correlated=bool(correlated_flag),
         outer_scope=tuple(attrs.get("outer_scoped") or ()),
     )
+    return node, expanded_fields, tablemap
 
 
 def _build_from_clause(adapter, tablemap, query_tables, join_param, left_param):
@@ -525,14 +653,16 @@ def _join_from_on(kind: str, expr, adapter) -> ast.Join:
     )
 
 
-def table_to_insert(table: Table, op_values: Sequence) -> ast.Insert:
+def table_to_insert(
+    table: Table, op_values: Sequence, returning: Sequence[str] = ()
+) -> ast.Insert:
     """
     Translate ``Table._insert(...)``'s op_values list into ast.Insert.
 
     ``sqlsafe`` is set from ``table._rname`` — INSERT always targets the
     underlying physical table, ignoring any DSL-level alias (matching
     legacy ``SQLAdapter._insert`` which passes ``table._rname`` to the
-    dialect directly).
+    dialect directly). ``returning`` is as in table_to_insert_many.
     """
     cols = tuple(field.name for field, _ in op_values)
     row = tuple(to_ast(value, type_hint=field.type) for field, value in op_values)
@@ -541,10 +671,95 @@ def table_to_insert(table: Table, op_values: Sequence) -> ast.Insert:
         cols=cols,
         rows=(row,) if row else (),
         sqlsafe=table._rname,
+        returning=tuple(returning),
+    )
+
+
+def table_to_insert_many(
+    table: Table, rows: Sequence[Sequence], returning: Sequence[str] = ()
+) -> ast.Insert:
+    """
+    Translate several ``op_values`` lists into one multi-row ast.Insert.
+
+    Every row must set the same columns, in the same order. ``returning``
+    names the columns to read back from the inserted rows.
+    """
+    cols = tuple(field.name for field, _ in rows[0])
+    if not cols:
+        raise ValueError("table_to_insert_many: rows set no columns")
+    values = []
+    Literal, dsl = ast.Literal, (ast.Node, Field, Select, Expression, Query, Param)
+    for op_values in rows:
+        if tuple(field.name for field, _ in op_values) != cols:
+            raise ValueError("table_to_insert_many: rows set different columns")
+        # Plain values skip ``to_ast``'s isinstance chain.
+        values.append(
+            tuple(
+                to_ast(value, field.type)
+                if isinstance(value, dsl)
+                else Literal(value, field.type)
+                for field, value in op_values
+            )
+        )
+    return ast.Insert(
+        table=table._dalname,
+        cols=cols,
+        rows=tuple(values),
+        sqlsafe=table._rname,
+        returning=tuple(returning),
+    )
+
+
+def table_to_upsert(
+    table: Table,
+    conflict: Sequence[str],
+    rows: Sequence[Sequence],
+    update: Sequence[str] = (),
+) -> ast.Upsert:
+    """
+    Translate ``op_values`` rows into an ast.Upsert on the ``conflict``
+    columns, overwriting the ``update`` columns of an existing row.
+    """
+    return ast.Upsert(
+        insert=table_to_insert_many(table, rows),
+        conflict=tuple(conflict),
+        update=tuple(update),
+    )
+
+
+def table_to_bulk_update(
+    table: Table, key: Field, rows: Sequence[Sequence]
+) -> ast.BulkUpdate:
+    """
+    Translate ``op_values`` lists that start with the ``key`` field and
+    set the same columns into one ast.BulkUpdate.
+    """
+    cols = tuple(field.name for field, _ in rows[0][1:])
+    if not cols:
+        raise ValueError("table_to_bulk_update: rows set no columns")
+    values = []
+    Literal, dsl = ast.Literal, (ast.Node, Field, Select, Expression, Query, Param)
+    for op_values in rows:
+        if tuple(field.name for field, _ in op_values[1:]) != cols:
+            raise ValueError("table_to_bulk_update: rows set different columns")
+        values.append(
+            tuple(
+                to_ast(value, field.type)
+                if isinstance(value, dsl)
+                else Literal(value, field.type)
+                for field, value in op_values
+            )
+        )
+    return ast.BulkUpdate(
+        table=table._dalname,
+        key=key.name,
+        cols=cols,
+        rows=tuple(values),
+        sqlsafe=table._rname,
     )
 
 
-def set_to_update(s, op_values: Sequence) -> ast.Update:
+def set_to_update(s, op_values: Sequence, returning: Sequence[str] = ()) -> ast.Update:
     """
     Translate ``Set._update(**fields)`` into ast.Update.
 
@@ -552,7 +767,8 @@ def set_to_update(s, op_values: Sequence) -> ast.Update:
     are propagated into Literal nodes so the compiler picks the right
     representation. ``sqlsafe`` is pre-baked from
     ``dialect.writing_alias`` so SQLite's "no aliased writes" rule
-    fires at translation time, same as the legacy path.
+    fires at translation time, same as the legacy path. ``returning``
+    names the columns to read back from the updated rows.
     """
     db = s.db
     adapter = db._adapter
@@ -574,15 +790,15 @@ def set_to_update(s, op_values: Sequence) -> ast.Update:
         sets=sets,
         where=to_ast(query) if query else None,
         sqlsafe=sqlsafe,
+        returning=tuple(returning),
     )
 
 
-def set_to_delete(s) -> ast.Delete:
+def set_to_delete(s, returning: Sequence[str] = ()) -> ast.Delete:
     """
     Translate ``Set._delete()`` into ast.Delete.
 
-    ``sqlsafe`` follows the same rule as set_to_update: pre-baked from
-    ``dialect.writing_alias``.
+    ``sqlsafe`` and ``returning`` follow the same rules as set_to_update.
     """
     db = s.db
     adapter = db._adapter
@@ -595,6 +811,7 @@ def set_to_delete(s) -> ast.Delete:
         table=table._dalname,
         where=to_ast(query) if query else None,
         sqlsafe=sqlsafe,
+        returning=tuple(returning),
     )
 
 
@@ -769,10 +986,15 @@ def _geofy(field):
 
 
 __all__ = [
+    "SelectPlan",
     "to_ast",
+    "plan_select",
     "set_to_select",
     "set_to_update",
     "set_to_delete",
     "set_to_count",
     "table_to_insert",
+    "table_to_insert_many",
+    "table_to_upsert",
+    "table_to_bulk_update",
 ]
@@ -22,17 +22,21 @@ Per-backend code lives in ``pydal.backends.<name>``; each backend file imports
 from this module and registers its concrete classes with the four dispatchers.
 """
 
+import copy
 import json
 import re
 import sys
 import types
+from array import array
 from base64 import b64decode, b64encode
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, namedtuple
 from contextlib import contextmanager
+from functools import partial, reduce
+from operator import itemgetter
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 
-from ._globals import IDENTITY
+from ._globals import DEFAULT, IDENTITY
 from .connection import ConnectionPool
 from .exceptions import NotOnNOSQLError
 from .helpers._internals import Dispatcher
@@ -55,14 +59,20 @@ from .helpers.regex import REGEX_SELECT_AS_PARSER, REGEX_TABLE_DOT_FIELD, REGEX_
 from .helpers.serializers import serializers
 from .migrator import Migrator
 from .objects import (
+    Columns,
     Expression,
     Field,
     IterRows,
+    LazyRecords,
     LazyReferenceGetter,
     LazySet,
     Query,
+    Records,
     Rows,
     Row,
+    RecordRow,
+    RowAttribute,
+    SlotRow,
     Select,
     Table,
     VirtualCommand,
@@ -172,7 +182,8 @@ def with_connection_or_raise(f):
 
     The error is ``ValueError(args[1])`` when an extra positional arg
     is present (so callers can surface the failed statement), otherwise
-    a generic ``RuntimeError``.
+    a generic ``RuntimeError``. Writes queued by an open ``batch()`` are
+    sent before the wrapped ``execute`` runs, so it sees them.
     """
 
     def wrap(*args, **kwargs):
@@ -180,6 +191,9 @@ def with_connection_or_raise(f):
             if len(args) > 1:
                 raise ValueError(args[1])
             raise RuntimeError("no connection available")
+        batch = getattr(args[0], "_batch", None)
+        if batch is not None and batch.queue:
+            batch.flush()
         return f(*args, **kwargs)
 
     return wrap
@@ -675,6 +689,25 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
     drivers = ()
     uploads_in_blob = False
     support_distributed_transaction = False
+    # Compiled-statement memo (``compilers.cache.StatementCache``); only
+    # SQL adapters with a compiler attach one.
+    statement_cache = None
+    # ``upsert`` in a single statement; otherwise the row is looked up
+    # on its conflict columns first. ``upsert_ids`` is how the native
+    # statement reports the id it wrote: ``"returning"`` (it returns
+    # it), ``"last"`` (``lastrowid``) or None when it can't.
+    can_upsert = False
+    upsert_ids = None
+    # Writes send rows back in the same statement (``RETURNING``, or
+    # ``OUTPUT`` on MSSQL); otherwise ``*_returning`` select them apart.
+    can_returning = False
+    # How many result shapes keep their ``_row_parser``.
+    row_parser_cache_size = 128
+    # ``array.array`` typecodes of the columns ``parse_columns`` packs.
+    column_typecodes = {
+        "id": "q", "integer": "q", "bigint": "q", "reference": "q",
+        "float": "d", "double": "d", "boolean": "b",
+    }
 
     def __init__(
         self,
@@ -701,6 +734,10 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
         self.adapter_args = adapter_args
         self.expand = self._expand
         self._after_connection = after_connection
+        # Row parsers built by ``_row_parser``, least recently used first.
+        self._row_parsers = OrderedDict()
+        # ``_record_class`` results: key -> (table, referencing fields, class)
+        self._record_classes = {}
         self.set_connection(None)
         self.find_driver()
         self._initialize_()
@@ -778,8 +815,22 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
         return rv
 
     def tables(self, *queries):
-        tables = dict()
-        for query in queries:
+        # Walked with an explicit stack of [operands, position, tablemap]
+        # frames (merging each child's map into its parent's exactly as
+        # the recursive form did) so that long and/or chains don't hit
+        # the recursion limit.
+        stack = [[queries, 0, dict()]]
+        while True:
+            frame = stack[-1]
+            items, pos, tables = frame
+            if pos == len(items):
+                stack.pop()
+                if not stack:
+                    return tables
+                stack[-1][2] = merge_tablemaps(stack[-1][2], tables)
+                continue
+            frame[1] = pos + 1
+            query = items[pos]
             if isinstance(query, Field):
                 key = query.tablename
                 if tables.get(key, query.table) is not query.table:
@@ -787,8 +838,7 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
                 tables[key] = query.table
             elif isinstance(query, (Expression, Query)):
                 tmp = [x for x in (query.first, query.second) if x is not None]
-                tables = merge_tablemaps(tables, self.tables(*tmp))
-        return tables
+                stack.append([tmp, 0, dict()])
 
     def get_table(self, *queries):
         tablemap = self.tables(*queries)
@@ -821,6 +871,28 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
     def _expand(self, expression, field_type=None, colnames=False, query_env={}):
         return str(expression)
 
+    def expand_select(self, query, fields, attributes):
+        """
+        ``expand_all`` for a select: resolve ``SQLALL``/``"table.field"``
+        items, or every column of the selected tables when ``fields`` is
+        empty. Already-concrete field lists are returned as a list
+        without walking the query for table discovery.
+        """
+        for item in fields:
+            if isinstance(item, (SQLALL, str)):
+                break
+        else:
+            if fields:
+                return list(fields)
+        tablemap = self.tables(
+            query,
+            attributes.get("join", None),
+            attributes.get("left", None),
+            attributes.get("orderby", None),
+            attributes.get("groupby", None),
+        )
+        return self.expand_all(fields, tablemap)
+
     def expand_all(self, fields, tabledict):
         new_fields = []
         append = new_fields.append
@@ -859,19 +931,89 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
         else:
             return self.parser.parse(value, field_itype, field_type)
 
-    def _add_operators_to_parsed_row(self, rid, table, row):
-        for key, record_operator in self.db.record_operators.items():
-            setattr(row, key, record_operator(row, table, rid))
-        if table._db._lazy_tables:
-            row["__get_lazy_reference__"] = LazyReferenceGetter(table, rid)
-
-    def _add_reference_sets_to_parsed_row(self, rid, table, tablename, row):
-        for rfield in table._referenced_by:
-            referee_link = self.db._referee_name and self.db._referee_name % dict(
+    def _record_class(self, table, tablename, idkey, columns=None):
+        """
+        The ``Row`` subclass for the columns of ``table`` selected with
+        its id (stored under ``idkey``). ``update_record``,
+        ``delete_record``, the ``LazySet`` of every referencing field
+        and, with lazy tables, ``__get_lazy_reference__`` are
+        ``RowAttribute``s made from the row's id when they are first
+        read, rather than objects stored in each row; ``RecordRow``
+        still reports them as keys. It is made once per table, and
+        again when the fields referencing the table or the record
+        operators change.
+
+        With ``columns`` (``rowtype="compact"``) it is a ``SlotRow``
+        keeping those keys in ``__slots__``; ``idkey`` None leaves out
+        the record attributes, and ``table`` may then be None.
+        """
+        db = self.db
+        refs = getattr(table, "_referenced_by", None)
+        refs = None if refs is None else tuple(refs)
+        operators = db.record_operators
+        key = (
+            id(table), tablename, idkey,
+            None if refs is None else tuple(map(id, refs)),
+            tuple(operators.items()), columns,
+        )
+        entry = self._record_classes.get(key)
+        if entry is not None:
+            return entry[-1]
+        attributes = {}
+        if idkey is not None:
+            self._record_attributes(attributes, table, tablename, idkey, refs)
+        for name in columns or ():
+            # a column wins over the attribute of the same name
+            attributes.pop(name, None)
+        base = db.Row
+        bases = (base,)
+        if columns is not None:
+            bases = (SlotRow,) if base is Row else (SlotRow, base)
+        if attributes:
+            bases = (RecordRow,) + bases
+            attributes.update(
+                _attributes=tuple(attributes),
+                _made=tuple(name for name in attributes if name not in table.fields),
+            )
+        attributes["__module__"] = base.__module__
+        if columns is not None:
+            attributes["__slots__"] = columns
+        cls = type(base.__name__, bases, attributes)
+        if columns is not None:
+            cls._members = tuple((name, cls.__dict__[name]) for name in columns)
+            cls._member_map = dict(cls._members)
+            cls._setters = tuple(member.__set__ for _, member in cls._members)
+        # the table and its referencing fields are kept so that their
+        # ids in the key stay theirs
+        self._record_classes[key] = (table, refs, cls)
+        return cls
+
+    def _record_attributes(self, attributes, table, tablename, idkey, refs):
+        db = self.db
+
+        def rid(row):
+            if isinstance(row, SlotRow):
+                value = row._lookup(idkey)
+                return None if value is DEFAULT else value
+            return row.__dict__.get(idkey)
+
+        for name, record_operator in db.record_operators.items():
+            attributes[name] = RowAttribute(
+                lambda row, op=record_operator: op(row, table, rid(row))
+            )
+        if db._lazy_tables:
+            attributes["__get_lazy_reference__"] = RowAttribute(
+                lambda row: LazyReferenceGetter(table, rid(row))
+            )
+        for rfield in refs or ():
+            referee_link = db._referee_name and db._referee_name % dict(
                 table=rfield.tablename, field=rfield.name
             )
-            if referee_link and referee_link not in row and referee_link != tablename:
-                row[referee_link] = LazySet(rfield, rid)
+            if referee_link and referee_link != tablename:
+                attributes.setdefault(
+                    referee_link,
+                    RowAttribute(lambda row, rfield=rfield: LazySet(rfield, rid(row))),
+                )
 
     def _regex_select_as_parser(self, colname):
         return re.search(REGEX_SELECT_AS_PARSER, colname)
@@ -906,14 +1048,9 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
                 #! backward compatibility
                 if ft == "id" and fieldname != "id" and "id" not in table.fields:
                     colset["id"] = value
-                #: additional parsing for 'id' fields
+                #: 'id' fields bring update_record, delete_record...
                 if ft == "id" and not cacheable:
-                    self._add_operators_to_parsed_row(value, table, colset)
-                    #: table may be 'nested_select' which doesn't have '_referenced_by'
-                    if hasattr(table, "_referenced_by"):
-                        self._add_reference_sets_to_parsed_row(
-                            value, table, tablename, colset
-                        )
+                    colset.__class__ = self._record_class(table, tablename, fieldname)
             #: otherwise we set the value in extras
             else:
                 #: fields[j] may be None if only 'colnames' was specified in db.executesql()
@@ -984,21 +1121,492 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
                 )
         return (fields_virtual, fields_lazy, tmps)
 
-    def parse(self, rows, fields, colnames, blob_decode=True, cacheable=False):
-        (fields_virtual, fields_lazy, tmps) = self._parse_expand_colnames(fields)
-        new_rows = [
-            self._parse(
-                row,
-                tmps,
-                fields,
-                colnames,
-                blob_decode,
-                cacheable,
-                fields_virtual,
-                fields_lazy,
+    def _column_parser(self, field_itype, field_type, blob_decode, filter_out=None):
+        """
+        ``parse_value`` (then ``filter_out``) for the values of one
+        column, with the parser lookup done once, as ``(decode,
+        convert)``: ``decode`` is for the values that are not None,
+        ``convert`` for all of them after that. Either can be None.
+        """
+        decode = convert = None
+        if isinstance(field_type, SQLCustomType):
+            convert = field_type.decoder
+        elif isinstance(field_type, str) and (field_type != "blob" or blob_decode):
+            parser = self.parser
+            method = parser.registered[field_itype]
+            if isinstance(method, ParserMethodWrapper):
+                extras = {}
+                if hasattr(method, "extra"):
+                    extras = method.extra(parser, field_type)
+                decode = partial(method.f, parser, **extras)
+            elif getattr(method, "__func__", None) is not Parser._default:
+                decode = lambda value: method(value, field_type)
+        if filter_out:
+            if convert is None:
+                convert = filter_out
+            else:
+                decoder = convert
+                convert = lambda value: filter_out(decoder(value))
+        return decode, convert
+
+    def _row_parser(self, fields, colnames, blob_decode=True, cacheable=False,
+                    plan=None, compact=False):
+        """
+        The function that turns one driver row of this result shape into
+        a ``Row``, as ``_parse`` does. Everything that depends only on
+        the columns is decided when it is built, and it is cached per
+        ``(fields, colnames, blob_decode, cacheable, compact)``. With
+        ``compact`` the rows are ``SlotRow``s (``rowtype="compact"``).
+        """
+        key = (tuple(map(id, fields)), tuple(colnames), blob_decode, cacheable)
+        if compact:
+            key += ("compact",)
+        parse_row = self._cached_parser(key)
+        if parse_row is not None:
+            return parse_row
+        if plan is None:
+            plan = self._parse_expand_colnames(fields)
+        if (
+            type(self)._parse is not BaseAdapter._parse
+            or type(self).parse_value is not BaseAdapter.parse_value
+            or type(self.parser).parse is not Parser.parse
+        ):
+            fields_virtual, fields_lazy, tmps = plan
+
+            def parse_row(row):
+                return self._parse(row, tmps, fields, colnames, blob_decode,
+                                   cacheable, fields_virtual, fields_lazy)
+
+        else:
+            parse_row = self._build_row_parser(
+                fields, colnames, plan, blob_decode, cacheable, compact
             )
-            for row in rows
+        return self._cache_parser(key, fields, parse_row)
+
+    def _cached_parser(self, key):
+        parsers = self._row_parsers
+        entry = parsers.get(key)
+        if entry is None:
+            return None
+        parsers.move_to_end(key)
+        return entry[1]
+
+    def _cache_parser(self, key, fields, parse_row):
+        parsers = self._row_parsers
+        # the entry holds on to ``fields`` so that their ids stay unique
+        parsers[key] = (tuple(fields), parse_row)
+        if len(parsers) > self.row_parser_cache_size:
+            parsers.popitem(last=False)
+        return parse_row
+
+    def _build_row_parser(self, fields, colnames, plan, blob_decode, cacheable,
+                          compact=False):
+        fields_virtual, _, tmps = plan
+        Row = self.db.Row
+        decoders, converters = [], []
+        # top-level keys in first-assignment order: a table (its Row is
+        # built from (name, column) pairs) or a single column value
+        layout = OrderedDict()
+        members = {}
+        extras = []
+        id_columns = []
+
+        def column(j, parsers):
+            decode, convert = parsers
+            if decode is not None:
+                decoders.append((j, decode))
+            if convert is not None:
+                converters.append((j, convert))
+
+        def put(key, value):
+            # a later value for the same key keeps the key's position
+            if key not in members:
+                layout[key] = value
+
+        for j, colname in enumerate(colnames):
+            tmp = tmps[j]
+            if tmp:
+                (tablename, fieldname, table, field, ft, fit) = tmp
+                column(j, self._column_parser(fit, ft, blob_decode, field.filter_out))
+                put(tablename, None)
+                pairs = members.setdefault(tablename, [])
+                pairs.append((fieldname, j))
+                #! backward compatibility
+                if ft == "id" and fieldname != "id" and "id" not in table.fields:
+                    pairs.append(("id", j))
+                if ft == "id" and not cacheable:
+                    id_columns.append((tablename, table, fieldname))
+                continue
+            field = fields[j]
+            f_itype, ftype = field and [field._itype, field.type] or [None, None]
+            column(j, self._column_parser(f_itype, ftype, blob_decode))
+            if isinstance(field, Expression) and field.op == self.dialect._as:
+                colname = field.second
+                if field.tablename:
+                    put(field.tablename, None)
+                    members.setdefault(field.tablename, []).append((colname, j))
+                    continue
+            extras.append((colname, j))
+            if not field:
+                put(colname, j)
+            else:
+                new_column_match = self._regex_select_as_parser(colname)
+                if new_column_match is not None:
+                    put(new_column_match.group(1), j)
+
+        def getter(pairs):
+            names = tuple(name for name, _ in pairs)
+            indexes = [j for _, j in pairs]
+            if len(indexes) == 1:
+                j = indexes[0]
+                return lambda values: Row(((names[0], values[j]),))
+            get = itemgetter(*indexes)
+            return lambda values: Row(zip(names, get(values)))
+
+        tables = [(key, getter(members[key])) for key in layout if key in members]
+        columns = [(key, j) for key, j in layout.items() if key not in members]
+        order = list(layout)
+        extra = extras and getter(extras)
+        virtuals = [
+            (tablename, fields_virtual[tablename][0]) for tablename in fields_virtual
         ]
+        record_class = self._record_class
+        if compact:
+            parts = self._compact_parts(
+                order, members, columns, extra, id_columns, fields_virtual
+            )
+            outer = record_class(None, None, None, tuple(key for key, _ in parts[0]))
+            outer_slots = [part for _, part in parts[0]]
+            outer_rest = parts[1]
+
+            def parse_row(row):
+                values = list(row)
+                for j, decode in decoders:
+                    value = values[j]
+                    if value is not None:
+                        values[j] = decode(value)
+                for j, convert in converters:
+                    values[j] = convert(values[j])
+                new_row = outer._make([part(values) for part in outer_slots])
+                for key, part in outer_rest:
+                    new_row[key] = part(values)
+                for tablename, table in virtuals:
+                    box = new_row[tablename]
+                    for f in table._virtual_fields:
+                        try:
+                            box[f.name] = f.f(new_row)
+                        except (AttributeError, KeyError):
+                            pass  # not enough fields to define virtual field
+                    for f in table._virtual_methods:
+                        try:
+                            box[f.name] = f.handler(f.f, new_row)
+                        except (AttributeError, KeyError):
+                            pass  # not enough fields to define virtual field
+                return new_row
+
+            return parse_row
+
+        def parse_row(row):
+            values = list(row)
+            for j, decode in decoders:
+                value = values[j]
+                if value is not None:
+                    values[j] = decode(value)
+            for j, convert in converters:
+                values[j] = convert(values[j])
+            new_row = dict.fromkeys(order)
+            for key, build in tables:
+                new_row[key] = build(values)
+            for key, j in columns:
+                new_row[key] = values[j]
+            if extra:
+                new_row["_extra"] = extra(values)
+            for tablename, table, idkey in id_columns:
+                new_row[tablename].__class__ = record_class(table, tablename, idkey)
+            new_row = Row(new_row)
+            for tablename, table in virtuals:
+                box = new_row[tablename]
+                for f in table._virtual_fields:
+                    try:
+                        box[f.name] = f.f(new_row)
+                    except (AttributeError, KeyError):
+                        pass  # not enough fields to define virtual field
+                for f in table._virtual_methods:
+                    try:
+                        box[f.name] = f.handler(f.f, new_row)
+                    except (AttributeError, KeyError):
+                        pass  # not enough fields to define virtual field
+            return new_row
+
+        return parse_row
+
+    def _compact_parts(self, order, members, columns, extra, id_columns,
+                       fields_virtual):
+        """
+        How ``_build_row_parser`` makes the ``SlotRow`` of a compact
+        row: ``(slotted, rest)``, lists of ``(key, part)`` with
+        ``part(values)`` the value of ``key``. The slotted keys come
+        first, in ``_make`` order; the rest (names that can't be slots)
+        are set afterwards. Each table part makes the table's row the
+        same way.
+        """
+        record_class = self._record_class
+        Row = self.db.Row
+        slottable = lambda name: (
+            isinstance(name, str)
+            and name.isidentifier()
+            and not name.startswith("__")
+            and not hasattr(Row, name)
+            and not hasattr(SlotRow, name)
+        )
+        ids = dict((tablename, (table, idkey)) for tablename, table, idkey in id_columns)
+
+        def split(pairs):
+            slotted = [(key, part) for key, part in pairs if slottable(key)]
+            rest = [(key, part) for key, part in pairs if not slottable(key)]
+            return slotted, rest
+
+        def table_part(tablename, pairs):
+            positions = OrderedDict()
+            for name, j in pairs:
+                # the last value for a name, at the name's first position
+                positions[name] = j
+            slotted, rest = split(list(positions.items()))
+            names = [name for name, _ in slotted]
+            table = None
+            if tablename in fields_virtual:
+                table = fields_virtual[tablename][0]
+                names.extend(
+                    f.name
+                    for f in table._virtual_fields + table._virtual_methods
+                    if f.name not in positions and slottable(f.name)
+                )
+            names = tuple(names)
+            indexes = [j for _, j in slotted]
+            if len(indexes) == 1:
+                get = lambda values, j=indexes[0]: (values[j],)
+            elif indexes:
+                get = itemgetter(*indexes)
+            else:
+                get = lambda values: ()
+            if tablename in ids:
+                # resolved per row, for the classes to follow the schema
+                table, idkey = ids[tablename]
+
+                def build(values):
+                    row = record_class(table, tablename, idkey, names)._make(
+                        get(values)
+                    )
+                    for name, j in rest:
+                        row[name] = values[j]
+                    return row
+
+            else:
+                make = record_class(table, tablename, None, names)._make
+
+                def build(values):
+                    row = make(get(values))
+                    for name, j in rest:
+                        row[name] = values[j]
+                    return row
+
+            return build
+
+        pairs = [(key, table_part(key, members[key])) for key in order if key in members]
+        pairs.extend((key, itemgetter(j)) for key, j in columns)
+        # the top-level keys in their order, as for the other rows
+        pairs.sort(key=lambda pair: order.index(pair[0]))
+        if extra:
+            pairs.append(("_extra", extra))
+        return split(pairs)
+
+    def rowtype_processor(self, rowtype):
+        """
+        The select ``processor`` producing results of ``rowtype``:
+        None for "rows" (plain ``Rows``), ``parse_columns`` for
+        "columns", ``parse_tuples`` / ``parse_namedtuples`` for "tuple" /
+        "namedtuple", ``parse_lazy`` for "lazy" (``Rows`` parsed on read),
+        ``parse_compact`` for "compact" (``Rows`` of ``SlotRow``s).
+        """
+        if rowtype is None or rowtype == "rows":
+            return None
+        if rowtype == "columns":
+            return self.parse_columns
+        if rowtype == "tuple":
+            return self.parse_tuples
+        if rowtype == "namedtuple":
+            return self.parse_namedtuples
+        if rowtype == "lazy":
+            return self.parse_lazy
+        if rowtype == "compact":
+            return self.parse_compact
+        raise ValueError("Unknown rowtype %r" % (rowtype,))
+
+    def parse_tuples(self, rows, fields, colnames, blob_decode=True, cacheable=False):
+        """
+        ``parse`` for ``rowtype="tuple"``: a list with one plain tuple
+        of parsed values per row, in select order.
+        """
+        parse_row = self._tuple_parser(fields, colnames, blob_decode, False)
+        return [parse_row(row) for row in rows]
+
+    def parse_namedtuples(
+        self, rows, fields, colnames, blob_decode=True, cacheable=False
+    ):
+        """
+        ``parse`` for ``rowtype="namedtuple"``: as ``parse_tuples``, with
+        a ``namedtuple`` class made once per result shape.
+        """
+        parse_row = self._tuple_parser(fields, colnames, blob_decode, True)
+        return [parse_row(row) for row in rows]
+
+    def _tuple_parser(self, fields, colnames, blob_decode, named):
+        """
+        The function that turns one driver row into a tuple (a
+        ``namedtuple`` when ``named``) of parsed values: no ``Row``,
+        record operators, reference sets or virtual fields.
+        """
+        key = (named, tuple(map(id, fields)), tuple(colnames), blob_decode)
+        parse_row = self._cached_parser(key)
+        if parse_row is not None:
+            return parse_row
+        decoders, converters = [], []
+        for j, field in enumerate(fields[: len(colnames)]):
+            if field is None:
+                continue
+            decode, convert = self._column_parser(
+                field._itype, field.type, blob_decode,
+                getattr(field, "filter_out", None),
+            )
+            if decode is not None:
+                decoders.append((j, decode))
+            if convert is not None:
+                converters.append((j, convert))
+        make = tuple
+        if named:
+            record = namedtuple(
+                "Record", self._tuple_names(fields, colnames), rename=True
+            )
+            # what ``record._make`` does, without the classmethod call
+            make = partial(tuple.__new__, record)
+        if not decoders and not converters:
+            parse_row = make
+        else:
+
+            def parse_row(row):
+                values = list(row)
+                for j, decode in decoders:
+                    value = values[j]
+                    if value is not None:
+                        values[j] = decode(value)
+                for j, convert in converters:
+                    values[j] = convert(values[j])
+                return make(values)
+
+        return self._cache_parser(key, fields, parse_row)
+
+    def _tuple_names(self, fields, colnames):
+        """
+        The ``namedtuple`` attribute names of a result: the field name,
+        ``tablename_fieldname`` when two tables share it, or the alias.
+        Anything else is renamed positionally (``_0``, ``_1``...).
+        """
+        names = []
+        for j, colname in enumerate(colnames):
+            field = fields[j] if j < len(fields) else None
+            if isinstance(field, Field):
+                colname = field.name
+            elif isinstance(field, Expression) and field.op == self.dialect._as:
+                colname = field.second
+            names.append(colname)
+        shared = set(name for name in names if names.count(name) > 1)
+        for j, field in enumerate(fields[: len(names)]):
+            if isinstance(field, Field) and field.name in shared:
+                names[j] = "%s_%s" % (field.tablename, field.name)
+        return names
+
+    def parse_columns(self, rows, fields, colnames, blob_decode=True, cacheable=False):
+        """
+        ``parse`` for ``rowtype="columns"``: the rows are transposed and
+        each column is parsed as a whole into a ``Columns`` mapping.
+        """
+        data = list(zip(*rows)) if rows else [()] * len(colnames)
+        columns = Columns()
+        for j, colname in enumerate(colnames):
+            field = fields[j] if j < len(fields) else None
+            values = data[j]
+            if field is None:
+                columns[colname] = list(values)
+                continue
+            if isinstance(field, Field):
+                colname = field.longname
+            elif isinstance(field, Expression) and field.op == self.dialect._as:
+                colname = field.second
+            filter_out = getattr(field, "filter_out", None)
+            decode, convert = self._column_parser(
+                field._itype, field.type, blob_decode, filter_out
+            )
+            if decode is not None:
+                values = [None if value is None else decode(value) for value in values]
+            if convert is not None:
+                values = list(map(convert, values))
+            typecode = None
+            if convert is None:
+                typecode = self.column_typecodes.get(field._itype)
+            if typecode is not None and None not in values:
+                try:
+                    values = array(typecode, values)
+                except (TypeError, OverflowError):
+                    pass
+            columns[colname] = values if isinstance(values, array) else list(values)
+        return columns
+
+    def parse(self, rows, fields, colnames, blob_decode=True, cacheable=False):
+        plan = self._parse_expand_colnames(fields)
+        return self._parse_with_plan(
+            rows, fields, colnames, plan, blob_decode, cacheable
+        )
+
+    def parse_lazy(self, rows, fields, colnames, blob_decode=True, cacheable=False):
+        """
+        ``parse`` for ``rowtype="lazy"``: the ``Rows`` keeps the driver
+        rows and parses each one the first time it is read.
+        """
+        plan = self._parse_expand_colnames(fields)
+        return self._parse_with_plan(
+            rows, fields, colnames, plan, blob_decode, cacheable, lazy=True
+        )
+
+    def parse_compact(self, rows, fields, colnames, blob_decode=True, cacheable=False):
+        """
+        ``parse`` for ``rowtype="compact"``: the ``Row``s keep their
+        columns in ``__slots__`` (see ``SlotRow``), in classes made per
+        table and result shape.
+        """
+        plan = self._parse_expand_colnames(fields)
+        return self._parse_with_plan(
+            rows, fields, colnames, plan, blob_decode, cacheable, compact=True
+        )
+
+    def _parse_with_plan(
+        self, rows, fields, colnames, plan, blob_decode=True, cacheable=False,
+        lazy=False, compact=False,
+    ):
+        """
+        ``parse`` with the ``_parse_expand_colnames(fields)`` result
+        precomputed — lets callers that run the same select repeatedly
+        (``PreparedSelect``) skip the per-call column analysis. With
+        ``lazy`` the rows are parsed as they are read (``LazyRecords``),
+        with ``compact`` they are ``SlotRow``s.
+        """
+        fields_virtual = plan[0]
+        parse_row = self._row_parser(
+            fields, colnames, blob_decode, cacheable, plan, compact
+        )
+        if lazy:
+            new_rows = LazyRecords(rows, parse_row)
+        else:
+            new_rows = Records(map(parse_row, rows))
         rowsobj = self.db.Rows(self.db, new_rows, colnames, rawrows=rows, fields=fields)
         # Old style virtual fields
         for tablename, tmp in fields_virtual.items():
@@ -1012,12 +1620,18 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
                     pass
         return rowsobj
 
-    def iterparse(self, sql, fields, colnames, blob_decode=True, cacheable=False):
+    def iterparse(
+        self, sql, fields, colnames, blob_decode=True, cacheable=False,
+        batch_size=None,
+    ):
         """
-        Iterator to parse one row at a time.
+        Iterator to parse one row at a time, fetching ``batch_size`` rows
+        from the database at once.
         It doesn't support the old style virtual fields
         """
-        return IterRows(self.db, sql, fields, colnames, blob_decode, cacheable)
+        return IterRows(
+            self.db, sql, fields, colnames, blob_decode, cacheable, batch_size
+        )
 
     def adapt(self, value):
         return value
@@ -1028,6 +1642,8 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
         return self.representer.represent(obj, field_type)
 
     def _drop_table_cleanup(self, table):
+        if self.statement_cache is not None:
+            self.statement_cache.clear()
         del self.db[table._tablename]
         del self.db.tables[self.db.tables.index(table._tablename)]
         self.db._remove_references_to(table)
@@ -1035,6 +1651,86 @@ class BaseAdapter(ConnectionPool, metaclass=AdapterMeta):
     def drop_table(self, table, mode=""):
         self._drop_table_cleanup(table)
 
+    def upsert(self, table, conflict, fields, update):
+        """
+        Insert ``fields`` (``op_values``), or update the ``update`` fields
+        of the row it collides with on the ``conflict`` fields. Returns
+        the id (or primary key dict) of the row written, None when it
+        can't be told.
+
+        This generic version looks the row up first; adapters with
+        ``can_upsert`` do it in one statement.
+        """
+        key = [(f, v) for f, v in fields if any(f is c for c in conflict)]
+        query = reduce(lambda a, b: a & b, [f == v for f, v in key])
+        record = self.db(query).select(limitby=(0, 1)).first()
+        if record is None:
+            return self.insert(table, fields)
+        sets = [(f, v) for f, v in fields if any(f is u for u in update)]
+        if sets:
+            self.update(table, query, sets)
+        if hasattr(table, "_primarykey"):
+            return dict((k, record[k]) for k in table._primarykey)
+        rid = Reference(record[table._id.name])
+        (rid._table, rid._record) = (table, None)
+        return rid
+
+    def bulk_upsert(self, table, conflict, items, update, batch_size=None):
+        """``upsert`` every item of ``items``."""
+        for fields in items:
+            self.upsert(table, conflict, fields, update)
+
+    def bulk_update(self, table, key, items, batch_size=None):
+        """
+        Update each row matched on the ``key`` field to its own values:
+        ``items`` are ``op_values`` lists that start with the key. Returns
+        how many rows were updated.
+
+        This generic version runs one ``update`` per item; SQL adapters
+        send batches of items that set the same columns as one statement.
+        """
+        count = 0
+        for fields in items:
+            count += self.update(table, key == fields[0][1], fields[1:]) or 0
+        return count
+
+    def update_returning(self, table, query, fields, returning):
+        """
+        ``update`` and return the ``returning`` fields of the updated rows
+        as Rows.
+
+        This generic version reads the ids of the rows first and selects
+        them again afterwards (keyed tables re-run ``query``); adapters
+        with ``can_returning`` do it in the UPDATE itself.
+        """
+        db = self.db
+        if not hasattr(table, "_id"):
+            self.update(table, query, fields)
+            return db(query).select(*returning)
+        ids = [row[table._id.name] for row in db(query).select(table._id)]
+        self.update(table, query, fields)
+        return db(table._id.belongs(ids)).select(*returning)
+
+    def delete_returning(self, table, query, returning):
+        """
+        ``delete`` and return the ``returning`` fields of the deleted rows
+        as Rows; this generic version selects them before deleting.
+        """
+        rows = self.db(query).select(*returning)
+        self.delete(table, query)
+        return rows
+
+    def bulk_insert_returning(self, table, items, returning, batch_size=None):
+        """
+        ``bulk_insert`` and return the ``returning`` fields of the new rows
+        as Rows, in insertion order; this generic version selects them by
+        the ids ``bulk_insert`` reports.
+        """
+        if not hasattr(table, "_id"):
+            raise SyntaxError("Table: returning needs an id field on %s" % table)
+        ids = self.bulk_insert(table, items, batch_size)
+        return self.db(table._id.belongs(ids)).select(*returning, orderby=table._id)
+
     def rowslice(self, rows, minimum=0, maximum=None):
         return rows
 
@@ -1053,6 +1749,17 @@ class DebugHandler(ExecutionHandler):
         self.adapter.db.logger.debug("SQL: %s" % command)
 
 
+# Keyword arguments accepted by ``SQLAdapter._select_wcols`` (i.e. by
+# ``Set.select``).
+_SELECT_ATTRIBUTES = frozenset(
+    (
+        "left", "join", "distinct", "orderby", "groupby", "having",
+        "limitby", "orderby_on_limitby", "for_update", "outer_scoped",
+        "required", "cache", "cacheable", "processor", "cte_collector",
+    )
+)
+
+
 class SQLAdapter(BaseAdapter):
     """
     Base adapter for all SQL backends.
@@ -1069,6 +1776,22 @@ class SQLAdapter(BaseAdapter):
 
     commit_on_alter_table = False
     can_select_for_update = True
+    # How ``bulk_insert`` recovers the ids of a multi-row INSERT:
+    # ``"last"``/``"first"`` (``lastrowid`` is the id of the last/first
+    # row, the others being consecutive), ``"returning"`` (the INSERT
+    # returns them) or None for one INSERT per row.
+    bulk_insert_ids = None
+    # Distance between the ids of consecutive rows of a multi-row INSERT
+    # (MySQL's ``auto_increment_increment``, read on first connection).
+    bulk_insert_id_step = 1
+    # Rows per multi-row INSERT when the caller gives no ``batch_size``.
+    bulk_insert_batch_size = 1000
+    # Rows an ``iterselect`` fetches at once when no ``batch_size`` is given.
+    iterselect_batch_size = 1000
+    # True when no other statement can run on the connection while a
+    # ``stream_cursor`` has rows left (unbuffered MySQL cursors): every
+    # ``iterselect`` then reads on a ``stream_connection`` of its own.
+    stream_blocks_connection = False
     execution_handlers = []
     migrator_cls = Migrator
 
@@ -1079,6 +1802,18 @@ class SQLAdapter(BaseAdapter):
         self.execution_handlers = list(self.db.execution_handlers)
         if self.db._debug:
             self.execution_handlers.insert(0, DebugHandler)
+        # Compiled SQL keyed by AST shape; ``statement_cache_size=0`` in
+        # ``adapter_args`` disables it. Hit/miss counters live on the
+        # cache (``adapter.statement_cache.info()``).
+        cache_size = self.adapter_args.get("statement_cache_size", 256)
+        if self.compiler is not None and cache_size:
+            from .compilers.cache import StatementCache
+            self.statement_cache = StatementCache(cache_size)
+        # Run ``ast_optimize.optimize`` on every statement AST before it
+        # is compiled (``ast_optimize=True`` in ``adapter_args``).
+        self.ast_optimize = self.adapter_args.get("ast_optimize", False)
+        # The open ``batch()``, if any.
+        self._batch = None
 
     def test_connection(self):
         self.execute("SELECT 1;")
@@ -1117,6 +1852,40 @@ class SQLAdapter(BaseAdapter):
         # ParamSQL forwarding and the before/after_execute handlers.
         return self.driver_io.execute(*args, **kwargs)
 
+    @with_connection_or_raise
+    def executemany(self, sql, seq_of_params):
+        # Delegated to the Driver (Layer 4), like execute.
+        return self.driver_io.executemany(sql, seq_of_params)
+
+    @contextmanager
+    def batch(self):
+        """
+        Queue the inserts, updates and deletes issued in the block and
+        send them together when it exits (see ``pydal.batch``). Nested
+        blocks join the outer one.
+        """
+        if self._batch is not None:
+            yield self._batch
+            return
+        from .batch import Batch
+
+        self._batch = batch = Batch(self)
+        try:
+            yield batch
+        except BaseException:
+            self._batch = None
+            raise
+        self._batch = None
+        batch.flush()
+
+    def _run_write(self, sql):
+        """Execute an update or delete and return its row count."""
+        self.execute(sql)
+        try:
+            return self.cursor.rowcount
+        except AttributeError:
+            return None
+
     def _expand(self, expression, field_type=None, colnames=False, query_env={}):
         if isinstance(expression, Field):
             if not colnames:
@@ -1193,6 +1962,8 @@ class SQLAdapter(BaseAdapter):
         return self.dialect.insert_empty(table._rname)
 
     def insert(self, table, fields):
+        if self._batch is not None:
+            return self._batch.add("insert", table, fields)
         query = self._insert(table, fields)
         try:
             self.execute(query)
@@ -1216,13 +1987,15 @@ class SQLAdapter(BaseAdapter):
         (rid._table, rid._record) = (table, None)
         return rid
 
-    def _update(self, table, query, fields):
+    def _update(self, table, query, fields, returning=()):
         if self.compiler is not None:
             try:
                 from .objects import Set
                 from .ast_translate import set_to_update
-                node = set_to_update(Set(self.db, query), fields)
-                return self.compiler.compile_update(node)
+                node = set_to_update(
+                    Set(self.db, query), fields, [f.name for f in returning]
+                )
+                return self.compiler.compile_update(self._optimized(node))
             except NotImplementedError:
                 pass
         sql_q = ""
@@ -1238,29 +2011,31 @@ class SQLAdapter(BaseAdapter):
                 for (field, value) in fields
             ]
         )
+        if returning:
+            return self.dialect.update(
+                table, sql_v, sql_q, [f._rname for f in returning]
+            )
         return self.dialect.update(table, sql_v, sql_q)
 
     def update(self, table, query, fields):
         sql = self._update(table, query, fields)
+        if self._batch is not None:
+            return self._batch.add("update", table, sql)
         try:
-            self.execute(sql)
+            return self._run_write(sql)
         except Exception:
             e = sys.exc_info()[1]
             if hasattr(table, "_on_update_error"):
                 return table._on_update_error(table, query, fields, e)
             raise e
-        try:
-            return self.cursor.rowcount
-        except AttributeError:
-            return None
 
-    def _delete(self, table, query):
+    def _delete(self, table, query, returning=()):
         if self.compiler is not None:
             try:
                 from .objects import Set
                 from .ast_translate import set_to_delete
-                node = set_to_delete(Set(self.db, query))
-                return self.compiler.compile_delete(node)
+                node = set_to_delete(Set(self.db, query), [f.name for f in returning])
+                return self.compiler.compile_delete(self._optimized(node))
             except NotImplementedError:
                 pass
         sql_q = ""
@@ -1269,15 +2044,39 @@ class SQLAdapter(BaseAdapter):
             if use_common_filters(query):
                 query = self.common_filter(query, [table])
             sql_q = self.expand(query, query_env=query_env)
+        if returning:
+            return self.dialect.delete(table, sql_q, [f._rname for f in returning])
         return self.dialect.delete(table, sql_q)
 
     def delete(self, table, query):
         sql = self._delete(table, query)
-        self.execute(sql)
+        if self._batch is not None:
+            return self._batch.add("delete", table, sql)
+        return self._run_write(sql)
+
+    def update_returning(self, table, query, fields, returning):
+        if not self.can_returning:
+            return super(SQLAdapter, self).update_returning(
+                table, query, fields, returning
+            )
         try:
-            return self.cursor.rowcount
-        except AttributeError:
-            return None
+            self.execute(self._update(table, query, fields, returning))
+        except Exception:
+            e = sys.exc_info()[1]
+            if hasattr(table, "_on_update_error"):
+                return table._on_update_error(table, query, fields, e)
+            raise e
+        return self._returned(returning, self.cursor.fetchall())
+
+    def delete_returning(self, table, query, returning):
+        if not self.can_returning:
+            return super(SQLAdapter, self).delete_returning(table, query, returning)
+        self.execute(self._delete(table, query, returning))
+        return self._returned(returning, self.cursor.fetchall())
+
+    def _returned(self, fields, rows):
+        """Parse the ``rows`` a write sent back for ``fields`` into Rows."""
+        return self.parse(rows, fields, [f.longname for f in fields])
 
     def _colexpand(self, field, query_env):
         return self.expand(field, colnames=True, query_env=query_env)
@@ -1323,44 +2122,64 @@ class SQLAdapter(BaseAdapter):
             tablemap,
         )
 
-    def _ast_select_wcols(self, query, fields, attributes):
-        """Try the AST pipeline. Return (colnames, sql) or None on
-        NotImplementedError. Colnames are still computed the legacy
-        way; only SQL generation flips to the new path.
+    def _optimized(self, node):
+        """``node`` through ``ast_optimize.optimize`` when enabled."""
+        if not self.ast_optimize:
+            return node
+        from .ast_optimize import optimize
+        return optimize(
+            node,
+            unique=self._unique_column,
+            column_type=self._column_type,
+            nocase=self.compiler.nocase_collation,
+        )
+
+    def _column(self, tablename, fieldname):
+        table = self.db.get(tablename)
+        if table is None or fieldname not in table.fields:
+            return None, None
+        return table, table[fieldname]
+
+    def _unique_column(self, tablename, fieldname):
+        table, field = self._column(tablename, fieldname)
+        if field is None:
+            return False
+        return field is getattr(table, "_id", None) or bool(field.unique)
+
+    def _column_type(self, tablename, fieldname):
+        field = self._column(tablename, fieldname)[1]
+        return field.type if field is not None and isinstance(field.type, str) else None
+
+    def _ast_select_plan(self, query, fields, attributes, prepared=False):
+        """Try the AST pipeline. Return ``(plan, sql)`` — a
+        ``SelectPlan`` plus the compiled statement — or None on
+        NotImplementedError (the caller falls back to the legacy path).
+
+        ``prepared=True`` compiles through ``compile_prepared`` so
+        ``db.Param`` placeholders are accepted (``Set.prepare_select``).
         """
         if self.compiler is None:
             return None
         try:
             from .objects import Set
-            from .ast_translate import set_to_select
-            s = Set(self.db, query)
-            node = set_to_select(s, fields, attributes)
-            sql = self.compiler.compile_select(node)
+            from .ast_translate import plan_select
+            plan = plan_select(Set(self.db, query), fields, attributes)
+            node = self._optimized(plan.node)
+            if prepared:
+                sql = self.compiler.compile_prepared(node)
+            else:
+                sql = self.compiler.compile_select(node)
         except NotImplementedError:
             return None
-        # Replicate _select_wcols' colnames-side computation: discover
-        # the tablemap, apply common filters, expand fields, compute
-        # query_env, then map each field through ``_colexpand``.
-        tablemap = self.tables(
-            query,
-            attributes.get("join", None),
-            attributes.get("left", None),
-            attributes.get("orderby", None),
-            attributes.get("groupby", None),
-        )
-        if use_common_filters(query):
-            query = self.common_filter(query, list(tablemap.values()))
-        expanded = list(self.expand_all(fields, tablemap))
-        tablemap = merge_tablemaps(tablemap, self.tables(*expanded))
-        outer_scoped = attributes.get("outer_scoped", [])
-        for item in outer_scoped:
-            tablemap.pop(item, None)
-        query_env = dict(
-            current_scope=outer_scoped + list(tablemap),
-            parent_scope=outer_scoped,
-        )
-        colnames = [self._colexpand(x, query_env) for x in expanded]
-        return colnames, sql
+        return plan, sql
+
+    def _ast_select_wcols(self, query, fields, attributes, prepared=False):
+        """``_ast_select_plan`` reduced to ``(colnames, sql)``, or None."""
+        planned = self._ast_select_plan(query, fields, attributes, prepared)
+        if planned is None:
+            return None
+        plan, sql = planned
+        return plan.colnames, sql
 
     def _select_wcols(
         self,
@@ -1583,6 +2402,11 @@ class SQLAdapter(BaseAdapter):
         self.execute(sql)
         return self.cursor.fetchall()
 
+    def _sql_cache_key(self, sql):
+        # a ParamSQL stringifies to its placeholders only: the bound
+        # values must be part of the key or different selects collide
+        return self.uri + "/" + sql + "/" + repr(getattr(sql, "params", ()))
+
     def _select_aux(self, sql, fields, attributes, colnames):
         cache = attributes.get("cache", None)
         if not cache:
@@ -1593,11 +2417,11 @@ class SQLAdapter(BaseAdapter):
                 time_expire = cache["expiration"]
                 key = cache.get("key")
                 if not key:
-                    key = self.uri + "/" + sql + "/rows"
+                    key = self._sql_cache_key(sql) + "/rows"
                     key = hashlib_md5(key).hexdigest()
             else:
                 (cache_model, time_expire) = cache
-                key = self.uri + "/" + sql + "/rows"
+                key = self._sql_cache_key(sql) + "/rows"
                 key = hashlib_md5(key).hexdigest()
             rows = cache_model(
                 key,
@@ -1615,26 +2439,72 @@ class SQLAdapter(BaseAdapter):
     def _cached_select(self, cache, sql, fields, attributes, colnames):
         del attributes["cache"]
         (cache_model, time_expire) = cache
-        key = self.uri + "/" + sql
+        key = self._sql_cache_key(sql)
+        processor = getattr(attributes.get("processor"), "__name__", None)
+        if processor:
+            # e.g. rowtype="columns": not the same result as Rows
+            key += "/" + processor
         key = hashlib_md5(key).hexdigest()
         args = (sql, fields, attributes, colnames)
         ret = cache_model(
             key, lambda self=self, args=args: self._select_aux(*args), time_expire
         )
-        ret._restore_fields(fields)
+        if isinstance(ret, Rows):
+            ret._restore_fields(fields)
         return ret
 
     def select(self, query, fields, attributes):
-        colnames, sql = self._select_wcols(query, fields, **attributes)
+        planned = None
+        if attributes.keys() <= _SELECT_ATTRIBUTES:
+            # Unknown attributes go through _select_wcols, whose
+            # signature rejects them.
+            planned = self._ast_select_plan(query, fields, attributes)
+        if planned is None:
+            colnames, sql = self._select_wcols(query, fields, **attributes)
+        else:
+            plan, sql = planned
+            colnames = plan.colnames
+            if "processor" not in attributes and type(self).parse is BaseAdapter.parse:
+                # Reuse the parse metadata the planner already built.
+                attributes = dict(
+                    attributes,
+                    processor=partial(self._parse_with_plan, plan=plan.parse_plan),
+                )
         cache = attributes.get("cache", None)
         if cache and attributes.get("cacheable", False):
             return self._cached_select(cache, sql, fields, attributes, colnames)
         return self._select_aux(sql, fields, attributes, colnames)
 
     def iterselect(self, query, fields, attributes):
+        attributes = dict(attributes)
+        batch_size = attributes.pop("batch_size", None)
         colnames, sql = self._select_wcols(query, fields, **attributes)
         cacheable = attributes.get("cacheable", False)
-        return self.iterparse(sql, fields, colnames, cacheable=cacheable)
+        return self.iterparse(
+            sql, fields, colnames, cacheable=cacheable, batch_size=batch_size
+        )
+
+    @with_connection_or_raise
+    def stream_cursor(self, connection=None):
+        """
+        A new cursor for an ``iterselect`` result to read from, so that
+        the adapter's own cursor stays free for other statements. It is
+        opened on ``connection``, if given, else on the adapter's.
+        """
+        if connection is None:
+            connection = self.connection
+        return connection.cursor()
+
+    def stream_connection(self):
+        """
+        A new connection, set up by the connection hooks, for an
+        ``iterselect`` to read on when ``stream_blocks_connection``. It
+        is not pooled: the ``IterRows`` closes it with its cursor.
+        """
+        connection = self.connector()
+        with self.using_connection(connection):
+            self.after_connection_hook()
+        return connection
 
     def _count(self, query, distinct=None):
         if self.compiler is not None:
@@ -1642,7 +2512,7 @@ class SQLAdapter(BaseAdapter):
                 from .objects import Set
                 from .ast_translate import set_to_count
                 node = set_to_count(Set(self.db, query), distinct=distinct)
-                return self.compiler.compile_count(node)
+                return self.compiler.compile_count(self._optimized(node))
             except NotImplementedError:
                 pass
         tablemap = self.tables(query)
@@ -1668,8 +2538,199 @@ class SQLAdapter(BaseAdapter):
         self.execute(self._count(query, distinct))
         return self.cursor.fetchone()[0]
 
-    def bulk_insert(self, table, items):
-        return [self.insert(table, item) for item in items]
+    def bulk_insert(self, table, items, batch_size=None):
+        """
+        Insert ``items`` (``op_values`` lists) and return their ids.
+
+        Where the backend can report the ids of a multi-row INSERT
+        (``bulk_insert_ids``), consecutive items that set the same
+        columns go out as one ``INSERT ... VALUES (...),(...)`` per
+        batch of ``batch_size`` rows (capped by the compiler's
+        ``max_params``); otherwise, and for keyed tables, it is one
+        ``insert`` per item.
+        """
+        if (
+            self.compiler is None
+            or self.bulk_insert_ids is None
+            or not hasattr(table, "_id")
+            or hasattr(table, "_primarykey")
+            or hasattr(table, "_on_insert_error")
+        ):
+            return [self.insert(table, item) for item in items]
+        from .ast_translate import table_to_insert_many
+
+        batch_size = batch_size or self.bulk_insert_batch_size
+        ids = []
+        for rows in self._insert_batches(items, batch_size):
+            if not rows[0]:
+                ids.extend(self.insert(table, item) for item in rows)
+                continue
+            try:
+                sql = self.compiler.compile_insert(table_to_insert_many(table, rows))
+            except NotImplementedError:
+                ids.extend(self.insert(table, item) for item in rows)
+                continue
+            self.execute(sql)
+            ids.extend(self._bulk_inserted_ids(table, rows))
+        for k, id in enumerate(ids):
+            if type(id) is int:
+                ids[k] = rid = Reference(id)
+                (rid._table, rid._record) = (table, None)
+        return ids
+
+    def bulk_update(self, table, key, items, batch_size=None):
+        batch_size = batch_size or self.bulk_insert_batch_size
+        count = 0
+        # CASE renders the key twice per row and column.
+        for rows in self._insert_batches(items, batch_size, lambda n: 2 * n - 1):
+            if len(rows[0]) < 2:
+                continue
+            self.execute(self._bulk_update(table, key, rows))
+            count += max(self.cursor.rowcount, 0)
+        return count
+
+    def _bulk_update(self, table, key, items):
+        if self.compiler is not None:
+            try:
+                from .ast_translate import table_to_bulk_update
+                node = table_to_bulk_update(table, key, items)
+                return self.compiler.compile_bulk_update(node)
+            except NotImplementedError:
+                pass
+        return self.dialect.bulk_update(
+            table._rname,
+            key._rname,
+            [f._rname for f, _ in items[0][1:]],
+            [[self.expand(v, f.type) for f, v in item] for item in items],
+        )
+
+    def bulk_insert_returning(self, table, items, returning, batch_size=None):
+        """
+        Where the backend has ``can_returning``, the multi-row INSERTs of
+        ``bulk_insert`` carry a ``RETURNING`` clause and no select follows.
+        """
+        if (
+            not self.can_returning
+            or self.compiler is None
+            or self.bulk_insert_ids is None
+            or not hasattr(table, "_id")
+            or hasattr(table, "_primarykey")
+            or hasattr(table, "_on_insert_error")
+        ):
+            return super(SQLAdapter, self).bulk_insert_returning(
+                table, items, returning, batch_size
+            )
+        from .ast_translate import table_to_insert, table_to_insert_many
+
+        names = [f.name for f in returning]
+        batch_size = batch_size or self.bulk_insert_batch_size
+        records = []
+        for rows in self._insert_batches(items, batch_size):
+            if rows[0]:
+                nodes = [table_to_insert_many(table, rows, names)]
+            else:
+                nodes = [table_to_insert(table, item, names) for item in rows]
+            for node in nodes:
+                self.execute(self.compiler.compile_insert(node))
+                records.extend(self.cursor.fetchall())
+        return self._returned(returning, records)
+
+    def _insert_batches(self, items, batch_size, params=None):
+        """
+        Split ``items`` into runs that set the same columns, ``batch_size``
+        at most; ``params(ncols)`` is how many parameters a row binds
+        (one per column by default).
+        """
+        compiler = self.compiler
+        max_params = None
+        if compiler is not None and compiler.parameterize:
+            max_params = compiler.max_params
+        batch, cols, size = [], None, batch_size
+        for item in items:
+            item_cols = [field.name for field, _ in item]
+            if item_cols != cols or len(batch) >= size:
+                if batch:
+                    yield batch
+                batch, cols, size = [], item_cols, batch_size
+                if max_params and item_cols:
+                    n = params(len(item_cols)) if params else len(item_cols)
+                    size = max(1, min(batch_size, max_params // n))
+            batch.append(item)
+        if batch:
+            yield batch
+
+    def _bulk_inserted_ids(self, table, rows):
+        """The ids of the multi-row INSERT of ``rows`` just executed."""
+        idname = table._id.name
+        for k, (field, _) in enumerate(rows[0]):
+            if field.name == idname:
+                # Explicit ids: nothing to recover.
+                return [int(item[k][1]) for item in rows]
+        if self.bulk_insert_ids == "returning":
+            return [int(row[0]) for row in self.cursor.fetchall()]
+        n, step = len(rows), self.bulk_insert_id_step
+        rowid = int(self.lastrowid(table))
+        first = rowid - (n - 1) * step if self.bulk_insert_ids == "last" else rowid
+        return list(range(first, first + n * step, step))
+
+    def _upsert(self, table, conflict, items, update):
+        if self.compiler is not None:
+            try:
+                from .ast_translate import table_to_upsert
+                node = table_to_upsert(
+                    table,
+                    [f.name for f in conflict],
+                    items,
+                    [f.name for f in update],
+                )
+                return self.compiler.compile_upsert(node)
+            except NotImplementedError:
+                pass
+        id = None
+        if self.upsert_ids is not None and hasattr(table, "_id"):
+            id = table._id._rname
+        return self.dialect.upsert(
+            table._rname,
+            [f._rname for f, _ in items[0]],
+            [[self.expand(v, f.type) for f, v in item] for item in items],
+            [f._rname for f in conflict],
+            [f._rname for f in update],
+            id,
+        )
+
+    def upsert(self, table, conflict, fields, update):
+        if not self.can_upsert:
+            return super(SQLAdapter, self).upsert(table, conflict, fields, update)
+        self.execute(self._upsert(table, conflict, [fields], update))
+        if hasattr(table, "_primarykey"):
+            return dict((f.name, v) for f, v in fields if f.name in table._primarykey)
+        if self.upsert_ids == "returning":
+            row = self.cursor.fetchone()
+            id = row[0] if row else None
+        elif self.upsert_ids == "last" and (update or self.cursor.rowcount):
+            id = self.lastrowid(table)
+        else:
+            id = None
+        if not id:
+            # Nothing written (the row existed and there was nothing to
+            # update) or nothing reported.
+            return None
+        rid = Reference(int(id))
+        (rid._table, rid._record) = (table, None)
+        return rid
+
+    def bulk_upsert(self, table, conflict, items, update, batch_size=None):
+        """
+        ``upsert`` ``items`` (``op_values`` lists that set the same
+        columns) as multi-row statements of ``batch_size`` rows at most.
+        """
+        if not self.can_upsert:
+            return super(SQLAdapter, self).bulk_upsert(
+                table, conflict, items, update
+            )
+        batch_size = batch_size or self.bulk_insert_batch_size
+        for rows in self._insert_batches(items, batch_size):
+            self.execute(self._upsert(table, conflict, rows, update))
 
     def create_table(self, *args, **kwargs):
         return self.migrator.create_table(*args, **kwargs)
@@ -1738,11 +2799,16 @@ class SQLAdapter(BaseAdapter):
     @with_connection
     def commit(self):
         # Delegated to the Driver (Layer 4).
+        if self._batch is not None:
+            self._batch.flush()
         return self.driver_io.commit()
 
     @with_connection
     def rollback(self):
         # Delegated to the Driver (Layer 4).
+        if self._batch is not None:
+            self._batch.queue = []
+        self.release_streams()
         return self.driver_io.rollback()
 
     @with_connection
@@ -1838,6 +2904,9 @@ class NoSQLAdapter(BaseAdapter):
     def nested_select(self, *args, **kwargs):
         raise NotOnNOSQLError("Nested queries are not supported on NoSQL databases")
 
+    def batch(self):
+        raise NotOnNOSQLError("Statement batching is not supported on NoSQL databases")
+
 
 class NullAdapter(BaseAdapter):
     """
@@ -1874,6 +2943,10 @@ class CommonDialect(Dialect):
     """
 
     quote_template = "%s"
+    # NULLs sort before the other values in ascending order (and after
+    # them in descending order); seeking past a row (``paginate``)
+    # depends on it.
+    nulls_first = True
 
     def _force_bigints(self):
         if "big-id" in self.types and "reference" in self.types:
@@ -2026,22 +3099,61 @@ class SQLDialect(CommonDialect):
     def insert_empty(self, table):
         return "INSERT INTO %s DEFAULT VALUES;" % table
 
+    def upsert(self, table, fields, rows, conflict, update, id=None):
+        """
+        ``INSERT ... ON CONFLICT (...) DO UPDATE`` (``DO NOTHING`` without
+        ``update``). ``rows`` are lists of rendered values; ``id``, when
+        given, is returned by the statement.
+        """
+        values = "),(".join(",".join(row) for row in rows)
+        if update:
+            action = "DO UPDATE SET %s" % ",".join(
+                "%s=excluded.%s" % (f, f) for f in update
+            )
+        else:
+            action = "DO NOTHING"
+        ret = " RETURNING %s" % id if id else ""
+        return "INSERT INTO %s(%s) VALUES (%s) ON CONFLICT (%s) %s%s;" % (
+            table, ",".join(fields), values, ",".join(conflict), action, ret,
+        )
+
     def where(self, query):
         return "WHERE %s" % query
 
-    def update(self, table, values, where=None):
+    def bulk_update(self, table, key, fields, rows):
+        """
+        ``UPDATE table SET f=CASE key WHEN k THEN v ... ELSE f END,...
+        WHERE key IN (...)``; ``rows`` are lists of rendered values, the
+        key first.
+        """
+        sets = [
+            "%s=CASE %s %s ELSE %s END" % (
+                f, key, " ".join("WHEN %s THEN %s" % (r[0], r[k]) for r in rows), f
+            )
+            for k, f in enumerate(fields, 1)
+        ]
+        return "UPDATE %s SET %s WHERE %s IN (%s);" % (
+            table, ",".join(sets), key, ",".join(r[0] for r in rows),
+        )
+
+    def returning(self, fields):
+        return " RETURNING %s" % ",".join(fields) if fields else ""
+
+    def update(self, table, values, where=None, returning=None):
         tablename = self.writing_alias(table)
         whr = ""
         if where:
             whr = " %s" % self.where(where)
-        return "UPDATE %s SET %s%s;" % (tablename, values, whr)
+        return "UPDATE %s SET %s%s%s;" % (
+            tablename, values, whr, self.returning(returning),
+        )
 
-    def delete(self, table, where=None):
+    def delete(self, table, where=None, returning=None):
         tablename = self.writing_alias(table)
         whr = ""
         if where:
             whr = " %s" % self.where(where)
-        return "DELETE FROM %s%s;" % (tablename, whr)
+        return "DELETE FROM %s%s%s;" % (tablename, whr, self.returning(returning))
 
     def cte(self, tname, fields, sql, recursive=None):
         """
@@ -2404,6 +3516,32 @@ class SQLDialect(CommonDialect):
     def aggregate(self, first, what, query_env={}):
         return "%s(%s)" % (what, self.expand(first, query_env=query_env))
 
+    def window(self, first, second, query_env={}):
+        partition_by, orderby, frame = second
+        spec = []
+        if partition_by:
+            spec.append("PARTITION BY %s" % ",".join(
+                self.expand(x, query_env=query_env) for x in partition_by
+            ))
+        if orderby:
+            spec.append("ORDER BY %s" % ",".join(
+                self.expand(x, query_env=query_env) for x in orderby
+            ))
+        if frame:
+            spec.append(frame)
+        return "%s OVER (%s)" % (
+            self.expand(first, query_env=query_env), " ".join(spec)
+        )
+
+    def window_function(self, first, second, query_env={}):
+        kind, offset, default = second
+        args = [] if first is None else [self.expand(first, query_env=query_env)]
+        if offset is not None:
+            args.append(self.expand(offset, "integer", query_env=query_env))
+            if default is not None:
+                args.append(self.expand(default, first.type, query_env=query_env))
+        return "%s(%s)" % (kind, ",".join(args))
+
     def not_null(self, default, field_type):
         return "NOT NULL DEFAULT %s" % self.adapter.represent(default, field_type)
 
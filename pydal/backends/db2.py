@@ -118,6 +118,8 @@ class DB2Dialect(SQLDialect):
     IDENTITY``; ``lastrowid`` reads ``IDENTITY_VAL_LOCAL()``.
     """
 
+    nulls_first = False
+
     @sqltype_for("text")
     def type_text(self):
         """DB2 has no TEXT type; map to CLOB."""
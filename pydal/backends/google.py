@@ -369,7 +369,7 @@ class Firestore(NoSQLAdapter):
         rid._table, rid._record = table, None
         return rid
 
-    def bulk_insert(self, table, items):
+    def bulk_insert(self, table, items, batch_size=None):
         # OK
         collection = self._client.collection(table._tablename)
         batch = self._client.batch()
@@ -100,6 +100,9 @@ class IngresDialect(SQLDialect):
     substituted by the adapter). Date/datetime columns use the ANSI
     types ``ANSIDATE`` / ``TIMESTAMP WITHOUT TIME ZONE``.
     """
+
+    nulls_first = False
+
     # Sequence name used in the default-next-value clauses for ``id``
     # and ``big-id`` columns. Read by the Ingres adapter when rewriting
     # CREATE TABLE statements to substitute a real sequence name.
@@ -576,7 +576,7 @@ class Mongo(NoSQLAdapter):
                 db(field.belongs(deleted)).update(**{field.name: None})
         return amount
 
-    def bulk_insert(self, table, items):
+    def bulk_insert(self, table, items, batch_size=None):
         return [self.insert(table, item) for item in items]
 
 
@@ -37,6 +37,10 @@ class MSSQL(SQLAdapter):
 
     dbengine = "mssql"
     drivers = ("pyodbc", "pytds", "pymssql", "mssql-python")
+    # MERGE; the id it wrote isn't reported.
+    can_upsert = True
+    # UPDATE/DELETE ... OUTPUT inserted.c / deleted.c
+    can_returning = True
 
     REGEX_DSN = "^.+$"
     REGEX_URI = (
@@ -189,6 +193,10 @@ class PyTDS(MSSQL):
 
 @adapters.register_for("vertica")
 class Vertica(MSSQL1):
+    # Vertica's MERGE takes no table hints, and it has no OUTPUT.
+    can_upsert = False
+    can_returning = False
+
     def lastrowid(self, table):
         self.execute("SELECT SCOPE_IDENTITY();")
         return int(self.cursor.fetchone()[0])
@@ -197,6 +205,8 @@ class Vertica(MSSQL1):
 @adapters.register_for("sybase")
 class Sybase(MSSQL1):
     dbengine = "sybase"
+    can_upsert = False
+    can_returning = False
 
     def _initialize_(self):
         super(MSSQL, self)._initialize_()
@@ -480,24 +490,61 @@ class MSSQLDialect(SQLDialect):
     def varquote(self, val):
         return varquote_aux(val, "[%s]")
 
-    def update(self, table, values, where=None):
+    def output(self, prefix, fields):
+        if not fields:
+            return ""
+        return " OUTPUT %s" % ",".join("%s.%s" % (prefix, f) for f in fields)
+
+    def update(self, table, values, where=None, returning=None):
         tablename = self.writing_alias(table)
         whr = ""
         if where:
             whr = " %s" % self.where(where)
-        return "UPDATE %s SET %s FROM %s%s;" % (
+        return "UPDATE %s SET %s%s FROM %s%s;" % (
             table.sql_shortref,
             values,
+            self.output("inserted", returning),
             tablename,
             whr,
         )
 
-    def delete(self, table, where=None):
+    def delete(self, table, where=None, returning=None):
         tablename = self.writing_alias(table)
         whr = ""
         if where:
             whr = " %s" % self.where(where)
-        return "DELETE %s FROM %s%s;" % (table.sql_shortref, tablename, whr)
+        return "DELETE %s%s FROM %s%s;" % (
+            table.sql_shortref,
+            self.output("deleted", returning),
+            tablename,
+            whr,
+        )
+
+    def upsert(self, table, fields, rows, conflict, update, id=None):
+        """
+        ``MERGE`` the rows, as a ``VALUES`` source, into ``table``;
+        ``HOLDLOCK`` keeps two upserts of one key from both inserting.
+        """
+        on = " AND ".join("tgt.%s=src.%s" % (f, f) for f in conflict)
+        matched = ""
+        if update:
+            matched = " WHEN MATCHED THEN UPDATE SET %s" % ",".join(
+                "%s=src.%s" % (f, f) for f in update
+            )
+        cols = ",".join(fields)
+        return (
+            "MERGE INTO %s WITH (HOLDLOCK) AS tgt USING (VALUES (%s)) AS src (%s) "
+            "ON %s%s WHEN NOT MATCHED THEN INSERT (%s) VALUES (%s);"
+            % (
+                table,
+                "),(".join(",".join(row) for row in rows),
+                cols,
+                on,
+                matched,
+                cols,
+                ",".join("src.%s" % f for f in fields),
+            )
+        )
 
     def select(
         self,
@@ -7,7 +7,7 @@
 import re
 
 from ..utils import split_uri_args
-from ..backend_base import adapters, with_connection
+from ..backend_base import adapters, with_connection, with_connection_or_raise
 from ..backend_base import SQLAdapter
 
 
@@ -32,7 +32,10 @@ class MySQL(SQLAdapter):
     drivers = ("MySQLdb", "pymysql", "mysqlconnector")
     commit_on_alter_table = True
     support_distributed_transaction = True
-
+    # LAST_INSERT_ID() is the first id of a multi-row INSERT.
+    bulk_insert_ids = "first"
+    can_upsert = True
+    upsert_ids = "last"
     REGEX_URI = (
         "^(?P<user>[^:@]+)(:(?P<password>[^@]*))?"
         r"@(?P<host>[^:/]*|\[[^\]]+\])(:(?P<port>\d+))?"
@@ -96,11 +99,43 @@ class MySQL(SQLAdapter):
             conn.cursor = lambda conn=conn: conn.cursor(buffered=True)
         return conn
 
+    def _after_first_connection(self):
+        """
+        Read ``auto_increment_increment``: multi-master setups (Galera,
+        ...) space the ids of a multi-row INSERT by more than one.
+        """
+        if self.bulk_insert_ids is not None:
+            self.execute("SELECT @@auto_increment_increment;")
+            self.bulk_insert_id_step = int(self.cursor.fetchone()[0])
+
     def after_connection(self):
         """Enable FK checks and disable backslash escapes for safer literals."""
         self.execute("SET FOREIGN_KEY_CHECKS=1;")
         self.execute("SET sql_mode='NO_BACKSLASH_ESCAPES';")
 
+    @property
+    def stream_blocks_connection(self):
+        # an unbuffered cursor must be read to the end before the next
+        # statement runs on its connection
+        return (
+            self.driver_name in ("MySQLdb", "pymysql")
+            and getattr(self.driver, "cursors", None) is not None
+        )
+
+    @with_connection_or_raise
+    def stream_cursor(self, connection=None):
+        """
+        An unbuffered ``SSCursor`` (MySQLdb, pymysql), so that an
+        ``iterselect`` reads the rows from the server as it goes instead
+        of loading the whole result on execute. It holds its connection,
+        so ``IterRows`` asks for it on a ``stream_connection``.
+        """
+        if self.stream_blocks_connection:
+            if connection is None:
+                connection = self.connection
+            return connection.cursor(self.driver.cursors.SSCursor)
+        return super(MySQL, self).stream_cursor(connection)
+
     def distributed_transaction_begin(self, key):
         """Open an MySQL XA transaction branch."""
         self.execute("XA START;")
@@ -128,6 +163,7 @@ class Cubrid(MySQL):
 
     dbengine = "cubrid"
     drivers = ("cubriddb",)
+    bulk_insert_ids = None
 
     def _initialize_(self):
         """Same as MySQL but the CUBRID driver doesn't accept ``charset=``."""
@@ -213,6 +249,20 @@ class MySQLDialect(SQLDialect):
     def insert_empty(self, table):
         return "INSERT INTO %s VALUES (DEFAULT);" % table
 
+    def upsert(self, table, fields, rows, conflict, update, id=None):
+        """``INSERT ... ON DUPLICATE KEY UPDATE`` (see ``MySQLCompiler``)."""
+        sets = ["%s=VALUES(%s)" % (f, f) for f in update]
+        if sets and id:
+            sets.insert(0, "%s=LAST_INSERT_ID(%s)" % (id, id))
+        elif not sets:
+            sets.append("%s=%s" % (conflict[0], conflict[0]))
+        return "INSERT INTO %s(%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s;" % (
+            table,
+            ",".join(fields),
+            "),(".join(",".join(row) for row in rows),
+            ",".join(sets),
+        )
+
     def delete(self, table, where=None):
         tablename = self.writing_alias(table)
         whr = ""
@@ -34,6 +34,8 @@ class Oracle(SQLAdapter):
 
     dbengine = "oracle"
     drivers = ("cx_Oracle",)
+    # MERGE; the id it wrote isn't reported.
+    can_upsert = True
 
     def _initialize_(self):
         super(Oracle, self)._initialize_()
@@ -214,6 +216,8 @@ class Oracle(SQLAdapter):
         return self.dialect.insert_empty(table._rname), None
 
     def insert(self, table, fields):
+        if self._batch is not None:
+            return self._batch.add("insert", table, fields)
         query, values = self._insert(table, fields)
         try:
             if not values:
@@ -301,6 +305,7 @@ class OracleDialect(SQLDialect):
 
     false_exp = "1=0"
     true_exp = "1=1"
+    nulls_first = False
 
     @sqltype_for("string")
     def type_string(self):
@@ -481,6 +486,35 @@ class OracleDialect(SQLDialect):
     def insert_empty(self, table):
         return "INSERT INTO %s VALUES (DEFAULT);" % table
 
+    def upsert(self, table, fields, rows, conflict, update, id=None):
+        """``MERGE`` from one ``SELECT ... FROM DUAL`` per row."""
+        fields = [self.quote(f) for f in fields]
+        source = " UNION ALL ".join(
+            "SELECT %s FROM DUAL"
+            % ",".join("%s %s" % (v, f) for v, f in zip(row, fields))
+            for row in rows
+        )
+        on = " AND ".join(
+            "tgt.%s=src.%s" % ((self.quote(f),) * 2) for f in conflict
+        )
+        matched = ""
+        if update:
+            matched = " WHEN MATCHED THEN UPDATE SET %s" % ",".join(
+                "tgt.%s=src.%s" % ((self.quote(f),) * 2) for f in update
+            )
+        return (
+            "MERGE INTO %s tgt USING (%s) src ON (%s)%s "
+            "WHEN NOT MATCHED THEN INSERT (%s) VALUES (%s);"
+            % (
+                self.quote(table),
+                source,
+                on,
+                matched,
+                ",".join(fields),
+                ",".join("src.%s" % f for f in fields),
+            )
+        )
+
     def _select_aux(self, sql, fields, attributes, colnames):
         return super._select_aux(sql, fields, attributes, colnames)
 
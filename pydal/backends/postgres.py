@@ -4,6 +4,7 @@
 # Adapter
 # ============================================================
 
+import itertools
 import os.path
 import re
 
@@ -13,6 +14,9 @@ from ..utils import split_uri_args
 from ..backend_base import AdapterMeta, adapters, with_connection, with_connection_or_raise
 from ..backend_base import SQLAdapter
 
+# names of the server-side cursors of ``stream_cursor``
+_stream_names = itertools.count(1)
+
 
 class PostgresMeta(AdapterMeta):
     """
@@ -54,6 +58,11 @@ class Postgres(SQLAdapter, metaclass=PostgresMeta):
     dbengine = "postgres"
     drivers = ("psycopg2",)
     support_distributed_transaction = True
+    # PostgresCompiler appends ``RETURNING <id>`` to every INSERT.
+    bulk_insert_ids = "returning"
+    can_upsert = True
+    upsert_ids = "returning"
+    can_returning = True
 
     REGEX_URI = (
         "^(?P<user>[^:@]+)(:(?P<password>[^@]*))?"
@@ -157,6 +166,23 @@ class Postgres(SQLAdapter, metaclass=PostgresMeta):
         self.execute("SET CLIENT_ENCODING TO 'UTF8'")
         self.execute("SET standard_conforming_strings=on;")
 
+    @with_connection_or_raise
+    def stream_cursor(self, connection=None):
+        """
+        A named (server-side) cursor, so that an ``iterselect`` fetches
+        ``batch_size`` rows from the server at a time instead of the
+        whole result on execute. It is declared WITH HOLD, to survive
+        the commits made while it is read; the ``IterRows`` closes it at
+        its end or when dropped, and a rollback or the closing of the
+        connection closes it too (``release_streams``).
+        """
+        if self.driver_name in ("psycopg2", "psycopg"):
+            if connection is None:
+                connection = self.connection
+            name = "pydal_stream_%d" % next(_stream_names)
+            return connection.cursor(name=name, withhold=True)
+        return super(Postgres, self).stream_cursor(connection)
+
     def lastrowid(self, table):
         if self._last_insert:
             return int(self.cursor.fetchone()[0])
@@ -166,11 +192,17 @@ class Postgres(SQLAdapter, metaclass=PostgresMeta):
 
     def _insert(self, table, fields):
         self._last_insert = None
+        if fields and hasattr(table, "_id"):
+            self._last_insert = (table._id, 1)
+        if self.compiler is not None:
+            # PostgresCompiler appends the same RETURNING clause.
+            try:
+                from ..ast_translate import table_to_insert
+                return self.compiler.compile_insert(table_to_insert(table, fields))
+            except NotImplementedError:
+                pass
         if fields:
-            retval = None
-            if hasattr(table, "_id"):
-                self._last_insert = (table._id, 1)
-                retval = table._id._rname
+            retval = table._id._rname if hasattr(table, "_id") else None
             return self.dialect.insert(
                 table._rname,
                 ",".join(el[0]._rname for el in fields),
@@ -335,6 +367,7 @@ class PostgresDialect(SQLDialect):
 
     true_exp = "TRUE"
     false_exp = "FALSE"
+    nulls_first = False
 
     @sqltype_for("blob")
     def type_blob(self):
@@ -189,6 +189,7 @@ class SnowflakeDialect(SQLDialect):
     true_exp = "TRUE"
     false_exp = "FALSE"
     quote_template = " %s "
+    nulls_first = False
 
     @sqltype_for("blob")
     def type_blob(self):
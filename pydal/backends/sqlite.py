@@ -6,6 +6,7 @@
 
 import platform
 import re
+import sqlite3
 import uuid
 from datetime import date, datetime
 from os.path import join as pjoin
@@ -40,6 +41,12 @@ class SQLite(SQLAdapter):
 
     dbengine = "sqlite"
     drivers = ("sqlite2", "sqlite3")
+    # A multi-row INSERT leaves lastrowid on its last row.
+    bulk_insert_ids = "last"
+    # ON CONFLICT arrived in SQLite 3.24, RETURNING in 3.35.
+    can_upsert = sqlite3.sqlite_version_info >= (3, 24, 0)
+    upsert_ids = "returning" if sqlite3.sqlite_version_info >= (3, 35, 0) else None
+    can_returning = sqlite3.sqlite_version_info >= (3, 35, 0)
 
     def _initialize_(self):
         self.pool_size = 0
@@ -109,19 +116,31 @@ class SQLite(SQLAdapter):
             self.execute("BEGIN IMMEDIATE TRANSACTION;")
         return super(SQLite, self).select(query, fields, attributes)
 
+    def _cascades(self, table):
+        return [
+            field
+            for field in table._referenced_by
+            if field.type == "reference " + table._dalname
+            and field.ondelete == "CASCADE"
+        ]
+
     def delete(self, table, query):
         db = self.db
         deleted = [x[table._id.name] for x in db(query).select(table._id)]
         counter = super(SQLite, self).delete(table, query)
         if counter:
-            for field in table._referenced_by:
-                if (
-                    field.type == "reference " + table._dalname
-                    and field.ondelete == "CASCADE"
-                ):
-                    db(field.belongs(deleted)).delete()
+            for field in self._cascades(table):
+                db(field.belongs(deleted)).delete()
         return counter
 
+    def delete_returning(self, table, query, returning):
+        if self._cascades(table):
+            # The cascade wants the deleted ids: select, then ``delete``.
+            rows = self.db(query).select(*returning)
+            self.delete(table, query)
+            return rows
+        return super(SQLite, self).delete_returning(table, query, returning)
+
 
 @adapters.register_for("spatialite", "spatialite:memory")
 class Spatialite(SQLite):
@@ -58,7 +58,7 @@ from os.path import join as pjoin
 from urllib.parse import unquote
 
 from ._globals import DEFAULT, GLOBAL_LOCKER, THREAD_LOCAL
-from .utils import hashlib_md5
+from .utils import hashlib_md5, to_native
 from ._load import OrderedDict
 from .backend_base import BaseAdapter, NullAdapter
 from .default_validators import default_validators
@@ -80,7 +80,7 @@ from .helpers.methods import (
 from .helpers.regex import REGEX_DBNAME, REGEX_PYTHON_KEYWORDS
 from .helpers.rest import RestParser
 from .helpers.serializers import serializers
-from .objects import Field, Row, Rows, Set, Table
+from .objects import Field, Param, Row, Rows, Set, Table
 
 TABLE_ARGS = set(
     (
@@ -192,6 +192,7 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
     Table = Table
     Rows = Rows
     Row = Row
+    Param = Param
 
     record_operators = {"update_record": RecordUpdater, "delete_record": RecordDeleter}
 
@@ -533,6 +534,22 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
         finally:
             self.close()
 
+    def batch(self):
+        """
+        Context manager: queue the inserts, updates and deletes issued in
+        the block and send them together on exit. They return
+        ``Deferred`` results, whose ``value`` is set once sent::
+
+            with db.batch():
+                db.audit.insert(action="login")
+                db(db.counter.name == "logins").update(n=db.counter.n + 1)
+                tag_id = db.tag.insert(name="x")
+            print(tag_id.value)
+
+        Any other statement (a select, a commit) sends the queue first.
+        """
+        return self._adapter.batch()
+
     @property
     def tables(self):
         return self._tables
@@ -672,6 +689,9 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
         table = table_class(self, tablename, *fields, **kwargs)
         table._actual = True
         self[tablename] = table
+        # Compiled statements embed physical table/column names.
+        if self._adapter.statement_cache is not None:
+            self._adapter.statement_cache.clear()
         # must follow above line to handle self references
         table._create_references()
         for field in table:
@@ -834,6 +854,7 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
         fields=None,
         colnames=None,
         as_ordered_dict=False,
+        rowtype=None,
     ):
         """
         Executes an arbitrary query
@@ -867,6 +888,10 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
                     will be converted to a DAL `Rows` object using the
                     `db._adapter.parse()` method
             colnames: list of field names in tablename.fieldname format
+            rowtype: "columns" returns a `Columns` mapping (column name ->
+                values) instead of a list of tuples or `Rows`. Without
+                `fields` or `colnames` the names come from the cursor and
+                the values are left as the driver returns them.
 
         Note:
             It is also possible to specify both "fields" and the associated
@@ -883,6 +908,7 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
 
         """
         adapter = self._adapter
+        processor = adapter.rowtype_processor(rowtype)
         if placeholders:
             adapter.execute(query, placeholders)
         else:
@@ -948,12 +974,17 @@ class DAL(Serializable, BasicStorage, metaclass=MetaDAL):
                         col_fields.append(t_f)
                     newcolnames.append(tf)
                 colnames = newcolnames
-            data = adapter.parse(
+            data = (processor or adapter.parse)(
                 data,
                 fields=extracted_fields
                 or [tf and self[tf[0]][tf[1]] for tf in col_fields],
                 colnames=colnames,
             )
+        elif processor is not None:
+            names = [
+                to_native(column[0]) for column in adapter.cursor.description or ()
+            ]
+            data = processor(data, [None] * len(names), names)
         return data
 
     def _remove_references_to(self, thistable):
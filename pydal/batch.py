@@ -0,0 +1,173 @@
+"""
+Statement batching: ``with db.batch():``.
+
+While a batch is open, ``Table.insert`` and ``Set.update`` /
+``Set.delete`` (and the adapter methods below them) queue their
+statement instead of running it, and hand back a ``Deferred`` whose
+``value`` — the new id, or the row count where it is known (see
+below) — is set once the queue is flushed. The queue is flushed when the block exits, and before any
+other statement runs on the connection (a select, a commit...), so the
+queued writes are always visible to later reads. The flush itself runs
+outside the batch: what it sends is executed, not queued again.
+
+A flush sends the queued statements in order, in as few calls as it
+can:
+
+* consecutive inserts into one table go out through ``bulk_insert``
+  (multi-row ``INSERT`` where the backend can report the ids);
+* consecutive updates or deletes with the same SQL text run as one
+  ``executemany``. The DB-API only reports a total row count for
+  those, so the ``Deferred`` of an update or delete is None, grouped
+  or not; statements of tables with ``_after_update`` /
+  ``_after_delete`` callbacks, which need the count, run one at a time
+  and resolve to it;
+* an insert may use the ``Deferred`` id of a row inserted earlier in
+  the batch as a value (``db.pet.insert(owner=person_id)``);
+* on drivers that offer it (psycopg 3's ``connection.pipeline()``),
+  the whole flush runs in pipeline mode.
+
+If the block raises, the queue is dropped and nothing in it runs.
+"""
+
+from __future__ import annotations
+
+
+class Deferred:
+    """The result of a statement queued in a batch."""
+
+    __slots__ = ("_value", "_done", "_callbacks")
+
+    def __init__(self):
+        self._value = None
+        self._done = False
+        self._callbacks = []
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def value(self):
+        if not self._done:
+            raise SyntaxError("Deferred: the batch has not been flushed yet")
+        return self._value
+
+    def then(self, callback):
+        """Call ``callback(value)`` once the value is known."""
+        if self._done:
+            callback(self._value)
+        else:
+            self._callbacks.append(callback)
+
+    def _resolve(self, value):
+        self._value, self._done = value, True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(value)
+
+    def __int__(self):
+        return int(self.value)
+
+    def __repr__(self):
+        if self._done:
+            return "<Deferred %r>" % (self._value,)
+        return "<Deferred (pending)>"
+
+
+def when_done(result, callback):
+    """``callback(result)`` now, or when ``result`` is a ``Deferred``
+    its value once the batch is flushed."""
+    if isinstance(result, Deferred):
+        result.then(callback)
+    else:
+        callback(result)
+
+
+def _value(value):
+    # ids of rows inserted earlier in the same batch are known by now
+    return value.value if isinstance(value, Deferred) else value
+
+
+class Batch:
+    """The queue of one ``adapter.batch()`` block."""
+
+    def __init__(self, adapter):
+        self._adapter = adapter
+        self.queue = []
+
+    def __len__(self):
+        return len(self.queue)
+
+    def add(self, kind, table, payload):
+        """
+        Queue a statement; ``kind`` is "insert" (``payload`` is the
+        ``op_values`` list) or "update"/"delete" (``payload`` is the
+        compiled SQL).
+        """
+        deferred = Deferred()
+        self.queue.append((kind, table, payload, deferred))
+        return deferred
+
+    def flush(self):
+        """Run the queued statements; the queue is empty afterwards."""
+        queue, self.queue = self.queue, []
+        if not queue:
+            return
+        adapter = self._adapter
+        # the inserts bulk_insert falls back to must run, not queue
+        batch, adapter._batch = adapter._batch, None
+        try:
+            with adapter.driver_io.pipeline():
+                k = 0
+                while k < len(queue):
+                    run = self._run(queue, k)
+                    self._send(run)
+                    k += len(run)
+        finally:
+            adapter._batch = batch
+
+    def _send(self, run):
+        """Run the statements of one ``_run`` and resolve their Deferreds."""
+        adapter = self._adapter
+        kind, table, payload, _ = run[0]
+        deferreds = [item[3] for item in run]
+        if kind == "insert":
+            items = [[(f, _value(v)) for f, v in item[2]] for item in run]
+            ids = adapter.bulk_insert(table, items)
+            for deferred, id in zip(deferreds, ids):
+                deferred._resolve(id)
+        elif getattr(table, "_after_" + kind, None):
+            deferreds[0]._resolve(adapter._run_write(payload))
+        else:
+            if len(run) > 1:
+                adapter.executemany(payload, [item[2].params for item in run])
+            else:
+                adapter.execute(payload)
+            for deferred in deferreds:
+                deferred._resolve(None)
+
+    def _run(self, queue, k):
+        """The queued statements from ``k`` on that can go out together."""
+        kind, table, payload, _ = queue[k]
+        if kind == "insert":
+            # stop before an insert that needs an id from this very run
+            same = lambda item: (
+                item[0] == kind
+                and item[1] is table
+                and not any(
+                    isinstance(v, Deferred) and not v.done for _, v in item[2]
+                )
+            )
+        elif getattr(payload, "params", None) and not getattr(
+            table, "_after_" + kind, None
+        ):
+            same = lambda item: item[0] == kind and str(item[2]) == str(payload)
+        else:
+            return queue[k:k + 1]
+        end = k + 1
+        while end < len(queue) and same(queue[end]):
+            end += 1
+        return queue[k:end]
+
+
+__all__ = ["Batch", "Deferred", "when_done"]
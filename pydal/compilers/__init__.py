@@ -24,5 +24,13 @@ compilers: Dispatcher = Dispatcher("compiler")
 # side-effects so the registry is populated.
 from .sql import SQLCompiler       # noqa: E402, F401  (side-effect import)
 from .sqlite import SQLiteCompiler  # noqa: E402, F401  (side-effect import)
+from .postgres import PostgresCompiler  # noqa: E402, F401  (side-effect import)
+from .mysql import MySQLCompiler    # noqa: E402, F401  (side-effect import)
 
-__all__ = ["SQLCompiler", "SQLiteCompiler", "compilers"]
+__all__ = [
+    "MySQLCompiler",
+    "PostgresCompiler",
+    "SQLCompiler",
+    "SQLiteCompiler",
+    "compilers",
+]
@@ -0,0 +1,231 @@
+"""
+StatementCache: compiled-SQL memo keyed by AST shape.
+
+Most applications issue the same handful of query shapes over and over,
+with only the literal values changing (``db.person.id == 42``,
+``db.person.id == 43``, ...). Rendering each one from scratch is wasted
+work: the SQL text is identical, only the bound parameters differ.
+
+``fingerprint`` walks a statement node and produces a hashable key in
+which every *bindable* ``Literal`` (one the compiler would turn into a
+placeholder) is replaced by a typed slot. The literals themselves are
+returned alongside, in walk order. The compiler stores, per key, the
+rendered SQL plus the slot index that fed each placeholder; on a hit
+it only re-adapts the fresh literal values into a new ``ParamSQL``.
+
+Literals that look bindable but were rendered inline anyway (LIKE
+patterns, for instance) are recorded as *pinned* slots: their values
+become part of a secondary key so two queries that differ only in an
+inlined value never share an entry.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict, namedtuple
+from dataclasses import fields as _dc_fields
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .. import ast
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class _Slot:
+    """Marker token standing in for a bindable Literal in a fingerprint."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<slot>"
+
+
+SLOT = _Slot()
+
+# Per node class, a getter returning its dataclass fields in reverse
+# order (ready to push on the walk stack), resolved once.
+# (``attrgetter`` with a single name returns the bare value, hence the
+# wrapper for one-field nodes.)
+def _fields_getter(cls: type) -> Callable[[Any], Tuple[Any, ...]]:
+    names = [f.name for f in _dc_fields(cls)][::-1]
+    if len(names) == 1:
+        get = attrgetter(names[0])
+        return lambda item: (get(item),)
+    return attrgetter(*names)
+
+
+_NODE_FIELDS: Dict[type, Callable[[Any], Tuple[Any, ...]]] = {
+    cls: _fields_getter(cls) for cls in ast.NODE_TYPES
+}
+
+
+def fingerprint(
+    node: ast.Node, bindable: Callable[[ast.Literal], bool]
+) -> Tuple[Tuple[Any, ...], List[ast.Literal]]:
+    """
+    Return ``(key, slots)`` for ``node``.
+
+    ``key`` is a flat pre-order token tuple describing the tree with
+    every literal accepted by ``bindable`` replaced by ``SLOT`` (its
+    type is kept: it drives the bind adaptation). ``slots`` lists those
+    literals in walk order. The walk is iterative so very deep
+    ``and``/``or`` chains don't hit the recursion limit.
+
+    Values of inlined literals are tagged with their Python type so
+    that ``1``, ``1.0`` and ``True`` — equal and equal-hashing, but
+    rendered differently — never collide. Other primitives (op names,
+    identifiers, flags) are emitted as-is: their position in the
+    stream already fixes what they mean.
+    """
+    out: List[Any] = []
+    slots: List[ast.Literal] = []
+    append = out.append
+    stack: List[Any] = [node]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    Literal, FieldRef, BinOp = ast.Literal, ast.FieldRef, ast.BinOp
+    UnaryOp, FuncCall, TableRef = ast.UnaryOp, ast.FuncCall, ast.TableRef
+    node_fields = _NODE_FIELDS
+    while stack:
+        item = pop()
+        cls = type(item)
+        if cls is BinOp:
+            append(BinOp)
+            append(item.op)
+            append(item.opts)
+            push(item.right)
+            push(item.left)
+        elif cls is FieldRef:
+            append(FieldRef)
+            append(item.table)
+            append(item.name)
+            append(item.sqlsafe)
+        elif cls is Literal:
+            if bindable(item):
+                append(SLOT)
+                append(item.type)
+                slots.append(item)
+            else:
+                append(Literal)
+                append(item.type)
+                append(type(item.value))
+                append(item.value)
+        elif cls is TableRef:
+            append(TableRef)
+            append(item.name)
+            append(item.alias)
+        elif cls is UnaryOp:
+            append(UnaryOp)
+            append(item.op)
+            append(item.opts)
+            push(item.operand)
+        elif cls is FuncCall:
+            append(FuncCall)
+            append(item.name)
+            append(item.opts)
+            append(len(item.args))
+            extend(item.args[::-1])
+        elif cls is tuple or cls is list:
+            append(tuple)
+            append(len(item))
+            extend(item[::-1])
+        elif cls in node_fields:
+            append(cls)
+            extend(node_fields[cls](item))
+        else:
+            append(item)
+    return tuple(out), slots
+
+
+class StatementCache:
+    """
+    Bounded LRU of compiled statements.
+
+    Entries are keyed by fingerprint (plus the compiler knobs that
+    change the rendering). Each entry remembers which slots were pinned
+    (rendered inline) and holds one compiled variant per distinct set
+    of pinned values, so the common all-bound case is a single lookup.
+
+    ``hits``/``misses`` count lookups; ``clear()`` drops every entry
+    (the adapter calls it when a table is defined or dropped, since
+    compiled text embeds physical table and column names).
+    """
+
+    # Cap on the number of pinned-value variants kept per shape, so a
+    # LIKE on user input can't grow one entry without bound.
+    max_variants = 16
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, Tuple[Tuple[int, ...], Dict]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def info(self) -> CacheInfo:
+        """Return a ``CacheInfo(hits, misses, maxsize, currsize)`` tuple."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self) -> None:
+        """Drop every cached statement (counters are kept)."""
+        self._entries.clear()
+
+    def get(self, key, slots: List[ast.Literal]) -> Optional[Tuple[str, Tuple[int, ...]]]:
+        """
+        Return ``(sql, extractor)`` for ``key`` or ``None`` on a miss.
+
+        ``slots`` are the literals collected by ``fingerprint``; their
+        values are only consulted for the pinned positions.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            pinned, variants = entry
+            compiled = variants.get(_pinned_values(pinned, slots))
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        key,
+        slots: List[ast.Literal],
+        sql: str,
+        extractor: Tuple[int, ...],
+    ) -> None:
+        """Store ``sql`` with the slot ``extractor`` that feeds its params."""
+        if self.maxsize <= 0:
+            return
+        used = set(extractor)
+        pinned = tuple(i for i in range(len(slots)) if i not in used)
+        try:
+            variant = _pinned_values(pinned, slots)
+            hash(variant)
+        except TypeError:
+            return
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != pinned:
+            entry = (pinned, {})
+            self._entries[key] = entry
+        variants = entry[1]
+        if len(variants) >= self.max_variants:
+            variants.pop(next(iter(variants)))
+        variants[variant] = (sql, extractor)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+def _pinned_values(pinned: Tuple[int, ...], slots: List[ast.Literal]) -> Tuple:
+    if not pinned:
+        return ()
+    return tuple((type(slots[i].value), slots[i].value) for i in pinned)
+
+
+__all__ = ["CacheInfo", "StatementCache", "fingerprint"]
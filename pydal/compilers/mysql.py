@@ -0,0 +1,142 @@
+"""
+MySQLCompiler: MySQL-specific overrides.
+
+Mirrors the deltas in pydal/backends/mysql.py (``MySQLDialect``):
+
+* identifiers are quoted with backticks.
+* ``regexp`` is the native ``REGEXP`` operator.
+* ``substring`` is ``SUBSTRING``; ``epoch`` is ``UNIX_TIMESTAMP``.
+* ``CAST(... AS LONGTEXT)`` becomes ``CAST(... AS CHAR)``.
+* DELETE names the target twice (``DELETE t FROM t ...``) and an empty
+  INSERT is ``VALUES (DEFAULT)``.
+
+Statements are parameterized with ``%s`` placeholders (MySQLdb, pymysql
+and mysql.connector all accept ``format``).
+"""
+
+from __future__ import annotations
+
+from .. import ast
+from ..backends.mysql import MySQL
+from . import compilers
+from .sql import SQLCompiler
+
+
+# Types ``CONCAT`` takes as-is; anything else is cast to CHAR first
+# (what ``SQLAdapter._expand(..., "string")`` does on the legacy path).
+_TEXT_TYPES = frozenset(("string", "text", "json", "jsonb", "password"))
+
+@compilers.register_for(MySQL)
+class MySQLCompiler(SQLCompiler):
+    """
+    MySQL compiler. Binds parameters with ``%s`` placeholders and
+    renders bare booleans as ``1``/``0``.
+    """
+
+    quote_template = "`%s`"
+    # Bare boolean expressions; boolean *columns* keep the dialect's
+    # "T"/"F" tokens (``true_token``/``false_token``) like every other
+    # CHAR(1)-backed backend.
+    true_exp = "1"
+    false_exp = "0"
+    parameterize = True
+    placeholder_style = "format"
+    # Prepared-statement placeholder limit (the text protocol has none,
+    # but packets still have to fit max_allowed_packet).
+    max_params = 65535
+
+    def _compile_insert_body(self, n: ast.Insert) -> str:
+        if not n.rows or not n.rows[0]:
+            table = n.sqlsafe if n.sqlsafe is not None else self._table_sql(n.table)
+            ret = self._returning_sql(n.table, n.returning)
+            return "INSERT INTO %s VALUES (DEFAULT)%s;" % (table, ret)
+        return super()._compile_insert_body(n)
+
+    def _compile_upsert_body(self, n: ast.Upsert) -> str:
+        """
+        ``INSERT ... ON DUPLICATE KEY UPDATE ...;``. MySQL checks every
+        unique key, so ``n.conflict`` only picks the no-op assignment
+        used when there is nothing to update. Updating the id through
+        ``LAST_INSERT_ID(id)`` makes ``lastrowid`` report the existing
+        row too.
+        """
+        if not n.insert.cols:
+            raise NotImplementedError("upsert without columns")
+        tablename = n.insert.table
+        sets = [
+            "%s=VALUES(%s)" % (c, c)
+            for c in (self._column_sql(tablename, name) for name in n.update)
+        ]
+        table = self.adapter.db.get(tablename) if self.adapter is not None else None
+        if sets and table is not None and hasattr(table, "_id"):
+            sets.insert(0, "%s=LAST_INSERT_ID(%s)" % ((table._id._rname,) * 2))
+        elif not sets:
+            key = self._column_sql(tablename, n.conflict[0])
+            sets.append("%s=%s" % (key, key))
+        return "%s ON DUPLICATE KEY UPDATE %s;" % (
+            self._insert_sql(n.insert), ",".join(sets),
+        )
+
+    def _compile_delete_body(self, n: ast.Delete) -> str:
+        """``DELETE <shortref> FROM <table> [WHERE ...];``"""
+        table = self.adapter.db.get(n.table) if self.adapter is not None else None
+        if table is None:
+            shortref = target = n.sqlsafe or self.q(n.table)
+        else:
+            shortref = table._rname
+            target = n.sqlsafe if n.sqlsafe is not None else table._rname
+            if target != shortref:
+                # Aliased delete: the short reference is the alias, which
+                # only the legacy dialect keeps track of.
+                raise NotImplementedError("aliased DELETE")
+        self._scope_stack.append(frozenset({n.table}))
+        try:
+            whr = " WHERE %s" % self.visit(n.where) if n.where is not None else ""
+            ret = self._returning_sql(n.table, n.returning)
+            return "DELETE %s FROM %s%s%s;" % (shortref, target, whr, ret)
+        finally:
+            self._scope_stack.pop()
+
+    def op_add(self, l, r, opts):
+        """Numeric ``+``; everything else is ``CONCAT(left, right)``."""
+        ltype = opts.get("left_type")
+        if ltype is None or self._is_numerical_type(ltype):
+            return super().op_add(l, r, opts)
+        left = self.visit(l)
+        if ltype not in _TEXT_TYPES:
+            left = "CAST(%s AS CHAR)" % left
+        right = (
+            self._represent(r.value, "string") if isinstance(r, ast.Literal)
+            else self.visit(r)
+        )
+        return "CONCAT(%s,%s)" % (left, right)
+
+    def op_regexp(self, l, r, _):
+        """Render ``(left REGEXP right)``."""
+        return "(%s REGEXP %s)" % (
+            self.visit(l),
+            self._represent(r.value, "string") if isinstance(r, ast.Literal)
+            else self.visit(r),
+        )
+
+    def un_epoch(self, x, _):
+        """Render ``UNIX_TIMESTAMP(operand)``."""
+        return "UNIX_TIMESTAMP(%s)" % self.visit(x)
+
+    def fn_substring(self, args, _):
+        """Render ``SUBSTRING(field, pos, length)``."""
+        return "SUBSTRING(%s,%s,%s)" % (
+            self.visit(args[0]),
+            self.visit(args[1]),
+            self.visit(args[2]),
+        )
+
+    def fn_cast(self, args, opts):
+        """Render ``CAST(arg AS <type>)``; ``LONGTEXT`` is spelled ``CHAR``."""
+        to = opts.get("to", "")
+        return "CAST(%s AS %s)" % (
+            self.visit(args[0]), "CHAR" if to == "LONGTEXT" else to,
+        )
+
+
+__all__ = ["MySQLCompiler"]
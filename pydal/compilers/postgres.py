@@ -0,0 +1,205 @@
+"""
+PostgresCompiler: PostgreSQL-specific overrides.
+
+Mirrors the deltas in pydal/backends/postgres.py (``PostgresDialect``
+and ``PostgresDialectJSON``):
+
+* ``regexp`` is the native ``~`` operator.
+* ``ilike`` is the native ``ILIKE``; LIKE/ILIKE on non-text columns
+  cast the column to ``CHAR(length)`` first.
+* ``add`` concatenates (``||``) for every text-like type, JSON included.
+* INSERT appends ``RETURNING <id>`` so the adapter reads the new id off
+  the same round-trip.
+* JSON accessors ``->``, ``->>``, ``#>``, ``#>>`` and ``@>`` containment.
+* a large integer or string ``IN`` list becomes ``x = ANY(%s)`` with the
+  values bound as one array.
+
+Statements are parameterized with ``%s`` placeholders (psycopg2 and
+pg8000 both speak ``format``).
+"""
+
+from __future__ import annotations
+
+from .. import ast
+from ..backends.postgres import JDBCPostgres, Postgres, PostgresDialectArrays
+from . import compilers
+from .sql import SQLCompiler
+
+
+# Column types LIKE / ILIKE compare without a cast (PostgresDialect.like
+# and .ilike; ILIKE also accepts the pipe-encoded list:string).
+_LIKE_TYPES = frozenset(("string", "text", "json", "jsonb"))
+_ILIKE_TYPES = _LIKE_TYPES | {"list:string"}
+# Left operand types for which ``+`` means string concatenation.
+_CONCAT_TYPES = frozenset(
+    ("text", "string", "password", "json", "jsonb", "upload", "blob")
+)
+# Column types bound as an ``= ANY(array)`` parameter, with the Python
+# type every value must have so the driver builds a matching array.
+_ARRAY_TYPES = {
+    "id": int, "integer": int, "bigint": int,
+    "string": str, "text": str, "password": str,
+}
+
+
+@compilers.register_for(Postgres)
+class PostgresCompiler(SQLCompiler):
+    """
+    PostgreSQL compiler. Binds parameters with ``%s`` placeholders,
+    renders ``TRUE``/``FALSE`` for bare booleans and returns the new id
+    from INSERT via ``RETURNING``.
+    """
+
+    true_exp = "TRUE"
+    false_exp = "FALSE"
+    parameterize = True
+    placeholder_style = "format"
+    # The driver adapts a Python list to an ARRAY parameter (psycopg2,
+    # psycopg 3 and pg8000 all do).
+    bind_arrays = True
+    # The wire protocol counts parameters in an int16.
+    max_params = 65535
+    returning = True
+
+    def _compile_insert_body(self, n: ast.Insert) -> str:
+        """
+        Base INSERT plus ``RETURNING <id>`` (see ``Postgres._insert``)
+        unless the node asks for its own columns back.
+        """
+        sql = super()._compile_insert_body(n)
+        if n.rows and n.rows[0] and not n.returning:
+            sql = self._returning_id(n.table, sql)
+        return sql
+
+    def _compile_upsert_body(self, n: ast.Upsert) -> str:
+        """Base upsert plus ``RETURNING <id>`` of each row written."""
+        return self._returning_id(n.insert.table, super()._compile_upsert_body(n))
+
+    def _large_in_list(self, n: ast.InList) -> str:
+        """``(x = ANY(%s))`` with the values bound as one array parameter."""
+        binds = self._in_list_binds(n) if self.bind_arrays else None
+        if binds is not None:
+            type_, values = binds
+            pytype = _ARRAY_TYPES.get(
+                "integer" if type_.startswith("reference ") else type_
+            )
+            if pytype is not None and all(type(v) is pytype for v in values):
+                assert self._ctx is not None
+                return "(%s = ANY(%s))" % (self.visit(n.expr), self._ctx.bind(values, n))
+        return super()._large_in_list(n)
+
+    # ---- string match ----
+
+    def _text_operand(self, l: ast.Node, text_types) -> str:
+        """
+        Render the left side of LIKE/ILIKE, cast to ``CHAR(length)`` when
+        it is a non-text column. Operands whose type can't be resolved
+        here (aliased tables, arbitrary expressions) are left to the
+        legacy dialect.
+        """
+        if isinstance(l, ast.FieldRef):
+            table = self.adapter.db.get(l.table) if self.adapter is not None else None
+            if table is None or l.name not in table.fields:
+                raise NotImplementedError("LIKE on unresolved column %s" % l.name)
+            field = table[l.name]
+            if field.type not in text_types:
+                return "CAST(%s AS CHAR(%s))" % (self.visit(l), field.length)
+            return self.visit(l)
+        if isinstance(l, ast.UnaryOp) and l.op in ("lower", "upper"):
+            return self.visit(l)
+        raise NotImplementedError("LIKE on a %s operand" % type(l).__name__)
+
+    def _pg_like(self, keyword, l, r, escape, text_types) -> str:
+        if isinstance(r, ast.Literal):
+            pattern = str(self._represent(r.value, "string"))
+            if escape is None:
+                escape = "\\"
+                pattern = pattern.replace(escape, escape * 2)
+        else:
+            pattern = self.visit(r)
+            if escape is None:
+                escape = "\\"
+        return "(%s %s %s ESCAPE '%s')" % (
+            self._text_operand(l, text_types), keyword, pattern, escape,
+        )
+
+    def op_like(self, l, r, opts):
+        """Render ``(left LIKE right ESCAPE '...')``."""
+        return self._pg_like("LIKE", l, r, opts.get("escape"), _LIKE_TYPES)
+
+    def op_ilike(self, l, r, opts):
+        """Render ``(left ILIKE right ESCAPE '...')`` — no ``LOWER()`` wrapping."""
+        return self._pg_like("ILIKE", l, r, opts.get("escape"), _ILIKE_TYPES)
+
+    def op_contains(self, l, r, opts):
+        """
+        Same as the base, except list:* columns on the array dialects:
+        those are native arrays matched with ``ANY(...)``, which stays on
+        the legacy path.
+        """
+        ltype = opts.get("left_type") or ""
+        if ltype.startswith("list:") and isinstance(
+            getattr(self.adapter, "dialect", None), PostgresDialectArrays
+        ):
+            raise NotImplementedError("contains on a native array column")
+        return super().op_contains(l, r, opts)
+
+    def op_regexp(self, l, r, _):
+        """Render ``(left ~ right)``."""
+        return "(%s ~ %s)" % (
+            self.visit(l),
+            self._represent(r.value, "string") if isinstance(r, ast.Literal)
+            else self.visit(r),
+        )
+
+    def op_add(self, l, r, opts):
+        """``||`` for text-like left operands (JSON included), ``+`` otherwise."""
+        if opts.get("left_type") in _CONCAT_TYPES:
+            return "(%s || %s)" % (self.visit(l), self.visit(r))
+        return "(%s + %s)" % (self.visit(l), self.visit(r))
+
+    # ---- JSON ----
+
+    def _json_key(self, r: ast.Node, key_type: str) -> str:
+        key = r.value if isinstance(r, ast.Literal) else None
+        if isinstance(key, str):
+            return str(self._represent(key, "string"))
+        if isinstance(key, int) and not isinstance(key, bool):
+            return str(self._represent(key, key_type))
+        raise TypeError("Key must be a string or int")
+
+    def _json_literal(self, r: ast.Node) -> str:
+        if not isinstance(r, ast.Literal):
+            raise NotImplementedError("JSON operand must be a literal")
+        return self.adapter.adapt(r.value)
+
+    def op_json_key(self, l, r, _):
+        """Render ``left->key`` (JSON sub-document)."""
+        return "%s->%s" % (self.visit(l), self._json_key(r, "integer"))
+
+    def op_json_key_value(self, l, r, _):
+        """Render ``left->>key`` (text/int value)."""
+        return "%s->>%s" % (self.visit(l), self._json_key(r, "integer"))
+
+    def op_json_path(self, l, r, _):
+        """Render ``left#>'{path}'`` (JSON sub-document)."""
+        return "%s#>%s" % (self.visit(l), self._json_literal(r))
+
+    def op_json_path_value(self, l, r, _):
+        """Render ``left#>>'{path}'`` (text value)."""
+        return "%s#>>%s" % (self.visit(l), self._json_literal(r))
+
+    def op_json_contains(self, l, r, _):
+        """Render ``left::jsonb@>'value'::jsonb``."""
+        return "%s::jsonb@>%s::jsonb" % (self.visit(l), self._json_literal(r))
+
+
+@compilers.register_for(JDBCPostgres)
+class JDBCPostgresCompiler(PostgresCompiler):
+    """zxJDBC takes ``?`` placeholders and no list parameters."""
+
+    placeholder_style = "qmark"
+    bind_arrays = False
+
+
+__all__ = ["JDBCPostgresCompiler", "PostgresCompiler"]
@@ -15,11 +15,27 @@ that responsibility into the compiler itself (or a dedicated Renderer).
 from __future__ import annotations
 
 import datetime as _datetime
-from typing import Any, Callable, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 from .. import ast
 from ..backend_base import SQLAdapter
 from . import compilers
+from .cache import fingerprint
+
+
+def _never(_node) -> bool:
+    return False
+
+
+# Stand-in emitted by ``Ctx.bind`` for the ``%``-based placeholder styles.
+_PCT_MARK = "\x00"
+
+# Shared ``opts`` mapping for the (common) nodes that carry none.
+_NO_OPTS: Mapping[str, Any] = MappingProxyType({})
+
+# SQL keyword for the logical BinOps rendered by ``_logical``.
+_LOGICAL_SQL = {"and": " AND ", "or": " OR "}
 
 
 class ParamSQL(str):
@@ -57,27 +73,50 @@ class Ctx:
     the dialect (``?``, ``$N``, ``%s``, ...).
     """
 
-    __slots__ = ("params", "placeholder_style")
+    __slots__ = ("params", "placeholder_style", "origins")
 
     def __init__(self, placeholder_style: str = "qmark"):
         self.params: List[Any] = []
         self.placeholder_style = placeholder_style
+        # Source node of every bound value, parallel to ``params``. Only
+        # populated while the statement cache is recording a miss.
+        self.origins: Optional[List[Any]] = None
 
-    def bind(self, value: Any) -> str:
+    def bind(self, value: Any, origin: Any = None) -> str:
         """Append ``value`` to the params list and return its placeholder."""
         self.params.append(value)
-        idx = len(self.params)
+        if self.origins is not None:
+            self.origins.append(origin)
         style = self.placeholder_style
         if style == "qmark":
             return "?"
         if style == "numeric":
-            return "$%d" % idx
-        if style == "format":
-            return "%s"
-        if style == "pyformat":
-            return "%%(p%d)s" % idx
+            return "$%d" % len(self.params)
+        if style in ("format", "pyformat"):
+            # Resolved in ``finish`` once the whole statement is known.
+            return _PCT_MARK
         raise ValueError("unknown placeholder_style %r" % style)
 
+    def finish(self, sql: str) -> "ParamSQL":
+        """
+        Wrap ``sql`` and the collected params into a ``ParamSQL``.
+
+        The ``format``/``pyformat`` drivers (psycopg2, MySQLdb, pymysql)
+        run the whole statement through ``%`` interpolation when params
+        are passed, so any literal ``%`` (LIKE patterns, modulo, raw
+        fragments) is doubled before the placeholders are filled in.
+        """
+        if _PCT_MARK in sql:
+            parts = sql.replace("%", "%%").split(_PCT_MARK)
+            if self.placeholder_style == "format":
+                sql = "%s".join(parts)
+            else:
+                sql = parts[0] + "".join(
+                    "%%(p%d)s%s" % (i, part)
+                    for i, part in enumerate(parts[1:], 1)
+                )
+        return ParamSQL(sql, self.params)
+
 
 # Field types eligible for parameter binding. For each, ``_adapt_for_bind``
 # below converts the Python value into the wire form (matching pydal's
@@ -105,15 +144,26 @@ class SQLCompiler:
     plus dispatch tables for BinOp/UnaryOp/FuncCall that route to
     ``op_<name>`` / ``un_<name>`` / ``fn_<name>`` methods. Override one
     of those to customize one operator for one backend.
+
+    The tables are built once per class (``_build_dispatch``, re-run by
+    ``__init_subclass__`` so overrides are picked up) and hold plain
+    functions, so a visit costs one dict lookup instead of a string
+    concatenation plus ``getattr``.
     """
 
+    # ---- dispatch tables (per class, see _build_dispatch) ----
+    _visitors: Dict[type, Callable[..., str]] = {}
+    _binops: Dict[str, Callable[..., str]] = {}
+    _unops: Dict[str, Callable[..., str]] = {}
+    _funcs: Dict[str, Callable[..., str]] = {}
+
     # ---- knobs subclasses may tweak ----
     quote_template: str = '"%s"'
     true_exp: str = "1"
     false_exp: str = "0"
     # Bound-form tokens for boolean values. Mirror ``SQLDialect.true``/
-    # ``false`` — "T"/"F" for the SQL base; subclasses override
-    # (mysql uses "1"/"0", etc.).
+    # ``false`` — "T"/"F" for the SQL base; subclasses override where
+    # the dialect does (MSSQL stores 1/0).
     true_token: str = "T"
     false_token: str = "F"
     # Separator between date and time in a datetime literal — matches
@@ -126,6 +176,25 @@ class SQLCompiler:
     parameterize: bool = False
     # DB-API placeholder style. Subclasses set this to match their driver.
     placeholder_style: str = "qmark"
+    # Collation that compares ASCII letters case-insensitively and
+    # otherwise byte-for-byte, when the backend has one; lets
+    # ``ast_optimize`` turn ``lower(col) == 'x'`` into an indexable
+    # ``col = 'x' COLLATE <name>``.
+    nocase_collation: Optional[str] = None
+    # ``IN`` lists with more values than this go through
+    # ``_large_in_list``: OR-ed groups of ``in_list_chunk`` values here,
+    # one bound array/JSON document where the backend can take it.
+    large_in_list: int = 1000
+    in_list_chunk: int = 1000
+    # Most bound parameters one statement may carry; sizes multi-row
+    # INSERT batches. 999 is SQLite's historical limit, a safe floor.
+    max_params: int = 999
+    # Whether INSERT/UPDATE/DELETE take a ``RETURNING`` clause; nodes
+    # asking for one raise NotImplementedError where they don't.
+    returning: bool = False
+    # ``BulkUpdate`` joins a ``VALUES`` list (``UPDATE ... FROM``)
+    # instead of one ``CASE key WHEN ...`` per column.
+    update_from_values: bool = False
 
     def __init__(
         self,
@@ -162,6 +231,32 @@ class SQLCompiler:
         # ``belongs(set.subselect(...))``). Lets correlated subqueries
         # prune outer-scoped tables from their own FROM clause.
         self._scope_stack: list = []
+        # Set by ``compile_prepared`` — ``Param`` nodes are rejected
+        # anywhere else.
+        self._allow_params = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._build_dispatch()
+
+    @classmethod
+    def _build_dispatch(cls) -> None:
+        """Collect ``v_*`` / ``op_*`` / ``un_*`` / ``fn_*`` into lookup tables."""
+        cls._visitors = {
+            node: getattr(cls, "v_" + node.__name__)
+            for node in ast.NODE_TYPES
+            if hasattr(cls, "v_" + node.__name__)
+        }
+        tables: Dict[str, Dict[str, Callable[..., str]]] = {
+            "op_": {}, "un_": {}, "fn_": {},
+        }
+        for name in dir(cls):
+            table = tables.get(name[:3])
+            if table is not None:
+                table[name[3:]] = getattr(cls, name)
+        cls._binops, cls._unops, cls._funcs = (
+            tables["op_"], tables["un_"], tables["fn_"],
+        )
 
     # ------------------------------------------------------------------ entry
 
@@ -176,7 +271,7 @@ class SQLCompiler:
         self._ctx = None
         if ctx is None:
             return sql
-        return ParamSQL(sql, ctx.params)
+        return ctx.finish(sql)
 
     def compile_expression(self, node: ast.Node):
         """
@@ -190,7 +285,7 @@ class SQLCompiler:
             sql = self.visit(node)
         finally:
             self._ctx = None
-        return ParamSQL(sql, ctx.params) if ctx is not None else sql
+        return ctx.finish(sql) if ctx is not None else sql
 
     # ----- statement entry points (Layer 2c) -----
 
@@ -202,12 +297,87 @@ class SQLCompiler:
         single-table shape: fields, sources, WHERE, GROUP BY/HAVING,
         ORDER BY, LIMIT/OFFSET, FOR UPDATE, DISTINCT(/ON).
         """
+        return self._compile_statement(n, self._compile_select_body)
+
+    def compile_prepared(self, n: ast.Select):
+        """
+        Compile a ``Select`` that may contain ``Param`` placeholders.
+
+        Returns a ``ParamSQL`` whose ``params`` hold the bound literal
+        values with each placeholder's ``ast.Param`` node in its slot;
+        ``PreparedSelect`` swaps in the caller's values at execution
+        time. Bypasses the statement cache: a prepared statement is
+        compiled once and kept by its owner.
+        """
+        if not self.parameterize:
+            raise NotImplementedError(
+                "%s does not bind parameters; prepared queries need a "
+                "parameterizing compiler" % type(self).__name__
+            )
+        self._allow_params = True
+        try:
+            return self._render_statement(n, self._compile_select_body, None)
+        finally:
+            self._allow_params = False
+
+    def _statement_cache(self):
+        if self.adapter is None:
+            return None
+        return getattr(self.adapter, "statement_cache", None)
+
+    def _compile_statement(self, n: ast.Node, render: Callable[[Any], str]):
+        """
+        Run ``render(n)`` inside a fresh binding context, going through
+        the adapter's ``StatementCache`` when one is attached.
+
+        On a hit the SQL text is reused and only the literal values
+        collected by the fingerprint walk are adapted into params. On a
+        miss the statement is rendered while recording which literal
+        fed each placeholder, and stored for next time.
+        """
+        cache = self._statement_cache()
+        if cache is None or self._scope_stack:
+            return self._render_statement(n, render, None)
+        bindable = self._bindable if self.parameterize else _never
+        fp, slots = fingerprint(n, bindable)
+        key = (
+            type(self),
+            type(self.adapter.dialect),
+            self.parameterize,
+            self.placeholder_style,
+            fp,
+        )
+        try:
+            compiled = cache.get(key, slots)
+        except TypeError:
+            # Unhashable literal value baked into the shape.
+            return self._render_statement(n, render, None)
+        if compiled is not None:
+            sql, extractor = compiled
+            if not self.parameterize:
+                return sql
+            adapt = self._adapt_for_bind
+            return ParamSQL(
+                sql,
+                [adapt(slots[i].value, slots[i].type) for i in extractor],
+            )
+        origins: List[Any] = []
+        result = self._render_statement(n, render, origins)
+        index = {id(lit): i for i, lit in enumerate(slots)}
+        extractor = tuple(index.get(id(o), -1) for o in origins)
+        if -1 not in extractor:
+            cache.put(key, slots, str(result), extractor)
+        return result
+
+    def _render_statement(self, n, render, origins: Optional[List[Any]]):
         ctx = self._begin()
+        if ctx is not None:
+            ctx.origins = origins
         try:
-            sql = self._compile_select_body(n)
+            sql = render(n)
         finally:
             self._ctx = None
-        return ParamSQL(sql, ctx.params) if ctx is not None else sql
+        return ctx.finish(sql) if ctx is not None else sql
 
     def _compile_select_body(self, n: ast.Select) -> str:
         # IMPORTANT: visits happen in SQL-position order. Positional ``?``
@@ -369,22 +539,69 @@ class SQLCompiler:
         Compile an ``Insert`` AST node into ``INSERT INTO ... ;`` SQL.
 
         Honors ``n.sqlsafe`` for aliased writes (INSERT always targets the
-        underlying physical table). Multi-row INSERT not yet supported.
+        underlying physical table). Several rows render as one multi-row
+        ``VALUES (...),(...)`` list.
         """
-        ctx = self._begin()
-        try:
+        if len(n.rows) > 1:
+            # Bulk batches: fingerprinting thousands of literals costs about
+            # what rendering them does, and the key is rarely seen twice.
+            return self._render_statement(n, self._compile_insert_body, None)
+        return self._compile_statement(n, self._compile_insert_body)
+
+    def _compile_insert_body(self, n: ast.Insert) -> str:
+        if not n.rows or not n.rows[0]:
             table = n.sqlsafe if n.sqlsafe is not None else self._table_sql(n.table)
-            if not n.rows or not n.rows[0]:
-                sql = "INSERT INTO %s DEFAULT VALUES;" % table
-            else:
-                if len(n.rows) > 1:
-                    raise NotImplementedError("multi-row INSERT not yet supported")
-                cols = ",".join(self._column_sql(n.table, c) for c in n.cols)
-                values = ",".join(self.visit(v) for v in n.rows[0])
-                sql = "INSERT INTO %s(%s) VALUES (%s);" % (table, cols, values)
-        finally:
-            self._ctx = None
-        return ParamSQL(sql, ctx.params) if ctx is not None else sql
+            sql = "INSERT INTO %s DEFAULT VALUES" % table
+        else:
+            sql = self._insert_sql(n)
+        return sql + self._returning_sql(n.table, n.returning) + ";"
+
+    def _insert_sql(self, n: ast.Insert) -> str:
+        """``INSERT INTO t(cols) VALUES (...)`` without the terminator."""
+        table = n.sqlsafe if n.sqlsafe is not None else self._table_sql(n.table)
+        cols = ",".join(self._column_sql(n.table, c) for c in n.cols)
+        visit = self.visit
+        values = "),(".join(",".join(visit(v) for v in row) for row in n.rows)
+        return "INSERT INTO %s(%s) VALUES (%s)" % (table, cols, values)
+
+    def compile_upsert(self, n: ast.Upsert):
+        """
+        Compile an ``Upsert`` node into ``INSERT ... ON CONFLICT (...)
+        DO UPDATE SET ...;`` (``DO NOTHING`` when ``n.update`` is empty).
+        """
+        if len(n.insert.rows) > 1:
+            return self._render_statement(n, self._compile_upsert_body, None)
+        return self._compile_statement(n, self._compile_upsert_body)
+
+    def _compile_upsert_body(self, n: ast.Upsert) -> str:
+        if not n.insert.cols:
+            raise NotImplementedError("upsert without columns")
+        table = n.insert.table
+        target = ",".join(self._column_sql(table, c) for c in n.conflict)
+        if n.update:
+            cols = [self._column_sql(table, c) for c in n.update]
+            action = "DO UPDATE SET " + ",".join(
+                "%s=excluded.%s" % (c, c) for c in cols
+            )
+        else:
+            action = "DO NOTHING"
+        return "%s ON CONFLICT (%s) %s;" % (self._insert_sql(n.insert), target, action)
+
+    def _returning_sql(self, tablename: str, cols) -> str:
+        """`` RETURNING <cols>``, or nothing when no columns are asked for."""
+        if not cols:
+            return ""
+        if not self.returning:
+            raise NotImplementedError("RETURNING")
+        return " RETURNING " + ",".join(self._column_sql(tablename, c) for c in cols)
+
+    def _returning_id(self, tablename: str, sql: str) -> str:
+        """Append ``RETURNING <id>`` to ``sql`` when the table has an id."""
+        if self.adapter is not None:
+            table = self.adapter.db.get(tablename)
+            if table is not None and hasattr(table, "_id"):
+                sql = "%s RETURNING %s;" % (sql[:-1], table._id._rname)
+        return sql
 
     def compile_update(self, n: ast.Update):
         """
@@ -393,7 +610,9 @@ class SQLCompiler:
         Honors ``n.sqlsafe`` for aliased writes. Subqueries inside
         SET/WHERE see the UPDATE's target table as outer scope.
         """
-        ctx = self._begin()
+        return self._compile_statement(n, self._compile_update_body)
+
+    def _compile_update_body(self, n: ast.Update) -> str:
         # Push the UPDATE target so any subquery in SET/WHERE knows the
         # outer-scope table — same correlated-subquery semantics as SELECT.
         self._scope_stack.append(frozenset({n.table}))
@@ -404,28 +623,52 @@ class SQLCompiler:
                 for col, val in n.sets
             )
             whr = " WHERE %s" % self.visit(n.where) if n.where is not None else ""
-            sql = "UPDATE %s SET %s%s;" % (table, sets, whr)
+            ret = self._returning_sql(n.table, n.returning)
+            return "UPDATE %s SET %s%s%s;" % (table, sets, whr, ret)
         finally:
             self._scope_stack.pop()
-            self._ctx = None
-        return ParamSQL(sql, ctx.params) if ctx is not None else sql
+
+    def compile_bulk_update(self, n: ast.BulkUpdate):
+        """
+        Compile a ``BulkUpdate`` into ``UPDATE t SET c=CASE key WHEN k1
+        THEN v1 ... ELSE c END,... WHERE key IN (k1,...);``.
+        """
+        # Like multi-row inserts: the key would rarely be seen twice.
+        return self._render_statement(n, self._compile_bulk_update_body, None)
+
+    def _compile_bulk_update_body(self, n: ast.BulkUpdate) -> str:
+        table = n.sqlsafe if n.sqlsafe is not None else self._table_sql(n.table)
+        key = self._column_sql(n.table, n.key)
+        visit = self.visit
+        sets = []
+        for k, name in enumerate(n.cols, 1):
+            col = self._column_sql(n.table, name)
+            whens = " ".join(
+                "WHEN %s THEN %s" % (visit(row[0]), visit(row[k])) for row in n.rows
+            )
+            sets.append("%s=CASE %s %s ELSE %s END" % (col, key, whens, col))
+        keys = ",".join(visit(row[0]) for row in n.rows)
+        return "UPDATE %s SET %s WHERE %s IN (%s);" % (table, ",".join(sets), key, keys)
 
     def compile_delete(self, n: ast.Delete):
         """Compile a ``Delete`` AST node into ``DELETE FROM ... WHERE ...;`` SQL."""
-        ctx = self._begin()
+        return self._compile_statement(n, self._compile_delete_body)
+
+    def _compile_delete_body(self, n: ast.Delete) -> str:
         self._scope_stack.append(frozenset({n.table}))
         try:
             table = n.sqlsafe if n.sqlsafe is not None else self._writing_alias(n.table)
             whr = " WHERE %s" % self.visit(n.where) if n.where is not None else ""
-            sql = "DELETE FROM %s%s;" % (table, whr)
+            ret = self._returning_sql(n.table, n.returning)
+            return "DELETE FROM %s%s%s;" % (table, whr, ret)
         finally:
             self._scope_stack.pop()
-            self._ctx = None
-        return ParamSQL(sql, ctx.params) if ctx is not None else sql
 
     def compile_count(self, n: ast.Count):
         """Compile a Count node into ``SELECT COUNT(...) FROM ...;``."""
-        ctx = self._begin()
+        return self._compile_statement(n, self._compile_count_body)
+
+    def _compile_count_body(self, n: ast.Count) -> str:
         # Outer scope for correlated subqueries: this Count's source tables.
         outer = set()
         for s in n.query.sources:
@@ -440,11 +683,9 @@ class SQLCompiler:
                 count_expr = "COUNT(*)"
             tables = ",".join(self.visit(t) for t in inner.sources)
             whr = " WHERE %s" % self.visit(inner.where) if inner.where is not None else ""
-            sql = "SELECT %s FROM %s%s;" % (count_expr, tables, whr)
+            return "SELECT %s FROM %s%s;" % (count_expr, tables, whr)
         finally:
             self._scope_stack.pop()
-            self._ctx = None
-        return ParamSQL(sql, ctx.params) if ctx is not None else sql
 
     # ------------------------------------------------------------------ utils
     def q(self, name: str) -> str:
@@ -500,7 +741,10 @@ class SQLCompiler:
     # ------------------------------------------------------------------ visit
     def visit(self, node: ast.Node) -> str:
         """Dispatch to ``v_<NodeName>`` for the given AST node."""
-        return getattr(self, "v_" + type(node).__name__)(node)
+        method = self._visitors.get(node.__class__)
+        if method is None:
+            return getattr(self, "v_" + type(node).__name__)(node)
+        return method(self, node)
 
     # ---- leaves ----
 
@@ -528,13 +772,8 @@ class SQLCompiler:
         #   * the value isn't None (NULL is rendered inline).
         # Everything else falls back to the inline representation,
         # which is bit-compatible with the legacy SQLDialect path.
-        if (
-            self._ctx is not None
-            and n.value is not None
-            and isinstance(n.type, str)
-            and (n.type in _PARAMETERIZABLE_TYPES or n.type.startswith("decimal"))
-        ):
-            return self._ctx.bind(self._adapt_for_bind(n.value, n.type))
+        if self._ctx is not None and self._bindable(n):
+            return self._ctx.bind(self._adapt_for_bind(n.value, n.type), n)
         if n.type:
             return str(self._represent(n.value, n.type))
         if isinstance(n.value, bool):
@@ -543,6 +782,15 @@ class SQLCompiler:
             return ",".join(str(self._represent(v, None)) for v in n.value)
         return str(n.value)
 
+    @staticmethod
+    def _bindable(n: ast.Literal) -> bool:
+        """True when ``n`` would be bound (not inlined) in parameterized mode."""
+        return (
+            n.value is not None
+            and isinstance(n.type, str)
+            and (n.type in _PARAMETERIZABLE_TYPES or n.type.startswith("decimal"))
+        )
+
     def _adapt_for_bind(self, value, type_):
         """
         Convert a Python value to its DB-API bind form for ``type_``.
@@ -576,6 +824,15 @@ class SQLCompiler:
             return str(value)
         return value
 
+    def v_Param(self, n: ast.Param) -> str:
+        """Render a ``Param`` as a placeholder (prepared statements only)."""
+        if not self._allow_params or self._ctx is None:
+            raise RuntimeError(
+                "Param(%r) can only be used in a prepared query "
+                "(see Set.prepare_select)" % n.name
+            )
+        return self._ctx.bind(n, n)
+
     def v_Raw(self, n: ast.Raw) -> str:
         """Emit a ``Raw`` node verbatim (translator pre-shapes it)."""
         return n.sql
@@ -617,24 +874,35 @@ class SQLCompiler:
 
     def v_BinOp(self, n: ast.BinOp) -> str:
         """Dispatch a ``BinOp`` to ``op_<name>``."""
-        method = getattr(self, "op_" + n.op, None)
+        method = self._binops.get(n.op)
         if method is None:
             raise NotImplementedError("SQLCompiler: unknown BinOp %r" % n.op)
-        return method(n.left, n.right, dict(n.opts))
+        return method(self, n.left, n.right, dict(n.opts) if n.opts else _NO_OPTS)
 
     def v_UnaryOp(self, n: ast.UnaryOp) -> str:
         """Dispatch a ``UnaryOp`` to ``un_<name>``."""
-        method = getattr(self, "un_" + n.op, None)
+        method = self._unops.get(n.op)
         if method is None:
             raise NotImplementedError("SQLCompiler: unknown UnaryOp %r" % n.op)
-        return method(n.operand, dict(n.opts))
+        return method(self, n.operand, dict(n.opts) if n.opts else _NO_OPTS)
 
     def v_FuncCall(self, n: ast.FuncCall) -> str:
         """Dispatch a ``FuncCall`` to ``fn_<name>``."""
-        method = getattr(self, "fn_" + n.name, None)
+        method = self._funcs.get(n.name)
         if method is None:
             raise NotImplementedError("SQLCompiler: unknown FuncCall %r" % n.name)
-        return method(n.args, dict(n.opts))
+        return method(self, n.args, dict(n.opts) if n.opts else _NO_OPTS)
+
+    def v_Window(self, n: ast.Window) -> str:
+        """Render ``func OVER (PARTITION BY ... ORDER BY ... frame)``."""
+        spec = []
+        if n.partition_by:
+            spec.append("PARTITION BY " + ",".join(self.visit(x) for x in n.partition_by))
+        if n.order_by:
+            spec.append("ORDER BY " + ",".join(self.visit(x) for x in n.order_by))
+        if n.frame:
+            spec.append(n.frame)
+        return "%s OVER (%s)" % (self.visit(n.func), " ".join(spec))
 
     def v_InList(self, n: ast.InList) -> str:
         """Render ``expr IN (v1, v2, ...)`` or ``expr IN (SELECT ...)``."""
@@ -649,9 +917,60 @@ class SQLCompiler:
             if sub.endswith(";"):
                 sub = sub[:-1]
             return "(%s IN (%s))" % (self.visit(n.expr), sub)
+        if len(n.values) > self.large_in_list:
+            return self._large_in_list(n)
         items = ",".join(self.visit(v) for v in n.values)
         return "(%s IN (%s))" % (self.visit(n.expr), items)
 
+    def _large_in_list(self, n: ast.InList) -> str:
+        """
+        Render a long ``IN`` list as ``((x IN (...)) OR (x IN (...)))``
+        groups of at most ``in_list_chunk`` values, keeping each list
+        under per-list limits (Oracle's 1000) and cheap to parse.
+        """
+        size = self.in_list_chunk
+        values = n.values
+        # ``expr`` is re-visited per group (not reused) so any value it
+        # binds is bound once per placeholder, in SQL order.
+        return "(%s)" % " OR ".join(
+            "(%s IN (%s))" % (
+                self.visit(n.expr),
+                ",".join(self.visit(v) for v in values[i:i + size]),
+            )
+            for i in range(0, len(values), size)
+        )
+
+    def _in_list_binds(self, n: ast.InList) -> Optional[Tuple[str, List[Any]]]:
+        """
+        ``(type, adapted values)`` when every value of ``n`` is a bindable
+        literal of one type and a parameterized compile is running;
+        None otherwise. Used by the single-parameter ``IN`` strategies.
+
+        ``id`` and ``reference`` columns aren't bound one literal at a
+        time, but their lists (``Rows.join``, cascades, ...) qualify as
+        long as every value is an ``int``.
+        """
+        if self._ctx is None:
+            return None
+        first = n.values[0]
+        if first.__class__ is not ast.Literal:
+            return None
+        type_ = first.type
+        if type_ is None:
+            return None
+        key = type_ == "id" or type_.startswith("reference ")
+        if not key and not self._bindable(first):
+            return None
+        literals: List[ast.Literal] = []
+        for v in n.values:
+            if not isinstance(v, ast.Literal) or v.type != type_ or v.value is None:
+                return None
+            if key and type(v.value) is not int:
+                return None
+            literals.append(v)
+        adapt = self._adapt_for_bind
+        return type_, [adapt(v.value, type_) for v in literals]
+
     # ================================================================== ops
     # Comparisons, logical, arithmetic, ordering, null-predicates.
     # Each ``op_<name>`` / ``un_<name>`` is invoked by the visitor above
@@ -659,27 +978,48 @@ class SQLCompiler:
     # vocabulary so overriding for a backend is one-method-per-divergence.
     # =====================================================================
 
-    def _cmp(self, sym: str, l: ast.Node, r: ast.Node, null_form: Optional[str]) -> str:
+    def _cmp(
+        self,
+        sym: str,
+        l: ast.Node,
+        r: ast.Node,
+        null_form: Optional[str],
+        collate: Optional[str] = None,
+    ) -> str:
         """
         Shared rendering for binary comparison ops.
 
         ``null_form`` is the SQL fragment to substitute when the right
         operand is ``Literal(None)`` (e.g. ``"IS NULL"``); pass ``None``
         if the op doesn't accept a None right (``<``, ``>``, ...).
+        ``collate`` appends a ``COLLATE`` clause to the right operand.
         """
         if isinstance(r, ast.Literal) and r.value is None:
             if null_form is None:
                 raise RuntimeError("Cannot compare %s %s None" % (self.visit(l), sym))
             return "(%s %s)" % (self.visit(l), null_form)
+        if (
+            isinstance(r, ast.Literal)
+            and r.type in ("json", "jsonb")
+            and isinstance(r.value, (str, int, float))
+        ):
+            # SQLDialect._binary_cmp: a JSON operand (typically a ``->>``
+            # accessor) compares against the bare quoted scalar, not its
+            # JSON encoding.
+            return "(%s %s '%s')" % (
+                self.visit(l), sym, str(r.value).replace("'", "''"),
+            )
+        if collate:
+            return "(%s %s %s COLLATE %s)" % (self.visit(l), sym, self.visit(r), collate)
         return "(%s %s %s)" % (self.visit(l), sym, self.visit(r))
 
-    def op_eq(self, l, r, _):
+    def op_eq(self, l, r, opts):
         """Render ``(left = right)`` — collapses to ``IS NULL`` for ``Literal(None)``."""
-        return self._cmp("=", l, r, "IS NULL")
+        return self._cmp("=", l, r, "IS NULL", opts.get("collate"))
 
-    def op_ne(self, l, r, _):
+    def op_ne(self, l, r, opts):
         """Render ``(left <> right)`` — collapses to ``IS NOT NULL`` for ``Literal(None)``."""
-        return self._cmp("<>", l, r, "IS NOT NULL")
+        return self._cmp("<>", l, r, "IS NOT NULL", opts.get("collate"))
 
     def op_lt(self, l, r, _):
         """Render ``(left < right)``."""
@@ -701,11 +1041,41 @@ class SQLCompiler:
 
     def op_and(self, l, r, _):
         """Render ``(left AND right)``."""
-        return "(%s AND %s)" % (self.visit(l), self.visit(r))
+        return self._logical(ast.BinOp("and", l, r))
 
     def op_or(self, l, r, _):
         """Render ``(left OR right)``."""
-        return "(%s OR %s)" % (self.visit(l), self.visit(r))
+        return self._logical(ast.BinOp("or", l, r))
+
+    def _logical(self, n: ast.BinOp) -> str:
+        """
+        Render a tree of ``and``/``or`` BinOps without recursing.
+
+        Filters built with ``reduce(operator.and_, ...)`` nest one level
+        per term; walking them with an explicit stack keeps a
+        5000-term chain well clear of the recursion limit. Pieces are
+        emitted strictly left to right, so placeholders still bind in
+        SQL order. Sub-trees whose operator a subclass overrides go
+        back through ``visit``.
+        """
+        default = _DEFAULT_LOGICAL
+        binops = self._binops
+        out: List[str] = []
+        todo: List[Any] = [n]
+        while todo:
+            item = todo.pop()
+            if item.__class__ is str:
+                out.append(item)
+            elif (
+                item.__class__ is ast.BinOp
+                and item.op in _LOGICAL_SQL
+                and (item is n or binops[item.op] is default[item.op])
+            ):
+                out.append("(")
+                todo.extend((")", item.right, _LOGICAL_SQL[item.op], item.left))
+            else:
+                out.append(self.visit(item))
+        return "".join(out)
 
     def un_not(self, x, _):
         """Render ``(NOT operand)``."""
@@ -907,6 +1277,10 @@ class SQLCompiler:
         kind = opts.get("kind", "")
         return "%s(%s)" % (kind, self.visit(args[0]))
 
+    def fn_window(self, args, opts):
+        """Render a window-only function, ``KIND(args...)`` (``ROW_NUMBER()``)."""
+        return "%s(%s)" % (opts.get("kind", ""), ",".join(self.visit(a) for a in args))
+
     def fn_count(self, args, opts):
         """Render ``COUNT(arg)`` or ``COUNT(DISTINCT arg)``."""
         if opts.get("distinct"):
@@ -966,4 +1340,8 @@ class SQLCompiler:
         return self.visit(node)
 
 
+SQLCompiler._build_dispatch()
+_DEFAULT_LOGICAL = {"and": SQLCompiler.op_and, "or": SQLCompiler.op_or}
+
+
 __all__ = ["SQLCompiler"]
@@ -6,12 +6,20 @@ Mirrors the deltas in pydal/dialects/sqlite.py:
 * ``extract`` uses the ``web2py_extract`` user function instead of the
   ANSI ``EXTRACT`` syntax.
 * ``regexp`` emits a plain ``(left REGEXP right)`` (no ESCAPE clause).
+* a large ``IN`` list is bound as one JSON array and read back with
+  ``json_each`` instead of one ``?`` per value.
+* writes can return rows (``RETURNING``, SQLite 3.35+); an upsert
+  returns the id it wrote.
+* a bulk update joins a ``VALUES`` list (``UPDATE ... FROM``, 3.33+).
 
 Everything else inherits from SQLCompiler unchanged.
 """
 
 from __future__ import annotations
 
+import json
+import sqlite3
+
 from ..backends.sqlite import SQLite
 from . import compilers
 from .sql import SQLCompiler
@@ -31,6 +39,14 @@ class SQLiteCompiler(SQLCompiler):
     # is still available per-instance for byte-exact oracle tests.
     parameterize = True
     placeholder_style = "qmark"
+    # NOCASE folds ASCII only, exactly like SQLite's built-in lower().
+    nocase_collation = "NOCASE"
+    # SQLITE_MAX_VARIABLE_NUMBER: 32766 since SQLite 3.32, 999 before.
+    max_params = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+    # RETURNING arrived in SQLite 3.35.
+    returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+    # UPDATE ... FROM arrived in SQLite 3.33.
+    update_from_values = sqlite3.sqlite_version_info >= (3, 33, 0)
 
     def _compile_select_body(self, n):
         """
@@ -41,6 +57,30 @@ class SQLiteCompiler(SQLCompiler):
             raise SyntaxError("DISTINCT ON is not supported by SQLite")
         return super()._compile_select_body(n)
 
+    def _compile_upsert_body(self, n):
+        """Base upsert, plus ``RETURNING <id>`` where SQLite has it."""
+        sql = super()._compile_upsert_body(n)
+        return self._returning_id(n.insert.table, sql) if self.returning else sql
+
+    def _compile_bulk_update_body(self, n):
+        """
+        ``UPDATE t SET c=v.column2,... FROM (VALUES (...),...) AS v WHERE
+        t.key=v.column1;``: one lookup per row instead of a ``CASE``
+        scan per column.
+        """
+        if not self.update_from_values:
+            return super()._compile_bulk_update_body(n)
+        table = n.sqlsafe if n.sqlsafe is not None else self._table_sql(n.table)
+        sets = ",".join(
+            "%s=v.column%d" % (self._column_sql(n.table, name), k)
+            for k, name in enumerate(n.cols, 2)
+        )
+        visit = self.visit
+        values = "),(".join(",".join(visit(v) for v in row) for row in n.rows)
+        return "UPDATE %s SET %s FROM (VALUES (%s)) AS v WHERE %s.%s=v.column1;" % (
+            table, sets, values, table, self._column_sql(n.table, n.key),
+        )
+
     def fn_extract(self, args, opts):
         """SQLite extract via the ``web2py_extract`` user function."""
         return "web2py_extract('%s', %s)" % (
@@ -48,6 +88,21 @@ class SQLiteCompiler(SQLCompiler):
             self.visit(args[0]),
         )
 
+    def _large_in_list(self, n):
+        """
+        ``(x IN (SELECT value FROM json_each(?)))`` with the values bound
+        as a single JSON array: one variable however long the list (so
+        SQLite's variable limit never applies) and a statement whose text
+        doesn't grow with it.
+        """
+        binds = self._in_list_binds(n)
+        if binds is None or not all(type(v) in _JSON_SCALARS for v in binds[1]):
+            return super()._large_in_list(n)
+        return "(%s IN (SELECT value FROM json_each(%s)))" % (
+            self.visit(n.expr),
+            self._ctx.bind(json.dumps(binds[1]), n),
+        )
+
     def un_epoch(self, x, _):
         """SQLite epoch via ``web2py_extract('epoch', ...)``."""
         return "web2py_extract('epoch', %s)" % self.visit(x)
@@ -60,6 +115,11 @@ class SQLiteCompiler(SQLCompiler):
         )
 
 
+# Bound values ``json.dumps`` writes as the JSON scalars SQLite reads
+# back into the same values.
+_JSON_SCALARS = (int, float, str)
+
+
 def _isliteral(n):
     """
     Helper: True if ``n`` is an ``ast.Literal`` (deferred import to
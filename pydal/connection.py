@@ -15,6 +15,9 @@ Public surface (all consumed via composition into adapters):
 * ``connection`` / ``get_connection(use_pool=True)`` — lazy connect.
 * ``cursor`` — current thread-local cursor.
 * ``reset_cursor()`` — re-issue a cursor on the existing connection.
+* ``using_cursor(cursor)`` — run statements on another cursor for a while.
+* ``using_connection(connection)`` — the same, on another connection.
+* ``release_streams()`` — close the unfinished ``iterselect`` cursors.
 * ``close(action="commit", really=True)`` — commit/rollback + recycle.
 * ``set_folder(folder)`` — set the per-thread default DB folder.
 * ``close_all_instances(action)`` — clean shutdown for every pydal
@@ -28,6 +31,8 @@ Hooks subclasses may override:
 """
 
 import os
+import weakref
+from contextlib import contextmanager
 from typing import Any, Callable, Dict, List, Optional, Union
 
 from ._globals import GLOBAL_LOCKER, THREAD_LOCAL
@@ -41,6 +46,8 @@ class ConnectionPool:
 
     def __init__(self):
         self._first_connection = False
+        # ``iterselect`` results with a cursor still open
+        self._streams = weakref.WeakSet()
 
     @property
     def _connection_uname_(self) -> str:
@@ -129,6 +136,45 @@ class ConnectionPool:
         """Issue a fresh cursor on the existing connection (no reconnect)."""
         setattr(THREAD_LOCAL, self._cursors_uname_, self.connection.cursor())
 
+    @contextmanager
+    def using_cursor(self, cursor: Any):
+        """
+        Make ``cursor`` the current cursor inside the block, so that the
+        adapter's ``execute`` runs on it; the previous one is put back
+        afterwards.
+        """
+        name = self._cursors_uname_
+        previous = getattr(THREAD_LOCAL, name)
+        setattr(THREAD_LOCAL, name, cursor)
+        try:
+            yield cursor
+        finally:
+            setattr(THREAD_LOCAL, name, previous)
+
+    @contextmanager
+    def using_connection(self, connection: Any):
+        """
+        Make ``connection``, and a new cursor on it, the current ones
+        inside the block; the previous ones are put back afterwards.
+        """
+        names = self._connection_uname_, self._cursors_uname_
+        previous = [getattr(THREAD_LOCAL, name, None) for name in names]
+        setattr(THREAD_LOCAL, names[0], connection)
+        setattr(THREAD_LOCAL, names[1], connection.cursor())
+        try:
+            yield connection
+        finally:
+            for name, value in zip(names, previous):
+                setattr(THREAD_LOCAL, name, value)
+
+    def release_streams(self) -> None:
+        """
+        Close the cursors of the ``iterselect`` results not read to the
+        end; they return no more rows.
+        """
+        for stream in list(self._streams):
+            stream.close()
+
     @property
     def cursor(self) -> Any:
         """The current thread-local cursor for this adapter."""
@@ -177,7 +223,9 @@ class ConnectionPool:
             except Exception:
                 # action failed — drop the connection.
                 succeeded = False
-        # Close the cursor unconditionally.
+        # Close the cursor unconditionally, and the ones of the
+        # unfinished iterselect results.
+        self.release_streams()
         self.cursor.close()
         # Recycle into pool if possible.
         if self.pool_size and succeeded:
@@ -25,6 +25,8 @@ methods to it.
 
 from __future__ import annotations
 
+import contextlib
+
 
 class Driver:
     """Connection-level operations for an adapter."""
@@ -61,6 +63,32 @@ class Driver:
             h.after_execute(command)
         return rv
 
+    def executemany(self, sql, seq_of_params):
+        """
+        Run one statement once per parameter tuple of ``seq_of_params``
+        with a single ``cursor.executemany`` call.
+        """
+        adapter = self._adapter
+        command = adapter.filter_sql_command(sql)
+        handlers = adapter._build_handlers_for_execution()
+        for h in handlers:
+            h.before_execute(command)
+        rv = adapter.cursor.executemany(command, seq_of_params)
+        for h in handlers:
+            h.after_execute(command)
+        return rv
+
+    def pipeline(self):
+        """
+        A context manager that runs the statements issued inside it in
+        the connection's pipeline mode (psycopg 3), or does nothing on
+        drivers without one.
+        """
+        pipeline = getattr(self._adapter.connection, "pipeline", None)
+        if callable(pipeline):
+            return pipeline()
+        return contextlib.nullcontext()
+
     # -- transactions -------------------------------------------------
 
     def commit(self):
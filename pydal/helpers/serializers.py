@@ -8,6 +8,10 @@ Custom encoders can be installed by assigning into
 ``Serializers._custom_``; lookups fall back to a registered encoder
 named after the missing attribute (so ``serializers.xml`` resolves to
 ``serializers._custom_["xml"]`` when present).
+
+``serializers.json_encoder()`` is the encoder for writing many values
+one after another (``Set.stream_json``): orjson when it is installed,
+the stdlib otherwise, or ``_custom_["json_encoder"]``.
 """
 
 import datetime
@@ -15,6 +19,11 @@ import decimal
 import json as jsonlib
 from typing import Any, Callable, ClassVar, Dict
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class Serializers:
     """
@@ -74,6 +83,27 @@ class Serializers:
         """Serialize ``value`` to a JSON string using ``_json_parse``."""
         return jsonlib.dumps(value, default=self._json_parse)
 
+    def json_encoder(self) -> Callable[[Any], str]:
+        """
+        A function serializing one value to a JSON string, for encoding
+        many values in a row.
+
+        Uses ``_custom_["json_encoder"]`` when registered, otherwise
+        orjson when it is installed, otherwise a stdlib encoder made
+        once (``json`` makes one per call). Dates, times, decimals...
+        go through ``_json_parse`` with either, so they come out as with
+        ``json``; orjson leaves out the spaces after ``,`` and ``:``.
+        """
+        if self._custom_.get("json_encoder") is not None:
+            return self._custom_["json_encoder"]
+        if orjson is not None:
+            dumps, default = orjson.dumps, self._json_parse
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            return lambda value: dumps(value, default=default, option=option).decode(
+                "utf-8"
+            )
+        return jsonlib.JSONEncoder(default=self._json_parse).encode
+
     def yaml(self, value: Any) -> str:
         """
         Serialize ``value`` to YAML.
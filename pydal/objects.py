@@ -20,6 +20,11 @@ This module contains the building blocks of the DSL:
   semantics through the AST without baking SQL too early.
 * ``LazyReferenceGetter`` / ``LazySet`` — lazy-resolution helpers used
   by lazy-tables and reverse-reference traversal.
+* ``RowAttribute`` — descriptor that makes ``update_record`` & co. on
+  first read, on the per-table ``Row`` subclasses of fetched records.
+* ``RecordRow`` — mixin of those subclasses reporting the attributes
+  as keys.
+* ``SlotRow`` — base of the ``__slots__`` rows of ``rowtype="compact"``.
 """
 
 import base64
@@ -29,13 +34,16 @@ import csv
 import datetime
 import decimal
 import io
+import json
 import logging
 import os
+import queue
 import re
 import shutil
 import sys
+import threading
 import types
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from io import TextIOWrapper
 
 import copyreg
@@ -45,6 +53,7 @@ from os.path import exists, join as pjoin
 
 from ._globals import AND, DEFAULT, IDENTITY, OR
 from .utils import hashlib_md5, to_bytes, to_native, to_unicode
+from .batch import when_done
 from .exceptions import NotAuthorizedException, NotFoundException
 from .helpers.classes import (
     SQLALL,
@@ -111,6 +120,57 @@ def csv_reader(utf8_data, dialect=csv.excel, encoding="utf-8", **kwargs):
         yield [to_unicode(cell, encoding) for cell in row]
 
 
+def _read_ahead(items, chunk_size, depth=2):
+    """
+    Iterate over ``items`` (``enumerate`` of a csv reader) read by a
+    worker thread, ``chunk_size`` at a time and up to ``depth`` chunks
+    ahead. Like the csv import, the worker stops after an empty line,
+    leaving the file there. ``close()`` stops and joins the worker.
+    """
+    chunks = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(chunk):
+        while not stop.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def work():
+        chunk = []
+        try:
+            for item in items:
+                chunk.append(item)
+                if not item[1]:
+                    break
+                if len(chunk) >= chunk_size:
+                    if not put(chunk):
+                        return
+                    chunk = []
+            put(chunk) and put(None)
+        except Exception as e:
+            put(e)
+
+    worker = threading.Thread(target=work, name="pydal-csv-reader")
+    worker.daemon = True
+    worker.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            for item in chunk:
+                yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
 def get_default_validator(field, _cached_defaults={}):
     """returns the default validators a value of type"""
     from . import validators
@@ -185,7 +245,10 @@ class Row(BasicStorage):
             except KeyError:
                 pass
 
-        lg = BasicStorage.get(self, "__get_lazy_reference__", None)
+        try:
+            lg = BasicStorage.__getattribute__(self, "__get_lazy_reference__")
+        except AttributeError:
+            lg = None
         if callable(lg):
             v = self[key] = lg(key)
             return v
@@ -318,6 +381,262 @@ def pickle_row(s):
 copyreg.pickle(Row, pickle_row)
 
 
+class RowAttribute(object):
+    """
+    Attribute of the ``Row`` subclass of a table's records (see
+    ``adapter._record_class``) computed from the row when it is first
+    read: ``update_record``, ``delete_record``, the referee
+    ``LazySet``s... ``make(row)`` returns the value, which is then
+    stored in the row under the attribute's name, so later reads get
+    the same object. A key stored in the row under that name wins, as
+    for any non-data descriptor.
+    """
+
+    __slots__ = ("make", "name")
+
+    def __init__(self, make, name=None):
+        self.make = make
+        self.name = name
+
+    def __set_name__(self, cls, name):
+        self.name = name
+
+    def __get__(self, row, cls=None):
+        if row is None:
+            return self
+        value = row[self.name] = self.make(row)
+        return value
+
+
+class RecordRow(object):
+    """
+    Mixin of the ``Row`` classes made by ``adapter._record_class`` that
+    carry ``RowAttribute``s. Their names (``_attributes``) are keys of
+    the row like the stored ones: ``keys()``, iteration, ``dict(row)``
+    and ``repr(row)`` make the missing values first. Copies and pickles
+    only keep the stored keys (``_made`` are left out), the copies
+    making their own attributes.
+    """
+
+    # no __slots__: rows already parsed switch to the subclasses, so
+    # their layout must stay the one of Row
+    _attributes = ()
+    _made = ()
+
+    def _make_attributes(self):
+        for name in self._attributes:
+            getattr(self, name)
+
+    def _stored(self):
+        d = SlotRow._plain(self) if isinstance(self, SlotRow) else dict(self.__dict__)
+        for name in self._made:
+            d.pop(name, None)
+        return d
+
+    def __contains__(self, k):
+        return k in self._attributes or super(RecordRow, self).__contains__(k)
+
+    has_key = __contains__
+
+    def __iter__(self):
+        self._make_attributes()
+        return super(RecordRow, self).__iter__()
+
+    def keys(self):
+        self._make_attributes()
+        return super(RecordRow, self).keys()
+
+    def values(self):
+        self._make_attributes()
+        return super(RecordRow, self).values()
+
+    def items(self):
+        self._make_attributes()
+        return super(RecordRow, self).items()
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def copy(self):
+        self._make_attributes()
+        return super(RecordRow, self).copy()
+
+    def __copy__(self):
+        return type(self)(self._stored())
+
+    def __deepcopy__(self, memo):
+        return type(self)(copy.deepcopy(self._stored(), memo))
+
+    def __reduce__(self):
+        # the generated classes can't be imported: pickle a plain Row
+        return Row, (self._stored(),)
+
+
+class SlotRow(Row):
+    """
+    Base of the ``Row`` classes made per table and select shape for
+    ``rowtype="compact"`` (``adapter._record_class``): the columns live
+    in ``__slots__`` rather than in an instance ``__dict__``. Keys added
+    afterwards (virtual fields, ``row.x = ...``) still go to the
+    ``__dict__``, which is only created for them.
+    """
+
+    __slots__ = ("_more",)
+    # ((name, member descriptor), ...) of the slotted keys, per subclass
+    _members = ()
+    _member_map = {}
+    _setters = ()
+
+    @classmethod
+    def _make(cls, values):
+        """A row with the first slotted keys set to ``values``."""
+        row = cls.__new__(cls)
+        _set_more(row, False)
+        for set_value, value in zip(cls._setters, values):
+            set_value(row, value)
+        return row
+
+    def __init__(self, *args, **kwargs):
+        _set_more(self, False)
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __setitem__(self, key, value):
+        if key not in self._member_map:
+            _set_more(self, True)
+        object.__setattr__(self, key, value)
+
+    __setattr__ = __setitem__
+
+    def _lookup(self, key):
+        member = self._member_map.get(key)
+        if member is not None:
+            try:
+                return member.__get__(self)
+            except AttributeError:
+                return DEFAULT
+        if self._more:
+            return self.__dict__.get(key, DEFAULT)
+        return DEFAULT
+
+    def _plain(self):
+        """The keys and values, as a ``dict``."""
+        d = {}
+        for name, member in self._members:
+            try:
+                d[name] = member.__get__(self)
+            except AttributeError:
+                pass
+        if self._more:
+            d.update(self.__dict__)
+        return d
+
+    def __getitem__(self, k):
+        key = str(k)
+        _extra = self._lookup("_extra")
+        if _extra is not DEFAULT and _extra is not None:
+            v = _extra.get(key, DEFAULT)
+            if v is not DEFAULT:
+                return v
+        try:
+            return object.__getattribute__(self, key)
+        except AttributeError:
+            pass
+        m = REGEX_TABLE_DOT_FIELD.match(key)
+        if m:
+            key2 = m.group(2)
+            box = self._lookup(m.group(1))
+            if box is not DEFAULT:
+                try:
+                    return box[key2]
+                except (KeyError, TypeError):
+                    pass
+            v = self._lookup(key2)
+            if v is not DEFAULT:
+                return v
+        try:
+            lg = object.__getattribute__(self, "__get_lazy_reference__")
+        except AttributeError:
+            lg = None
+        if callable(lg):
+            v = self[key] = lg(key)
+            return v
+        raise KeyError(key)
+
+    __call__ = __getitem__
+
+    def __contains__(self, k):
+        _extra = self._lookup("_extra")
+        if _extra is not DEFAULT and _extra is not None and k in _extra:
+            return True
+        return self._lookup(str(k)) is not DEFAULT
+
+    has_key = __contains__
+
+    def __bool__(self):
+        return bool(self._plain())
+
+    def __iter__(self):
+        return iter(self._plain())
+
+    def keys(self):
+        return self._plain().keys()
+
+    def values(self):
+        return self._plain().values()
+
+    def items(self):
+        return self._plain().items()
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        value = self._lookup(key)
+        if value is DEFAULT:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        delattr(self, key)
+        return value
+
+    def clear(self):
+        for key in list(self._plain()):
+            delattr(self, key)
+
+    def copy(self):
+        return self._plain()
+
+    def __copy__(self):
+        return type(self)(self)
+
+    def __deepcopy__(self, memo):
+        return type(self)(copy.deepcopy(self._plain(), memo))
+
+    def __reduce__(self):
+        # the generated classes can't be imported: pickle a plain Row
+        return Row, (self._plain(),)
+
+
+_set_more = SlotRow._more.__set__
+
+
 class Table(Serializable, BasicStorage):
     """
     A database table — collection of ``Field``s plus operations.
@@ -398,6 +717,8 @@ class Table(Serializable, BasicStorage):
         self._before_insert = [attempt_upload_on_insert(self)]
         self._before_update = [delete_uploaded_files, attempt_upload_on_update(self)]
         self._before_delete = [delete_uploaded_files]
+        # the callbacks above only act on upload fields
+        self._upload_callbacks = self._before_insert + self._before_update
         self._after_insert = []
         self._after_update = []
         self._after_delete = []
@@ -988,9 +1309,15 @@ class Table(Serializable, BasicStorage):
         if any(f(row) for f in self._before_insert):
             return 0
         ret = self._db._adapter.insert(self, row.op_values())
-        if ret and self._after_insert:
-            for f in self._after_insert:
-                f(row, ret)
+        if self._after_insert:
+
+            def after_insert(ret):
+                if ret:
+                    for f in self._after_insert:
+                        f(row, ret)
+
+            # inside db.batch() the id is known once the batch is sent
+            when_done(ret, after_insert)
         return ret
 
     def _validate_fields(self, fields, record=None):
@@ -1090,7 +1417,31 @@ class Table(Serializable, BasicStorage):
             "success": updated > 0,
         }
 
-    def update_or_insert(self, _key=DEFAULT, **values):
+    def update_or_insert(self, _key=DEFAULT, *, _upsert=False, **values):
+        """
+        Update the record matching ``_key`` (by default the ``values``
+        themselves) with ``values``, or insert one; returns the new id,
+        None when a record was updated.
+
+        A key that is one equality on the id is written with a single
+        upsert statement. So is one on a ``unique`` field with
+        ``_upsert=True``, which asserts the database has the UNIQUE
+        constraint to conflict on (a table defined with
+        ``migrate=False`` or made unique later may not).
+        """
+        conflict = self._upsert_key(_key, values, _upsert)
+        if conflict is not None:
+            # Insert unless the unique key exists, in one statement; only
+            # an existing row costs a second one.
+            row = self._fields_and_values_for_insert(values)
+            newid = self._db._adapter.upsert(self, [conflict], row.op_values(), [])
+            if newid is None:
+                rest = dict(
+                    (k, v) for k, v in values.items() if k != conflict.name
+                )
+                if rest:
+                    self._db(conflict == values[conflict.name]).update(**rest)
+            return newid
         if _key is DEFAULT:
             record = self(**values)
         elif isinstance(_key, dict):
@@ -1104,6 +1455,51 @@ class Table(Serializable, BasicStorage):
             newid = self.insert(**values)
         return newid
 
+    def _upsert_key(self, _key, values, unique=False):
+        """
+        The unique field ``update_or_insert`` can upsert on, or None.
+
+        The key must be one equality on ``self._id``, or with ``unique``
+        on a ``unique`` field, whose value ``values`` sets too (the row
+        inserted has to carry it), and no insert callbacks may depend on
+        whether the row existed.
+        """
+        adapter = self._db._adapter
+        if (
+            not adapter.can_upsert
+            or adapter.upsert_ids is None
+            or hasattr(self, "_primarykey")
+            or hasattr(self, "_on_insert_error")
+            or self._after_insert
+            or any(f not in self._upload_callbacks for f in self._before_insert)
+            or any(field.type == "upload" for field in self)
+            or any(isinstance(v, Expression) for v in values.values())
+        ):
+            return None
+        if _key is DEFAULT:
+            key = values
+        elif isinstance(_key, dict):
+            key = _key
+        elif (
+            isinstance(_key, Query)
+            and getattr(_key.op, "__name__", None) == "eq"
+            and isinstance(_key.first, Field)
+            and _key.first.table is self
+            and not isinstance(_key.second, (Expression, Select))
+        ):
+            key = {_key.first.name: _key.second}
+        else:
+            return None
+        if len(key) != 1:
+            return None
+        ((name, value),) = key.items()
+        if name not in self.fields or name not in values or values[name] != value:
+            return None
+        field = self[name]
+        if field is not getattr(self, "_id", None) and not (unique and field.unique):
+            return None
+        return field
+
     def validate_and_update_or_insert(self, _key=DEFAULT, **fields):
         if _key is DEFAULT or _key == "":
             primary_keys = {}
@@ -1136,19 +1532,114 @@ class Table(Serializable, BasicStorage):
             response = self.validate_and_insert(**fields)
         return response
 
-    def bulk_insert(self, items):
+    def bulk_insert(self, items, batch_size=None, returning=None):
         """
         here items is a list of dictionaries
+
+        On SQL backends that support it, rows go out as multi-row INSERTs
+        of up to ``batch_size`` rows each (default: the adapter's
+        ``bulk_insert_batch_size``, within the backend's parameter limit).
+
+        With ``returning`` (Fields or names) the new rows' values of those
+        fields come back as Rows, in insertion order, instead of the ids.
         """
         data = [self._fields_and_values_for_insert(item) for item in items]
         if any(f(el) for el in data for f in self._before_insert):
             return 0
-        ret = self._db._adapter.bulk_insert(self, [el.op_values() for el in data])
+        adapter = self._db._adapter
+        items = [el.op_values() for el in data]
+        if returning is not None:
+            returning = [self[f] if isinstance(f, str) else f for f in returning]
+            if not self._after_insert:
+                return adapter.bulk_insert_returning(
+                    self, items, returning, batch_size=batch_size
+                )
+        ret = adapter.bulk_insert(self, items, batch_size=batch_size)
         ret and [
             [f(el, ret[k]) for k, el in enumerate(data)] for f in self._after_insert
         ]
+        if returning is not None:
+            # the callbacks wanted the ids: read the rows back by them
+            return self._db(self._id.belongs(ret)).select(*returning, orderby=self._id)
         return ret
 
+    def bulk_update(self, rows, key="id", fields=None, batch_size=None):
+        """
+        Update each of ``rows`` (dicts or Rows) to its own values, matching
+        the table's rows on ``key``; ``fields`` limits the fields written
+        (default: every field the row carries). Returns how many rows
+        were updated.
+
+        On SQL backends rows that set the same fields go out as one
+        statement per ``batch_size`` rows. As with ``update_naive``, the
+        update callbacks are not run.
+        """
+        key = self[key] if isinstance(key, str) else key
+        skip = set([key.name])
+        if hasattr(self, "_id"):
+            skip.add(self._id.name)
+        items = []
+        for row in rows:
+            if row.get(key.name) is None:
+                raise SyntaxError("Table: bulk_update needs a value for %s" % key.name)
+            names = fields or [name for name in row if name in self.fields]
+            values = dict((name, row[name]) for name in names if name not in skip)
+            op_values = self._fields_and_values_for_update(values).op_values()
+            items.append([(key, row[key.name])] + op_values)
+        return self._db._adapter.bulk_update(self, key, items, batch_size=batch_size)
+
+    def _upsert_row(self, conflict, values):
+        """
+        ``(conflict fields, op_values, fields to overwrite)`` for
+        upserting ``values``: the fields given and the computed ones.
+        """
+        conflict = [self[f] if isinstance(f, str) else f for f in conflict]
+        for field in conflict:
+            if field.name not in values:
+                raise SyntaxError("Table: upsert needs a value for %s" % field.name)
+        skip = set(field.name for field in conflict)
+        if hasattr(self, "_id"):
+            skip.add(self._id.name)
+        row = self._fields_and_values_for_insert(values).op_values()
+        update = [
+            field
+            for field, _ in row
+            if field.name not in skip and (field.name in values or field.compute)
+        ]
+        return conflict, row, update
+
+    def upsert(self, conflict, **values):
+        """
+        Insert ``values``, or update the row they collide with on the
+        unique ``conflict`` fields (fields or names), in one statement
+        where the backend supports it.
+
+        Only the fields given (and computed ones) are overwritten.
+        Returns the id of the row written, None when the backend doesn't
+        report it. Insert/update callbacks are not run.
+        """
+        conflict, row, update = self._upsert_row(conflict, values)
+        return self._db._adapter.upsert(self, conflict, row, update)
+
+    def bulk_upsert(self, conflict, items, batch_size=None):
+        """
+        ``upsert`` a list of dictionaries, as multi-row statements of up
+        to ``batch_size`` rows where the backend supports it.
+        """
+        adapter, batch, shape = self._db._adapter, [], None
+        for values in items:
+            keys, row, update = self._upsert_row(conflict, values)
+            # consecutive rows setting and updating the same columns
+            # share a statement
+            row_shape = ([f.name for f, _ in row], [f.name for f in update])
+            if batch and row_shape != shape:
+                adapter.bulk_upsert(self, keys, batch, batch_update, batch_size)
+                batch = []
+            batch.append(row)
+            shape, batch_update = row_shape, update
+        if batch:
+            adapter.bulk_upsert(self, keys, batch, batch_update, batch_size)
+
     def _truncate(self, mode=""):
         return self._db._adapter.dialect.truncate(self, mode)
 
@@ -1183,16 +1674,26 @@ class Table(Serializable, BasicStorage):
         This assumes that there is a field of type id that is integer and in
         incrementing order.
         Will keep the id numbers in restored table.
-        """
-        if validate:
-            inserting = self.validate_and_insert
-        else:
-            inserting = self.insert
 
+        The rows go out ``batch_size`` (default 1000) at a time, through
+        one multi-row insert; the rows of a batch whose ``unique`` value
+        is in the table already are found with one ``belongs`` query
+        and updated instead. A row that refers to a row of its own
+        batch (same ``unique`` value, reference to this table) sends
+        the batch first.
+
+        - 'commit_every' commits after that many batches (default 1)
+        - 'threaded' if True reads the csv in a worker thread while the
+          rows read before are written
+        """
         delimiter = kwargs.get("delimiter", ",")
         quotechar = kwargs.get("quotechar", '"')
         quoting = kwargs.get("quoting", csv.QUOTE_MINIMAL)
         restore = kwargs.get("restore", False)
+        batch_size = kwargs.get("batch_size", 1000)
+        commit_every = kwargs.get("commit_every", 1)
+        threaded = kwargs.get("threaded", False)
+        list_reference_s = "list:reference"
         if restore:
             self._db[self].truncate()
 
@@ -1210,7 +1711,6 @@ class Table(Serializable, BasicStorage):
             id_map_self = id_map[self._tablename]
 
         def fix(field, value, id_map, id_offset):
-            list_reference_s = "list:reference"
             if value == null:
                 value = None
             elif field.type == "blob":
@@ -1255,74 +1755,240 @@ class Table(Serializable, BasicStorage):
             else:
                 return False
 
-        first = True
-        unique_idx = None
-        for lineno, line in enumerate(reader):
-            if not line:
-                return
-            if not colnames:
-                # assume this is the first line of the input, contains colnames
-                colnames = [x.split(".", 1)[-1] for x in line]
-
-                cols, cid = {}, None
-                for i, colname in enumerate(colnames):
-                    if is_id(colname):
-                        cid = colname
-                    elif colname in self.fields:
-                        cols[colname] = getattr(self, colname)
-                    if colname == unique:
-                        unique_idx = i
-            elif len(line) == len(colnames):
-                # every other line contains instead data
-                items = dict(zip(colnames, line))
-                if transform:
-                    items = transform(items)
-
-                ditems = dict()
-                csv_id = None
-                for field in self:
-                    fieldname = field.name
-                    if fieldname in items:
-                        try:
-                            value = fix(field, items[fieldname], id_map, id_offset)
-                            if field.type != "id":
-                                ditems[fieldname] = value
-                            else:
-                                csv_id = int(value)
-                        except ValueError:
-                            raise RuntimeError("Unable to parse line:%s" % (lineno + 1))
-                if not (id_map or csv_id is None or id_offset is None or unique_idx):
-                    curr_id = inserting(**ditems)
-                    if first:
-                        first = False
-                        # First curr_id is bigger than csv_id,
-                        # then we are not restoring but
-                        # extending db table with csv db table
-                        id_offset[self._tablename] = (
-                            (curr_id - csv_id) if curr_id > csv_id else 0
-                        )
-                    # create new id until we get the same as old_id+offset
-                    while curr_id < csv_id + id_offset[self._tablename]:
+        # rows waiting for the next batch: (csv_id, unique value, items)
+        pending = []
+        pending_ids, pending_unique = set(), set()
+        # the fields that can hold ids of this very table, as
+        # (name, is a list:reference)
+        self_refs = [
+            (field.name, field.type.startswith("list:"))
+            for field in self
+            if field.type.startswith("reference")
+            and field.type[9:].strip() == self._tablename
+            or field.type.startswith(list_reference_s)
+            and field.type[len(list_reference_s) :].strip() == self._tablename
+        ]
+        state = {"first": True, "batches": 0}
+
+        def aligned(csv_id):
+            # restoring with the csv ids (shifted by the table's offset)
+            return not (id_map or csv_id is None or id_offset is None or unique_idx)
+
+        def insert_one(ditems):
+            return self._insert_many([ditems], validate)[0]
+
+        def insert_aligned(rows):
+            k = 0
+            while k < len(rows):
+                csv_id, _, ditems = rows[k]
+                curr_id = insert_one(ditems)
+                if state["first"] and curr_id:
+                    state["first"] = False
+                    # First curr_id is bigger than csv_id,
+                    # then we are not restoring but
+                    # extending db table with csv db table
+                    id_offset[self._tablename] = (
+                        (curr_id - csv_id) if curr_id > csv_id else 0
+                    )
+                # create new id until we get the same as old_id+offset
+                while curr_id and curr_id < csv_id + id_offset[self._tablename]:
+                    self._db(getattr(self, cid) == curr_id).delete()
+                    curr_id = insert_one(ditems)
+                # the rows with the next csv ids should get the next ids:
+                # they go out together
+                end = k + 1
+                while end < len(rows) and rows[end][0] == rows[end - 1][0] + 1:
+                    end += 1
+                run = rows[k + 1 : end]
+                for (csv_id, _, ditems), curr_id in zip(
+                    run, self._insert_many([row[2] for row in run], validate)
+                ):
+                    while curr_id and curr_id < csv_id + id_offset[self._tablename]:
                         self._db(getattr(self, cid) == curr_id).delete()
-                        curr_id = inserting(**ditems)
+                        curr_id = insert_one(ditems)
+                k = end
+
+        def insert_or_update(rows):
+            new_ids = [None] * len(rows)
+            inserts = list(range(len(rows)))
+            if unique_idx:
                 # Validation. Check for duplicate of 'unique' &,
                 # if present, update instead of insert.
-                elif not unique_idx:
-                    new_id = inserting(**ditems)
+                field = getattr(self, unique)
+                values = [row[1] for row in rows]
+                # match the csv strings and the stored values as belongs
+                # binds them ("007" is 7 for an integer)
+                key = lambda value: self._db._adapter.represent(value, field.type)
+                records = self._db(field.belongs(values)).select(
+                    self._id, field, orderby=self._id
+                )
+                existing = {}
+                for record in records:
+                    existing.setdefault(key(record[unique]), record[self._id.name])
+                keys = [key(value) for value in values]
+                # a record no csv value claims matched in the database only
+                # (a case-insensitive collation...): ask it for the rest
+                lookup = not set(existing).issubset(keys)
+                inserts = []
+                for k, (_, unique_value, ditems) in enumerate(rows):
+                    record_id = existing.get(keys[k])
+                    if record_id is None and lookup:
+                        record = self._db(field == unique_value).select(
+                            self._id, orderby=self._id, limitby=(0, 1)
+                        ).first()
+                        record_id = record and record[self._id.name]
+                    if record_id is None:
+                        inserts.append(k)
+                        continue
+                    new_fields = dict(
+                        (name, value)
+                        for name, value in ditems.items()
+                        if name in self.fields and self[name].type != "id"
+                    )
+                    if new_fields:
+                        self._db(self._id == record_id, ignore_common_filters=True).update(
+                            **new_fields
+                        )
+                    new_ids[k] = record_id
+            ids = self._insert_many([rows[k][2] for k in inserts], validate)
+            for k, new_id in zip(inserts, ids):
+                new_ids[k] = new_id
+            return new_ids
+
+        def flush():
+            if not pending:
+                return
+            rows = list(pending)
+            del pending[:]
+            pending_ids.clear()
+            pending_unique.clear()
+            k = 0
+            while k < len(rows):
+                kind = aligned(rows[k][0])
+                end = k + 1
+                while end < len(rows) and aligned(rows[end][0]) == kind:
+                    end += 1
+                if kind:
+                    insert_aligned(rows[k:end])
                 else:
-                    unique_value = line[unique_idx]
-                    query = getattr(self, unique) == unique_value
-                    record = self._db(query).select().first()
-                    if record:
-                        record.update_record(**ditems)
-                        new_id = record[self._id.name]
-                    else:
-                        new_id = inserting(**ditems)
-                if id_map and csv_id is not None:
-                    id_map_self[csv_id] = new_id
-            if lineno % 1000 == 999:
+                    new_ids = insert_or_update(rows[k:end])
+                    if id_map:
+                        for (csv_id, _, _), new_id in zip(rows[k:end], new_ids):
+                            if csv_id is not None:
+                                id_map_self[csv_id] = new_id
+                k = end
+            state["batches"] += 1
+            if state["batches"] % commit_every == 0:
                 self._db.commit()
 
+        def waits_for_pending(items, unique_value):
+            # whether this row needs what a pending row gets once inserted
+            if unique_idx and unique_value in pending_unique:
+                return True
+            for fieldname, is_list in self_refs:
+                value = items.get(fieldname)
+                if not value or value == null:
+                    continue
+                if not id_map:
+                    # the references are shifted by the table's offset,
+                    # known once the first row is in
+                    return id_offset is not None and self._tablename not in id_offset
+                try:
+                    if is_list:
+                        refs = [int(v) for v in bar_decode_string(value)]
+                    else:
+                        refs = [int(value)]
+                except ValueError:
+                    continue
+                if pending_ids.intersection(refs):
+                    return True
+            return False
+
+        unique_idx = None
+        lines = enumerate(reader)
+        if threaded:
+            lines = _read_ahead(lines, batch_size)
+        try:
+            for lineno, line in lines:
+                if not line:
+                    break
+                if not colnames:
+                    # assume this is the first line of the input, contains colnames
+                    colnames = [x.split(".", 1)[-1] for x in line]
+
+                    cols, cid = {}, None
+                    for i, colname in enumerate(colnames):
+                        if is_id(colname):
+                            cid = colname
+                        elif colname in self.fields:
+                            cols[colname] = getattr(self, colname)
+                        if colname == unique:
+                            unique_idx = i
+                elif len(line) == len(colnames):
+                    # every other line contains instead data
+                    items = dict(zip(colnames, line))
+                    if transform:
+                        items = transform(items)
+                    unique_value = line[unique_idx] if unique_idx else None
+                    if pending and waits_for_pending(items, unique_value):
+                        flush()
+
+                    ditems = dict()
+                    csv_id = None
+                    for field in self:
+                        fieldname = field.name
+                        if fieldname in items:
+                            try:
+                                value = fix(field, items[fieldname], id_map, id_offset)
+                                if field.type != "id":
+                                    ditems[fieldname] = value
+                                else:
+                                    csv_id = int(value)
+                            except ValueError:
+                                raise RuntimeError("Unable to parse line:%s" % (lineno + 1))
+                    pending.append((csv_id, unique_value, ditems))
+                    if csv_id is not None:
+                        pending_ids.add(csv_id)
+                    if unique_idx:
+                        pending_unique.add(unique_value)
+                    if len(pending) >= batch_size:
+                        flush()
+            flush()
+        finally:
+            if threaded:
+                lines.close()
+
+    def _insert_many(self, items, validate=False):
+        """
+        Insert ``items`` (dicts) as ``insert`` (``validate_and_insert``
+        when ``validate``) would one by one, with one ``bulk_insert`` of
+        the adapter for all of them. Returns their ids: None where the
+        validation failed, 0 where a ``_before_insert`` callback said no.
+        """
+        ids = [None] * len(items)
+        rows, positions = [], []
+        for k, fields in enumerate(items):
+            if validate:
+                errors, fields = self._validate_fields(fields)
+                if errors:
+                    continue
+            row = self._fields_and_values_for_insert(fields)
+            if any(f(row) for f in self._before_insert):
+                ids[k] = 0
+                continue
+            rows.append(row)
+            positions.append(k)
+        if rows:
+            new_ids = self._db._adapter.bulk_insert(
+                self, [row.op_values() for row in rows]
+            )
+            for k, row, new_id in zip(positions, rows, new_ids):
+                ids[k] = new_id
+                if new_id:
+                    for f in self._after_insert:
+                        f(row, new_id)
+        return ids
+
     def as_dict(self, flat=False, sanitize=True):
         table_as_dict = dict(
             tablename=str(self),
@@ -1737,6 +2403,77 @@ class Expression(object):
     def abs(self):
         return Expression(self.db, self._dialect.aggregate, self, "ABS", self.type)
 
+    def over(self, partition_by=None, orderby=None, frame=None):
+        """
+        Use this aggregate (or window function) over a window::
+
+            db.sale.amount.sum().over(partition_by=db.sale.shop,
+                                      orderby=db.sale.day)
+
+        ``partition_by`` and ``orderby`` take an expression or a list;
+        ``frame`` is a frame clause as SQL (``"ROWS BETWEEN 6 PRECEDING
+        AND CURRENT ROW"``). On a window the parts given replace its own.
+        """
+        if isinstance(partition_by, Expression):
+            partition_by = [partition_by]
+        if isinstance(orderby, Expression):
+            orderby = [orderby]
+        if self.op == self._dialect.window:
+            old = self.second
+            return Expression(
+                self.db,
+                self.op,
+                self.first,
+                (
+                    old[0] if partition_by is None else tuple(partition_by),
+                    old[1] if orderby is None else tuple(orderby),
+                    old[2] if frame is None else frame,
+                ),
+                self.type,
+            )
+        return Expression(
+            self.db,
+            self._dialect.window,
+            self,
+            (tuple(partition_by or ()), tuple(orderby or ()), frame),
+            self.type,
+        )
+
+    def _ranking(self, kind):
+        function = Expression(
+            self.db, self._dialect.window_function, None, (kind, None, None), "integer"
+        )
+        return function.over(orderby=self)
+
+    def row_number(self):
+        """``ROW_NUMBER() OVER (ORDER BY self)``; see ``over`` to partition."""
+        return self._ranking("ROW_NUMBER")
+
+    def rank(self):
+        """``RANK() OVER (ORDER BY self)``; see ``over`` to partition."""
+        return self._ranking("RANK")
+
+    def dense_rank(self):
+        """``DENSE_RANK() OVER (ORDER BY self)``; see ``over`` to partition."""
+        return self._ranking("DENSE_RANK")
+
+    def lag(self, offset=1, default=None):
+        """
+        The value ``offset`` rows back in the window (``default`` before
+        the first); completed by ``over``.
+        """
+        return Expression(
+            self.db, self._dialect.window_function, self, ("LAG", offset, default),
+            self.type,
+        )
+
+    def lead(self, offset=1, default=None):
+        """As ``lag``, ``offset`` rows ahead."""
+        return Expression(
+            self.db, self._dialect.window_function, self, ("LEAD", offset, default),
+            self.type,
+        )
+
     def cast(self, cast_as, **kwargs):
         return Expression(
             self.db,
@@ -2907,6 +3644,31 @@ class Query(Serializable):
             return self.__dict__
 
 
+class Param(object):
+    """
+    A named placeholder for a value supplied at execution time.
+
+    Use it on the right of a comparison and compile the query once with
+    ``Set.prepare_select``::
+
+        q = db(db.person.email == db.Param("email")).prepare_select(
+            db.person.id, db.person.name
+        )
+        rows = q(email="max@example.com")
+
+    ``type`` defaults to the type of the field it is compared with.
+    """
+
+    __slots__ = ("name", "type")
+
+    def __init__(self, name, type=None):
+        self.name = name
+        self.type = type
+
+    def __repr__(self):
+        return "<Param %s>" % self.name
+
+
 class Set(Serializable):
     """
     Represents a set of records in the database.
@@ -2972,7 +3734,11 @@ class Set(Serializable):
         return self.db._adapter._count(self.query, distinct)
 
     def _select(self, *fields, **attributes):
+        if "after" in attributes:
+            subset, fields = self._after(fields, attributes)
+            return subset._select(*fields, **attributes)
         adapter = self.db._adapter
+        self._rowtype(attributes)
         # _select is the public "give me the SQL string" entry point.
         # It feeds two use cases: (1) user inspection / debugging and
         # (2) the legacy ``belongs(<sql_string>)`` plumbing which
@@ -2986,14 +3752,7 @@ class Set(Serializable):
             saved = compiler.parameterize
             compiler.parameterize = False
         try:
-            tablenames = adapter.tables(
-                self.query,
-                attributes.get("join", None),
-                attributes.get("left", None),
-                attributes.get("orderby", None),
-                attributes.get("groupby", None),
-            )
-            fields = adapter.expand_all(fields, tablenames)
+            fields = adapter.expand_select(self.query, fields, attributes)
             return adapter._select(self.query, fields, attributes)
         finally:
             if saved is not None:
@@ -3020,17 +3779,28 @@ class Set(Serializable):
         from .ast_translate import set_to_select
         return set_to_select(self, fields, attributes)
 
-    def _delete(self):
+    def _delete(self, *, _returning=None):
         db = self.db
         table = db._adapter.get_table(self.query)
+        if _returning:
+            returning = self._returning_fields(table, _returning)
+            return db._adapter._delete(table, self.query, returning)
         return db._adapter._delete(table, self.query)
 
-    def _update(self, **update_fields):
+    def _update(self, *, _returning=None, **update_fields):
         db = self.db
         table = db._adapter.get_table(self.query)
         row = table._fields_and_values_for_update(update_fields)
+        if _returning:
+            returning = self._returning_fields(table, _returning)
+            return db._adapter._update(table, self.query, row.op_values(), returning)
         return db._adapter._update(table, self.query, row.op_values())
 
+    @staticmethod
+    def _returning_fields(table, returning):
+        """Resolve ``_returning`` names or Fields against ``table``."""
+        return [table[f] if isinstance(f, str) else f for f in returning]
+
     def as_dict(self, flat=False, sanitize=True):
         if flat:
             uid = dbname = uri = None
@@ -3163,61 +3933,292 @@ class Set(Serializable):
         return db._adapter.count(self.query, distinct)
 
     def select(self, *fields, **attributes):
+        if "after" in attributes:
+            subset, fields = self._after(fields, attributes)
+            return subset.select(*fields, **attributes)
         adapter = self.db._adapter
-        tablenames = adapter.tables(
-            self.query,
-            attributes.get("join", None),
-            attributes.get("left", None),
-            attributes.get("orderby", None),
-            attributes.get("groupby", None),
-        )
-        fields = adapter.expand_all(fields, tablenames)
+        self._rowtype(attributes)
+        fields = adapter.expand_select(self.query, fields, attributes)
         return adapter.select(self.query, fields, attributes)
 
+    def _rowtype(self, attributes):
+        """Turn the ``rowtype`` attribute (popped) into a ``processor``."""
+        rowtype = attributes.pop("rowtype", None)
+        processor = self.db._adapter.rowtype_processor(rowtype)
+        if processor is not None:
+            if attributes.get("processor") is not None:
+                raise SyntaxError("Set: rowtype and processor are exclusive")
+            attributes["processor"] = processor
+
+    def paginate(self, page_size, *fields, **attributes):
+        """
+        Return ``(rows, cursor)``: the first ``page_size`` rows in
+        ``orderby`` order after ``cursor`` (None for the first page),
+        and the cursor of the next page, None after the last one::
+
+            rows, cursor = db(query).paginate(50, orderby=~db.log.created)
+            while cursor:
+                rows, cursor = db(query).paginate(
+                    50, orderby=~db.log.created, cursor=cursor
+                )
+
+        Pages are found with a seek on the ``orderby`` fields (see the
+        ``after`` argument of ``select``) instead of an OFFSET, so deep
+        pages cost what the first one does. The cursor is an opaque
+        string; the ``orderby`` fields and the id are selected with
+        ``fields`` so that it can be read from the last row.
+        """
+        if "limitby" in attributes:
+            raise SyntaxError("Set: paginate does not take a limitby")
+        cursor = attributes.pop("cursor", None)
+        keys = self._keyset(attributes.get("orderby"))
+        after = None if cursor is None else self._decode_cursor(keys, cursor)
+        rows = self.select(
+            *fields, after=after, limitby=(0, page_size + 1), **attributes
+        )
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        return rows, self._encode_cursor(keys, rows.last())
+
+    def _after(self, fields, attributes):
+        """
+        ``(subset, fields)``: the subset past ``attributes["after"]``
+        (popped), a row or a tuple of values for the ``orderby`` fields
+        and the id, and ``fields`` with those added when left out, so
+        that a row read can seed the next seek. ``attributes`` get the
+        orderby the seek depends on.
+        """
+        after = attributes.pop("after")
+        keys = self._keyset(attributes.get("orderby"))
+        fields = self._with_keys(fields, keys)
+        attributes["orderby"] = reduce(
+            lambda a, b: a | b, [~field if desc else field for field, desc in keys]
+        )
+        if after is None:
+            return self, fields
+        if isinstance(after, (list, tuple)):
+            if len(after) != len(keys):
+                raise SyntaxError(
+                    "Set: after needs a value for each of %s"
+                    % ", ".join(field.longname for field, _ in keys)
+                )
+            values = list(after)
+        else:
+            try:
+                values = [after[field] for field, _ in keys]
+            except KeyError:
+                raise SyntaxError(
+                    "Set: the after row needs %s"
+                    % ", ".join(field.longname for field, _ in keys)
+                )
+        # (a > x) OR (a = x AND (b > y OR ...)), plus a range on the
+        # leading field so that an index on it can seek to the page.
+        # NULLs compare to nothing: where the dialect sorts them (see
+        # ``nulls_first``) they are past a value or every value is
+        # past them, and a NULL is matched with IS NULL.
+        nulls_first = self.db._adapter.dialect.nulls_first
+        query = None
+        for (field, desc), value in reversed(list(zip(keys, values))):
+            past, same = self._past(field, desc, value, nulls_first)
+            if query is None:
+                query = past if past is not None else same & (field != None)
+            elif past is None:
+                query = same & query
+            else:
+                query = past | (same & query)
+        if len(keys) > 1:
+            (field, desc), value = keys[0], values[0]
+            if value is None:
+                if desc == nulls_first:
+                    # only NULLs sort after a NULL
+                    query = (field == None) & query
+            else:
+                seek = field <= value if desc else field >= value
+                if desc == nulls_first:
+                    seek |= field == None
+                query = seek & query
+        return self.where(query), fields
+
+    @staticmethod
+    def _past(field, desc, value, nulls_first):
+        """
+        The queries for the rows sorted after ``value`` on ``field``
+        (None when there are none) and for those equal to it.
+        """
+        if value is None:
+            # NULLs come first in ascending order with nulls_first, and
+            # first in descending order without
+            past = field != None if desc != nulls_first else None
+            return past, field == None
+        past = field < value if desc else field > value
+        if desc == nulls_first:
+            past |= field == None
+        return past, field == value
+
+    def _keyset(self, orderby):
+        """
+        ``[(field, descending), ...]`` for ``orderby`` (Fields and
+        ``~Fields``), closed by the table's id so that the order is total.
+        """
+        dialect = self.db._adapter.dialect
+        items, stack = [], [orderby] if orderby is not None else []
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                stack.extend(reversed(item))
+            elif not isinstance(item, Field) and isinstance(item, Expression) and (
+                item.op == dialect.comma
+            ):
+                stack.extend((item.second, item.first))
+            else:
+                items.append(item)
+        keys = []
+        for item in items:
+            desc = not isinstance(item, Field) and isinstance(item, Expression) and (
+                item.op == dialect.invert
+            )
+            field = item.first if desc else item
+            if not isinstance(field, Field):
+                raise SyntaxError("Set: can only seek on fields, not %s" % item)
+            keys.append((field, desc))
+        table = keys[0][0].table if keys else self.db._adapter.get_table(self.query)
+        if hasattr(table, "_id") and all(
+            field.longname != table._id.longname for field, _ in keys
+        ):
+            keys.append((table._id, keys[-1][1] if keys else False))
+        return keys
+
+    @staticmethod
+    def _with_keys(fields, keys):
+        """``fields`` plus the ``keys`` fields they leave out (none: all)."""
+        if not fields:
+            return fields
+        selected = set()
+        for item in fields:
+            if isinstance(item, SQLALL):
+                selected.update(field.longname for field in item._table)
+            elif isinstance(item, Field):
+                selected.add(item.longname)
+            elif isinstance(item, str):
+                selected.add(item)
+        return list(fields) + [
+            field for field, _ in keys if field.longname not in selected
+        ]
+
+    @staticmethod
+    def _encode_cursor(keys, row):
+        values = [row[field] for field, _ in keys]
+        data = json.dumps(values, default=str, separators=(",", ":"))
+        return to_native(base64.urlsafe_b64encode(to_bytes(data)))
+
+    @staticmethod
+    def _decode_cursor(keys, cursor):
+        try:
+            values = json.loads(to_native(base64.urlsafe_b64decode(to_bytes(cursor))))
+        except (ValueError, TypeError, binascii.Error):
+            raise ValueError("Set: invalid pagination cursor")
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("Set: pagination cursor for another orderby")
+        parsers = {
+            "date": datetime.date.fromisoformat,
+            "datetime": datetime.datetime.fromisoformat,
+            "time": datetime.time.fromisoformat,
+            "decimal": decimal.Decimal,
+        }
+        for k, (field, _) in enumerate(keys):
+            ftype = field.type
+            if isinstance(ftype, SQLCustomType):
+                ftype = ftype.type
+            if not isinstance(ftype, str):
+                continue
+            parse = parsers.get(ftype.split("(")[0])
+            if parse is not None and values[k] is not None:
+                values[k] = parse(values[k])
+        return values
+
+    def prepare_select(self, *fields, **attributes):
+        """
+        Compile this select once and return a ``PreparedSelect``.
+
+        The query may contain ``db.Param(name)`` placeholders; call the
+        result with a keyword value for each of them. Only the bind,
+        execute and parse steps run per call.
+        """
+        return PreparedSelect(self, fields, attributes)
+
     def iterselect(self, *fields, **attributes):
+        if "after" in attributes:
+            subset, fields = self._after(fields, attributes)
+            return subset.iterselect(*fields, **attributes)
         adapter = self.db._adapter
-        tablenames = adapter.tables(
-            self.query,
-            attributes.get("join", None),
-            attributes.get("left", None),
-            attributes.get("orderby", None),
-            attributes.get("groupby", None),
-        )
-        fields = adapter.expand_all(fields, tablenames)
+        fields = adapter.expand_select(self.query, fields, attributes)
         return adapter.iterselect(self.query, fields, attributes)
 
+    def stream_json(self, ofile, *fields, **attributes):
+        """
+        Writes the rows of ``iterselect(*fields, **attributes)`` to
+        ``ofile`` as a JSON list, as ``select(...).as_json()`` would,
+        one row at a time: the memory used does not grow with the
+        result (see ``Rows.export_to_json_file``).
+        """
+        rows = self.iterselect(*fields, **attributes)
+        try:
+            rows.export_to_json_file(ofile)
+        finally:
+            rows.close()
+
+    def stream_csv(self, ofile, *fields, **attributes):
+        """
+        Writes the rows of ``iterselect(*fields, **attributes)`` to
+        ``ofile`` as CSV, one row at a time. The options of
+        ``Rows.export_to_csv_file`` (``null``, ``delimiter``,
+        ``quotechar``, ``quoting``, ``represent``, ``colnames``,
+        ``write_colnames``) are taken out of ``attributes``.
+        """
+        options = {}
+        for key in (
+            "null", "delimiter", "quotechar", "quoting", "represent", "colnames",
+            "write_colnames",
+        ):
+            if key in attributes:
+                options[key] = attributes.pop(key)
+        rows = self.iterselect(*fields, **attributes)
+        try:
+            rows.export_to_csv_file(ofile, **options)
+        finally:
+            rows.close()
+
     def nested_select(self, *fields, **attributes):
         adapter = self.db._adapter
-        tablenames = adapter.tables(
-            self.query,
-            attributes.get("join", None),
-            attributes.get("left", None),
-            attributes.get("orderby", None),
-            attributes.get("groupby", None),
-        )
-        fields = adapter.expand_all(fields, tablenames)
+        fields = adapter.expand_select(self.query, fields, attributes)
         return adapter.nested_select(self.query, fields, attributes)
 
     def cte(self, name, *fields, **attributes):
         adapter = self.db._adapter
-        tablenames = adapter.tables(
-            self.query,
-            attributes.get("join", None),
-            attributes.get("left", None),
-            attributes.get("orderby", None),
-            attributes.get("groupby", None),
-        )
+        fields = adapter.expand_select(self.query, fields, attributes)
         attributes["cte"] = True
-        fields = adapter.expand_all(fields, tablenames)
         return adapter.nested_select(self.query, fields, attributes).with_alias(name)
 
-    def delete(self):
+    def delete(self, *, _returning=None):
+        """
+        Delete the rows of the set and return how many went. With
+        ``_returning`` (Fields or names) return those fields of the
+        deleted rows as Rows instead, in the DELETE itself where the
+        backend can (``RETURNING``/``OUTPUT``).
+        """
         db = self.db
         table = db._adapter.get_table(self.query)
+        returning = None
+        if _returning is not None:
+            returning = self._returning_fields(table, _returning)
         if any(f(self) for f in table._before_delete):
-            return 0
-        ret = db._adapter.delete(table, self.query)
-        ret and [f(self) for f in table._after_delete]
+            return 0 if returning is None else self._no_rows(returning)
+        if returning is None:
+            ret = db._adapter.delete(table, self.query)
+        else:
+            ret = db._adapter.delete_returning(table, self.query, returning)
+        when_done(ret, lambda n: n and [f(self) for f in table._after_delete])
         return ret
 
     def delete_naive(self):
@@ -3237,19 +4238,36 @@ class Set(Serializable):
             raise ValueError("No fields to update")
         return table, row
 
-    def _apply_update(self, table, row, run_callbacks):
+    def _apply_update(self, table, row, run_callbacks, returning=None):
         """Run before/after callbacks around the adapter update."""
         if run_callbacks and any(f(self, row) for f in table._before_update):
-            return 0
-        ret = self.db._adapter.update(table, self.query, row.op_values())
-        if run_callbacks and ret:
-            for f in table._after_update:
-                f(self, row)
+            return 0 if returning is None else self._no_rows(returning)
+        adapter = self.db._adapter
+        if returning is None:
+            ret = adapter.update(table, self.query, row.op_values())
+        else:
+            ret = adapter.update_returning(
+                table, self.query, row.op_values(), returning
+            )
+        if run_callbacks:
+            when_done(ret, lambda n: n and [f(self, row) for f in table._after_update])
         return ret
 
-    def update(self, **update_fields):
+    def _no_rows(self, fields):
+        return Rows(self.db, [], [f.longname for f in fields], fields=fields)
+
+    def update(self, *, _returning=None, **update_fields):
+        """
+        Update the rows of the set and return how many changed. With
+        ``_returning`` (Fields or names) return those fields of the
+        updated rows as Rows instead, read back by the UPDATE itself
+        where the backend can (``RETURNING``/``OUTPUT``).
+        """
         table, row = self._build_update_row(update_fields)
-        return self._apply_update(table, row, run_callbacks=True)
+        returning = None
+        if _returning is not None:
+            returning = self._returning_fields(table, _returning)
+        return self._apply_update(table, row, True, returning)
 
     def update_naive(self, **update_fields):
         """
@@ -3272,6 +4290,87 @@ class Set(Serializable):
         return response
 
 
+class PreparedSelect(object):
+    """
+    A select compiled once and executed many times.
+
+    Built by ``Set.prepare_select(*fields, **attributes)``. Translation,
+    compilation, colnames and the row-parse plan are computed up front;
+    calling the object with keyword values for its ``db.Param``
+    placeholders only binds, executes and parses::
+
+        by_email = db(db.person.email == db.Param("email")).prepare_select()
+        rows = by_email(email="max@example.com")
+
+    Values are bound as-is, so ``Param`` compared with ``None`` never
+    matches (``= NULL``) — use ``== None`` in the query for that.
+    """
+
+    def __init__(self, dbset, fields, attributes):
+        from . import ast as _ast  # local import to avoid cycles
+
+        db = self.db = dbset.db
+        adapter = db._adapter
+        if adapter.compiler is None:
+            raise NotImplementedError(
+                "prepared queries need an adapter with an AST compiler"
+            )
+        self.attributes = attributes
+        planned = adapter._ast_select_plan(
+            dbset.query, fields, attributes, prepared=True
+        )
+        if planned is None:
+            raise NotImplementedError("select shape not supported by prepare_select")
+        plan, self.sql = planned
+        self.fields, self.colnames = plan.fields, plan.colnames
+        self._template = list(self.sql.params)
+        self._slots = [
+            (i, p.name, p.type)
+            for i, p in enumerate(self._template)
+            if isinstance(p, _ast.Param)
+        ]
+        self.names = frozenset(name for _, name, _ in self._slots)
+        self._adapt = adapter.compiler._adapt_for_bind
+        self._plan = plan.parse_plan
+
+    def __repr__(self):
+        return "<PreparedSelect %s>" % str(self.sql)
+
+    def bind(self, **values):
+        """Return the ParamSQL for one execution with ``values`` bound."""
+        from .compilers.sql import ParamSQL
+
+        if values.keys() != self.names:
+            missing = self.names - values.keys()
+            if missing:
+                raise TypeError("missing value for Param: %s" % ", ".join(sorted(missing)))
+            raise TypeError(
+                "unexpected Param: %s" % ", ".join(sorted(values.keys() - self.names))
+            )
+        params = list(self._template)
+        adapt = self._adapt
+        for i, name, type_ in self._slots:
+            value = values[name]
+            params[i] = adapt(value, type_) if value is not None else None
+        return ParamSQL(self.sql, params)
+
+    def __call__(self, **values):
+        adapter = self.db._adapter
+        attributes = self.attributes
+        rows = adapter._select_aux_execute(self.bind(**values))
+        if isinstance(rows, tuple):
+            rows = list(rows)
+        limitby = attributes.get("limitby", None) or (0,)
+        rows = adapter.rowslice(rows, limitby[0], None)
+        cacheable = attributes.get("cacheable", False)
+        processor = attributes.get("processor")
+        if processor is not None:
+            return processor(rows, self.fields, self.colnames, cacheable=cacheable)
+        return adapter._parse_with_plan(
+            rows, self.fields, self.colnames, self._plan, cacheable=cacheable
+        )
+
+
 class LazyReferenceGetter(object):
     """
     Reverse-reference resolver attached to a fetched Row under
@@ -3337,11 +4436,11 @@ class LazySet(object):
     def _select(self, *fields, **attributes):
         return self._getset()._select(*fields, **attributes)
 
-    def _delete(self):
-        return self._getset()._delete()
+    def _delete(self, *, _returning=None):
+        return self._getset()._delete(_returning=_returning)
 
-    def _update(self, **update_fields):
-        return self._getset()._update(**update_fields)
+    def _update(self, *, _returning=None, **update_fields):
+        return self._getset()._update(_returning=_returning, **update_fields)
 
     def isempty(self):
         return self._getset().isempty()
@@ -3355,14 +4454,14 @@ class LazySet(object):
     def nested_select(self, *fields, **attributes):
         return self._getset().nested_select(*fields, **attributes)
 
-    def delete(self):
-        return self._getset().delete()
+    def delete(self, *, _returning=None):
+        return self._getset().delete(_returning=_returning)
 
     def delete_naive(self):
         return self._getset().delete_naive()
 
-    def update(self, **update_fields):
-        return self._getset().update(**update_fields)
+    def update(self, *, _returning=None, **update_fields):
+        return self._getset().update(_returning=_returning, **update_fields)
 
     def update_naive(self, **update_fields):
         return self._getset().update_naive(**update_fields)
@@ -3541,6 +4640,29 @@ class BasicRows(object):
 
         return serializers.json(items)
 
+    def export_to_json_file(self, ofile, mode="object", default=None):
+        """
+        Writes the rows to ``ofile`` as a JSON list, the same as
+        ``as_json``, one row at a time; the values are encoded by
+        ``serializers.json_encoder()``.
+        """
+        encode = serializers.json_encoder()
+        write = ofile.write
+        write("[")
+        separator = ""
+        for record in self:
+            write(separator)
+            write(
+                encode(
+                    record.as_json(
+                        mode=mode, default=default, serialize=False,
+                        colnames=self.colnames,
+                    )
+                )
+            )
+            separator = ", "
+        write("]")
+
     @property
     def colnames_fields(self):
         """
@@ -3685,6 +4807,157 @@ class BasicRows(object):
     json = as_json
 
 
+def _changing(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._indexes = None
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+class Records(list):
+    """
+    The ``records`` of a ``Rows``: a list that drops the indexes
+    ``Rows.index_by`` keeps on it whenever it changes.
+    """
+
+    __slots__ = ("_indexes",)
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+    __setitem__ = _changing("__setitem__")
+    __delitem__ = _changing("__delitem__")
+    __iadd__ = _changing("__iadd__")
+    __imul__ = _changing("__imul__")
+    append = _changing("append")
+    extend = _changing("extend")
+    insert = _changing("insert")
+    pop = _changing("pop")
+    remove = _changing("remove")
+    reverse = _changing("reverse")
+    sort = _changing("sort")
+    clear = _changing("clear")
+
+
+def _parsing_all(name):
+    method = getattr(Records, name)
+
+    def wrapper(self, *args, **kwargs):
+        for records in (self,) + args:
+            if isinstance(records, LazyRecords):
+                records._parse_all()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+class LazyRecords(Records):
+    """
+    The ``records`` of a ``Rows`` selected with ``rowtype="lazy"``: a
+    list that holds the driver rows and turns each into its ``Row``
+    (with ``parse_row``) the first time it is read, keeping the result.
+
+    Indexing, iteration and slicing parse only the rows they return;
+    the operations that look at every element (``in``, ``==``, ``+``,
+    ``sort``, ``index``, pickling...) parse them all first.
+    """
+
+    __slots__ = ("_parse_row",)
+
+    def __init__(self, rawrows=(), parse_row=None):
+        list.__init__(self, rawrows)
+        self._parse_row = parse_row
+
+    def _parse(self, i, item):
+        if isinstance(item, BasicStorage):
+            return item
+        item = self._parse_row(item)
+        list.__setitem__(self, i, item)
+        return item
+
+    def _parse_all(self):
+        for i in range(len(self)):
+            self._parse(i, list.__getitem__(self, i))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return LazyRecords(list.__getitem__(self, i), self._parse_row)
+        return self._parse(i, list.__getitem__(self, i))
+
+    def __iter__(self):
+        i = 0
+        while i < len(self):
+            yield self._parse(i, list.__getitem__(self, i))
+            i += 1
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self[i]
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __radd__(self, other):
+        if isinstance(other, list):
+            return other + list(self)
+        return NotImplemented
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+    def pop(self, i=-1):
+        item = self[i]
+        del self[i]
+        return item
+
+    def copy(self):
+        return list(self)
+
+    __contains__ = _parsing_all("__contains__")
+    __eq__ = _parsing_all("__eq__")
+    __ne__ = _parsing_all("__ne__")
+    __add__ = _parsing_all("__add__")
+    __mul__ = _parsing_all("__mul__")
+    __rmul__ = _parsing_all("__rmul__")
+    index = _parsing_all("index")
+    count = _parsing_all("count")
+    remove = _parsing_all("remove")
+    sort = _parsing_all("sort")
+    __hash__ = None
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, Row):
+        return _freeze(value.as_dict())
+    return value
+
+
+def _record_key(record):
+    """
+    A hashable stand-in for ``record``: two records have equal keys
+    exactly when they are equal (``Row.__eq__`` compares ``as_dict()``).
+    Raises TypeError when a value can't be hashed.
+    """
+    key = _freeze(record.as_dict())
+    hash(key)
+    return key
+
+
 class Rows(BasicRows):
     """
     A wrapper for the return value of a select. It basically represents a table.
@@ -3697,7 +4970,7 @@ class Rows(BasicRows):
         self, db=None, records=[], colnames=[], compact=True, rawrows=None, fields=[]
     ):
         self.db = db
-        self.records = records
+        self.records = records if isinstance(records, Records) else Records(records)
         self.fields = fields
         self.colnames = colnames
         self.compact = compact
@@ -3729,6 +5002,7 @@ class Rows(BasicRows):
         """
         if not keyed_virtualfields:
             return self
+        self._drop_indexes()
         for row in self.records:
             for tablename, virtualfields in keyed_virtualfields.items():
                 attributes = dir(virtualfields)
@@ -3749,6 +5023,88 @@ class Rows(BasicRows):
                             box[attribute] = method()
         return self
 
+    def save(self, batch_size=None):
+        """
+        Write back the values changed on these rows since they were
+        selected, with one ``Table.bulk_update`` per table that only sends
+        the modified fields. Rows are matched to their selected values by
+        id, so reordering or filtering them first is fine; rows without
+        their table's id are left alone. Returns how many rows were
+        updated.
+        """
+        originals = self.__dict__.setdefault("_originals", {})
+        columns = {}
+        for j, field in enumerate(self.fields):
+            if isinstance(field, Field) and hasattr(field.table, "_id"):
+                columns.setdefault(field.tablename, []).append((j, field))
+        updated = 0
+        for tablename, fields in columns.items():
+            table = fields[0][1].table
+            id_name = table._id.name
+            if id_name not in [field.name for j, field in fields]:
+                continue
+            known = originals.get(tablename)
+            if known is None:
+                known = originals[tablename] = self._selected_values(fields, id_name)
+            items = []
+            for record in self.records:
+                row = record[tablename] if tablename in record else record
+                id = row.get(id_name)
+                if id is None:
+                    continue
+                old = known.get(id, {})
+                item = {}
+                for j, field in fields:
+                    value = row.get(field.name)
+                    if field.name not in old or value != old[field.name]:
+                        item[field.name] = value
+                item.pop(id_name, None)
+                if item:
+                    known.setdefault(id, {}).update(item)
+                    item[id_name] = id
+                    items.append(item)
+            if items:
+                updated += table.bulk_update(
+                    items, key=table._id, batch_size=batch_size
+                )
+        return updated
+
+    def _selected_values(self, fields, id_name):
+        """
+        ``{id: {fieldname: value}}`` for ``fields`` (``(column, Field)``
+        pairs of one table) as the select returned them, read back from
+        the driver rows.
+        """
+        if self.response is None:
+            return {}
+        adapter = self.db._adapter
+        values = {}
+        for raw in self.response:
+            item = {}
+            for j, field in fields:
+                value = adapter.parse_value(raw[j], field._itype, field.type, True)
+                if field.filter_out:
+                    value = field.filter_out(value)
+                item[field.name] = value
+            values[item[id_name]] = item
+        return values
+
+    def _subset(self, records):
+        """
+        A ``Rows`` of ``records`` taken from these, which ``save`` compares
+        to the same selected values.
+        """
+        rows = self.__class__(
+            self.db,
+            records,
+            self.colnames,
+            compact=self.compact,
+            rawrows=self.response,
+            fields=self.fields,
+        )
+        rows._originals = self.__dict__.setdefault("_originals", {})
+        return rows
+
     def __add__(self, other):
         if self.colnames != other.colnames:
             raise Exception("Cannot & incompatible Rows objects")
@@ -3765,11 +5121,25 @@ class Rows(BasicRows):
         if self.colnames != other.colnames:
             raise Exception("Cannot & incompatible Rows objects")
         records = []
-        other_records = list(other.records)
-        for record in self.records:
-            if record in other_records:
-                records.append(record)
-                other_records.remove(record)
+        try:
+            # how many of each record ``other`` has left to match
+            counts = {}
+            for record in other.records:
+                key = _record_key(record)
+                counts[key] = counts.get(key, 0) + 1
+            for record in self.records:
+                key = _record_key(record)
+                if counts.get(key):
+                    records.append(record)
+                    counts[key] -= 1
+        except TypeError:
+            # unhashable values: compare the records one by one
+            records = []
+            other_records = list(other.records)
+            for record in self.records:
+                if record in other_records:
+                    records.append(record)
+                    other_records.remove(record)
         return self.__class__(
             self.db,
             records,
@@ -3781,7 +5151,16 @@ class Rows(BasicRows):
     def __or__(self, other):
         if self.colnames != other.colnames:
             raise Exception("Cannot | incompatible Rows objects")
-        records = [record for record in other.records if record not in self.records]
+        try:
+            keys = set(_record_key(record) for record in self.records)
+            records = [
+                record for record in other.records if _record_key(record) not in keys
+            ]
+        except TypeError:
+            # unhashable values: compare the records one by one
+            records = [
+                record for record in other.records if record not in self.records
+            ]
         records = self.records + records
         return self.__class__(
             self.db,
@@ -3795,13 +5174,7 @@ class Rows(BasicRows):
         return len(self.records)
 
     def __getslice__(self, a, b):
-        return self.__class__(
-            self.db,
-            self.records[a:b],
-            self.colnames,
-            compact=self.compact,
-            fields=self.fields,
-        )
+        return self._subset(self.records[a:b])
 
     def __getitem__(self, i):
         """
@@ -3851,15 +5224,58 @@ class Rows(BasicRows):
     def insert(self, position, row):
         self.records.insert(position, row)
 
+    def index_by(self, field, unique=True):
+        """
+        A dict of the rows by their value of ``field`` (a ``Field``, or
+        a name as accepted by ``row[...]``): ``{value: row}``, or
+        ``{value: [rows...]}`` in select order when ``unique`` is False.
+        With ``unique`` a value shared by two rows raises ValueError.
+
+        The index is built once and kept on ``records`` until the list
+        changes (any list operation, or ``append``, ``insert``,
+        ``exclude``), or ``join`` or ``setvirtualfields`` add to its
+        rows; other changes made to the rows themselves are not tracked.
+        """
+        name = str(field)
+        records = self.records
+        if not isinstance(records, Records):
+            records = self.records = Records(records)
+        indexes = getattr(records, "_indexes", None)
+        if indexes is None:
+            indexes = records._indexes = {}
+        index = indexes.get((name, unique))
+        if index is not None:
+            return index
+        index = {}
+        if unique:
+            for row in self:
+                value = row[name]
+                if value in index:
+                    raise ValueError(
+                        "Rows.index_by: %r is not unique for %s" % (value, name)
+                    )
+                index[value] = row
+        else:
+            for row in self:
+                value = row[name]
+                if value in index:
+                    index[value].append(row)
+                else:
+                    index[value] = [row]
+        indexes[(name, unique)] = index
+        return index
+
+    def _drop_indexes(self):
+        if isinstance(self.records, Records):
+            self.records._indexes = None
+
     def find(self, f, limitby=None):
         """
         Returns a new Rows object, a subset of the original object,
         filtered by the function `f`
         """
         if not self:
-            return self.__class__(
-                self.db, [], self.colnames, compact=self.compact, fields=self.fields
-            )
+            return self._subset([])
         records = []
         if limitby:
             a, b = limitby
@@ -3873,9 +5289,7 @@ class Rows(BasicRows):
                 k += 1
                 if k == b:
                     break
-        return self.__class__(
-            self.db, records, self.colnames, compact=self.compact, fields=self.fields
-        )
+        return self._subset(records)
 
     def exclude(self, f):
         """
@@ -3883,43 +5297,33 @@ class Rows(BasicRows):
         `f`, and returns a new Rows object containing the removed elements
         """
         if not self.records:
-            return self.__class__(
-                self.db, [], self.colnames, compact=self.compact, fields=self.fields
-            )
-        removed = []
-        i = 0
-        while i < len(self):
-            row = self[i]
-            if f(row):
-                removed.append(self.records[i])
-                del self.records[i]
-            else:
-                i += 1
-        return self.__class__(
-            self.db, removed, self.colnames, compact=self.compact, fields=self.fields
-        )
+            return self._subset([])
+        removed, kept = [], []
+        for record, row in zip(self.records, self):
+            (removed if f(row) else kept).append(record)
+        self.records[:] = kept
+        return self._subset(removed)
 
     def sort(self, f, reverse=False):
         """
         Returns a list of sorted elements (not sorted in place)
         """
-        rows = self.__class__(
-            self.db, [], self.colnames, compact=self.compact, fields=self.fields
-        )
         # When compact=True, iterating over self modifies each record,
         # so when sorting self, it is necessary to return a sorted
         # version of self.records rather than the sorted self directly.
-        rows.records = [
-            r
-            for (r, s) in sorted(
-                zip(self.records, self), key=lambda r: f(r[1]), reverse=reverse
-            )
-        ]
-        return rows
+        return self._subset(
+            [
+                r
+                for (r, s) in sorted(
+                    zip(self.records, self), key=lambda r: f(r[1]), reverse=reverse
+                )
+            ]
+        )
 
     def join(self, field, name=None, constraint=None, fields=[], orderby=None):
         if len(self) == 0:
             return self
+        self._drop_indexes()
         mode = "referencing" if field.type == "id" else "referenced"
         func = lambda ids: field.belongs(ids)
         db, ids, maps = self.db, [], {}
@@ -4081,6 +5485,43 @@ class Rows(BasicRows):
         return self
 
 
+class Columns(dict):
+    """
+    The result of a ``select(..., rowtype="columns")``: column name ->
+    that column's values, in select order. Integer, float and boolean
+    columns without NULLs are ``array.array``s, the others lists.
+
+    Columns of a field are named ``tablename.fieldname``; a bare
+    fieldname works too when a single table has it. Aliased expressions
+    use their alias.
+    """
+
+    def __missing__(self, key):
+        matches = [name for name in self if name.rsplit(".", 1)[-1] == key]
+        if len(matches) != 1:
+            raise KeyError(key)
+        return self[matches[0]]
+
+    def __repr__(self):
+        return "<Columns %s>" % list(self)
+
+    def to_numpy(self):
+        """A dict of ``numpy`` arrays."""
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("Columns.to_numpy requires numpy")
+        return dict((name, numpy.asarray(values)) for name, values in self.items())
+
+    def to_pandas(self):
+        """A ``pandas.DataFrame`` with one column per result column."""
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("Columns.to_pandas requires pandas")
+        return pandas.DataFrame(dict(self), columns=list(self))
+
+
 class IterRows(BasicRows):
     """
     Streaming counterpart to ``Rows`` — pulls rows from the cursor on
@@ -4089,46 +5530,86 @@ class IterRows(BasicRows):
     Returned by ``Set.iterselect(...)``. Use when the result set is
     too large to fit comfortably in memory. The trade-off: cannot be
     indexed, sliced, or counted with ``len()``; iterate it once.
+
+    The rows are read ``batch_size`` at a time (``fetchmany``) from a
+    cursor of its own (``adapter.stream_cursor()``: a server-side cursor
+    on PostgreSQL, an unbuffered one on MySQL), so other queries and
+    other ``IterRows`` can run on the connection while it is read. Where
+    that cursor would hold the connection
+    (``adapter.stream_blocks_connection``) it is opened on a connection
+    of its own (``adapter.stream_connection()``), which only sees
+    committed rows. The cursor, and that connection, are closed when
+    the rows run out, by ``close()``, when the ``IterRows`` goes away,
+    and by a rollback or the closing of the connection (a commit keeps
+    it: the rows can still be read after ``db.commit()``).
     """
 
-    def __init__(self, db, sql, fields, colnames, blob_decode, cacheable):
+    def __init__(
+        self, db, sql, fields, colnames, blob_decode, cacheable, batch_size=None
+    ):
         self.db = db
         self.fields = fields
         self.colnames = colnames
         self.blob_decode = blob_decode
         self.cacheable = cacheable
-        (
-            self.fields_virtual,
-            self.fields_lazy,
-            self.tmps,
-        ) = self.db._adapter._parse_expand_colnames(fields)
+        self._parse_row = self.db._adapter._row_parser(
+            fields, colnames, blob_decode, cacheable
+        )
         self.sql = sql
         self._head = None
         self.last_item = None
         self.last_item_id = None
         self.compact = True
-        self.sql = sql
-        # get a new cursor in order to be able to iterate without undesired behavior
-        # not completely safe but better than before
-        self.cursor = self.db._adapter.cursor
-        self.db._adapter.execute(sql)
-        # give the adapter a new cursor since this one is busy
-        self.db._adapter.reset_cursor()
+        adapter = self.db._adapter
+        self.batch_size = batch_size or adapter.iterselect_batch_size
+        self._buffer = deque()
+        self.cursor = self._connection = None
+        if adapter.stream_blocks_connection:
+            self._connection = adapter.stream_connection()
+        self.cursor = adapter.stream_cursor(self._connection)
+        self.cursor.arraysize = self.batch_size
+        with adapter.using_cursor(self.cursor):
+            adapter.execute(sql)
+        adapter._streams.add(self)
+
+    def _fetch(self):
+        """The next driver row, or None past the last one."""
+        if not self._buffer:
+            if self.cursor is None:
+                return None
+            rows = self.cursor.fetchmany(self.batch_size)
+            if not rows:
+                self._release()
+                return None
+            self._buffer.extend(rows)
+        return self._buffer.popleft()
+
+    def _release(self):
+        self.db._adapter._streams.discard(self)
+        cursor, self.cursor = self.cursor, None
+        connection, self._connection = self._connection, None
+        for resource in (cursor, connection):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+
+    def __del__(self):
+        # dropped before the end of its rows: let the cursor go
+        if hasattr(self, "_connection"):
+            self._release()
+
+    def close(self):
+        """Stop reading: drop the rows not read yet and close the cursor."""
+        self._buffer.clear()
+        self._release()
 
     def __next__(self):
-        db_row = self.cursor.fetchone()
+        db_row = self._fetch()
         if db_row is None:
             raise StopIteration
-        row = self.db._adapter._parse(
-            db_row,
-            self.tmps,
-            self.fields,
-            self.colnames,
-            self.blob_decode,
-            self.cacheable,
-            self.fields_virtual,
-            self.fields_lazy,
-        )
+        row = self._parse_row(db_row)
         if self.compact:
             # The following is to translate
             # <Row {'t0': {'id': 1L, 'name': 'web2py'}}>
@@ -4177,7 +5658,7 @@ class IterRows(BasicRows):
 
         # fetch and drop the first key - 1 elements
         for i in range(n_to_drop):
-            self.cursor.fetchone()
+            self._fetch()
         row = next(self)
         if row is None:
             raise IndexError
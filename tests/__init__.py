@@ -10,9 +10,13 @@ else:
 
 # Backend-agnostic suites.
 from .ast_advanced import *
+from .ast_cache import *
 from .ast_compile import *
+from .ast_dialects import *
 from .ast_joins import *
+from .ast_optimize import *
 from .ast_params import *
+from .ast_prepared import *
 from .ast_statements import *
 from .ast_subselect import *
 from .ast_translate import *
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""Compiled-statement cache: SQL text reused across literal values.
+
+The adapter's ``StatementCache`` memoizes compiled SQL keyed by AST
+shape. These tests check that same-shape queries hit and get fresh
+params, that inlined values (LIKE patterns, inline mode) never leak
+between entries, that the LRU is bounded, and that table (re)definition
+invalidates it.
+"""
+
+from pydal import DAL, Field
+from pydal.ast_translate import set_to_select
+from pydal.compilers.cache import StatementCache, fingerprint
+from pydal.compilers.sql import ParamSQL
+
+from ._adapt import IS_NOSQL
+from ._compat import unittest
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestStatementCache(unittest.TestCase):
+    def setUp(self):
+        self.db = DAL("sqlite:memory")
+        self.db.define_table("t", Field("name"), Field("age", "integer"))
+        self.db.t.insert(name="alice", age=30)
+        self.db.t.insert(name="bob", age=25)
+        self.cache = self.db._adapter.statement_cache
+        self.compiler = self.db._adapter.compiler
+
+    def tearDown(self):
+        self.db.close()
+
+    def _compile(self, query, *fields):
+        return self.compiler.compile_select(
+            set_to_select(self.db(query), fields or (self.db.t.name,), {})
+        )
+
+    def test_fingerprint_abstracts_bindable_literals(self):
+        t = self.db.t
+        a = set_to_select(self.db(t.age > 1), (t.name,), {})
+        b = set_to_select(self.db(t.age > 2), (t.name,), {})
+        key_a, slots_a = fingerprint(a, self.compiler._bindable)
+        key_b, slots_b = fingerprint(b, self.compiler._bindable)
+        self.assertEqual(key_a, key_b)
+        self.assertEqual([s.value for s in slots_a], [1])
+        self.assertEqual([s.value for s in slots_b], [2])
+
+    def test_same_shape_hits_with_fresh_params(self):
+        t = self.db.t
+        first = self._compile(t.age > 20)
+        misses = self.cache.misses
+        second = self._compile(t.age > 26)
+        self.assertEqual(self.cache.misses, misses)
+        self.assertEqual(str(first), str(second))
+        self.assertIsInstance(second, ParamSQL)
+        self.assertEqual(first.params, (20,))
+        self.assertEqual(second.params, (26,))
+
+    def test_hit_adapts_values(self):
+        t = self.db.t
+        self._compile((t.name == "x") & (t.age == 1))
+        hits = self.cache.hits
+        sql = self._compile((t.name == "y") & (t.age == 2))
+        self.assertEqual(self.cache.hits, hits + 1)
+        self.assertEqual(sql.params, ("y", 2))
+
+    def test_select_results_on_hit(self):
+        t = self.db.t
+        self.assertEqual(
+            [r.name for r in self.db(t.age > 26).select(t.name)], ["alice"]
+        )
+        self.assertEqual(
+            [r.name for r in self.db(t.age > 20).select(t.name, orderby=t.id)],
+            ["alice", "bob"],
+        )
+        self.assertGreaterEqual(self.cache.hits, 1)
+
+    def test_inlined_literals_are_pinned(self):
+        t = self.db.t
+        self.assertEqual(self.db(t.name.like("a%")).count(), 1)
+        self.assertEqual(self.db(t.name.like("b%")).count(), 1)
+        self.assertEqual(self.db(t.name.like("z%")).count(), 0)
+        self.assertIn("'b%'", self.db(t.name.like("b%"))._count())
+
+    def test_null_and_value_do_not_collide(self):
+        t = self.db.t
+        self.assertIn("IS NULL", self._compile(t.age == None))
+        self.assertNotIn("IS NULL", self._compile(t.age == 3))
+
+    def test_inline_mode_keys_on_values(self):
+        t = self.db.t
+        self.assertEqual(
+            self.db(t.age > 3)._select(t.name),
+            'SELECT "t"."name" FROM "t" WHERE ("t"."age" > 3);',
+        )
+        self.assertEqual(
+            self.db(t.age > 4)._select(t.name),
+            'SELECT "t"."name" FROM "t" WHERE ("t"."age" > 4);',
+        )
+
+    def test_write_statements_cached(self):
+        t = self.db.t
+        t.insert(name="carol", age=40)
+        hits = self.cache.hits
+        t.insert(name="dave", age=41)
+        self.assertEqual(self.cache.hits, hits + 1)
+        self.assertEqual(self.db(t.name == "dave").update(age=50), 1)
+        self.assertEqual(self.db(t.name == "carol").update(age=51), 1)
+        self.assertEqual(self.db(t.age > 45).count(), 2)
+        self.assertEqual(self.db(t.name == "dave").delete(), 1)
+        self.assertEqual(self.db(t.name == "carol").delete(), 1)
+        self.assertEqual(self.db(t.id > 0).count(), 2)
+
+    def test_define_table_invalidates(self):
+        self._compile(self.db.t.age > 1)
+        self.assertTrue(len(self.cache))
+        self.db.define_table("t", Field("name", rname="nm"), redefine=True,
+                             migrate=False)
+        self.assertEqual(len(self.cache), 0)
+        self.assertIn("nm", self._compile(self.db.t.name == "x"))
+
+    def test_lru_bound(self):
+        cache = StatementCache(maxsize=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, [], "SQL %s;" % key, ())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("a", []))
+        self.assertEqual(cache.get("c", []), ("SQL c;", ()))
+        self.assertEqual(cache.info().hits, 1)
+        self.assertEqual(cache.info().misses, 1)
+
+    def test_disabled_by_adapter_args(self):
+        db = DAL("sqlite:memory", adapter_args=dict(statement_cache_size=0))
+        db.define_table("t", Field("age", "integer"))
+        self.assertIsNone(db._adapter.statement_cache)
+        db.t.insert(age=1)
+        self.assertEqual(db(db.t.age == 1).count(), 1)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
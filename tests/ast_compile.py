@@ -8,8 +8,10 @@ truth; we just verify the new pipeline reproduces it for every expression
 we care about.
 """
 
+from functools import reduce
+
 from pydal import DAL, Field
-from pydal.ast_translate import to_ast
+from pydal.ast_translate import set_to_select, to_ast
 from pydal.compilers import SQLiteCompiler
 from pydal.objects import Expression
 
@@ -145,6 +147,22 @@ class TestAstCompileMatchesCurrentPath(unittest.TestCase):
     def test_avg(self): self._check(self.db.t.age.avg())
     def test_abs(self): self._check(self.db.t.age.abs())
 
+    # ---------- window functions ----------
+
+    def test_window_aggregate(self):
+        t = self.db.t
+        self._check(t.age.sum().over(partition_by=t.name, orderby=[t.age, ~t.id]))
+
+    def test_window_frame(self):
+        self._check(self.db.t.age.avg().over(
+            orderby=self.db.t.age, frame="ROWS BETWEEN 2 PRECEDING AND CURRENT ROW"
+        ))
+
+    def test_row_number(self): self._check((~self.db.t.age).row_number())
+    def test_rank(self):       self._check(self.db.t.age.rank().over(partition_by=self.db.t.name))
+    def test_lag(self):        self._check(self.db.t.age.lag(2, 0).over(orderby=self.db.t.id))
+    def test_lead(self):       self._check(self.db.t.age.lead().over())
+
     # ---------- multi-arg functions ----------
 
     def test_cast(self):       self._check(self.db.t.age.cast("double"))
@@ -181,3 +199,54 @@ class TestAstCompileMatchesCurrentPath(unittest.TestCase):
     def test_aggregate_inside_compare(self):
         # SUM(age) > 100
         self._check(self.db.t.age.sum() > 100)
+
+
+@unittest.skipIf(IS_NOSQL, "SQLCompiler is SQL-only")
+class TestCompilerDispatch(unittest.TestCase):
+    """Per-class dispatch tables and the non-recursive and/or walk."""
+
+    def setUp(self):
+        self.db = DAL("sqlite:memory")
+        self.db.define_table("t", Field("name"), Field("age", "integer"))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_long_chains_compile_without_recursion(self):
+        t = self.db.t
+        for combine, sep in ((lambda x, y: x & y, " AND "),
+                             (lambda x, y: x | y, " OR ")):
+            query = reduce(combine, [t.age == i for i in range(5000)])
+            sql = self.db(query)._select(t.id)
+            self.assertEqual(sql.count(sep), 4999)
+            self.assertIn('("t"."age" = 0)' + sep + '("t"."age" = 1)', sql)
+
+    def test_chain_binds_params_in_order(self):
+        t = self.db.t
+        query = reduce(lambda x, y: x | y, [t.age == i for i in range(300)])
+        sql = self.db._adapter.compiler.compile_select(
+            set_to_select(self.db(query), (t.id,), {})
+        )
+        self.assertEqual(sql.params, tuple(range(300)))
+
+    def test_subclass_override_is_dispatched(self):
+        class Shouty(SQLiteCompiler):
+            def op_or(self, l, r, opts):
+                return "EITHER(%s, %s)" % (self.visit(l), self.visit(r))
+
+            def un_lower(self, x, opts):
+                return "LOWERCASE(%s)" % self.visit(x)
+
+        t = self.db.t
+        compiler = Shouty(represent=self.db._adapter.represent,
+                          parameterize=False)
+        sql = compiler.compile_expression(to_ast(
+            (t.name.lower() == "a") & ((t.age == 1) | (t.age == 2))
+        ))
+        self.assertEqual(
+            sql,
+            '((LOWERCASE("t"."name") = \'a\') AND '
+            'EITHER(("t"."age" = 1), ("t"."age" = 2)))',
+        )
+        # the base class tables are untouched
+        self.assertIs(SQLiteCompiler._binops["or"], SQLiteCompiler.op_or)
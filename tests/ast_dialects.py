@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+"""Postgres / MySQL compilers: golden SQL plus bound parameters.
+
+No server is needed: the dialect and compiler are swapped into a
+sqlite:memory DAL (as in ``cross_dialect``) and statements are either
+compiled directly or executed against a fake DB-API cursor that records
+``(sql, params)`` instead of running them.
+"""
+
+from pydal import DAL, Field
+from pydal import ast
+from pydal._globals import THREAD_LOCAL
+from pydal.ast_translate import (
+    set_to_delete,
+    set_to_select,
+    set_to_update,
+    table_to_bulk_update,
+    table_to_insert,
+    table_to_insert_many,
+    table_to_upsert,
+)
+from pydal.backends.mysql import MySQLDialect
+from pydal.backends.postgres import PostgresDialectJSON
+from pydal.compilers import compilers
+from pydal.compilers.mysql import MySQLCompiler
+from pydal.compilers.postgres import JDBCPostgresCompiler, PostgresCompiler
+from pydal.compilers.sql import ParamSQL
+
+from ._adapt import IS_NOSQL
+from ._compat import unittest
+
+
+class FakeCursor(object):
+    """DB-API cursor stand-in: records statements, returns no rows."""
+
+    description = None
+    rowcount = 0
+    lastrowid = 1
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((str(sql), params))
+
+    def executemany(self, sql, seq_of_params):
+        self.executed.append((str(sql), list(seq_of_params)))
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def _make_db(dialect_cls, compiler_cls):
+    db = DAL("sqlite:memory", migrate=False)
+    adapter = db._adapter
+    adapter.dialect = dialect_cls(adapter)
+    adapter.compiler = compiler_cls(adapter)
+    db.define_table(
+        "person",
+        Field("name"),
+        Field("age", "integer"),
+        Field("active", "boolean"),
+        Field("data", "json"),
+    )
+    return db
+
+
+class _DialectCase(unittest.TestCase):
+    dialect_cls = None
+    compiler_cls = None
+
+    def setUp(self):
+        self.db = _make_db(self.dialect_cls, self.compiler_cls)
+        self.compiler = self.db._adapter.compiler
+
+    def tearDown(self):
+        self.db.close()
+
+    def select(self, query, *fields):
+        p = self.db.person
+        return self.compiler.compile_select(
+            set_to_select(self.db(query), fields or (p.id,), {})
+        )
+
+    def assertSQL(self, sql, text, params):
+        self.assertIsInstance(sql, ParamSQL)
+        self.assertEqual(str(sql), text)
+        self.assertEqual(sql.params, params)
+
+    def run_with_fake_cursor(self, fn):
+        adapter = self.db._adapter
+        adapter.connection  # noqa: B018  (connects lazily)
+        name = adapter._cursors_uname_
+        real, fake = getattr(THREAD_LOCAL, name), FakeCursor()
+        setattr(THREAD_LOCAL, name, fake)
+        try:
+            fn()
+        finally:
+            setattr(THREAD_LOCAL, name, real)
+        return fake.executed
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestPostgresCompiler(_DialectCase):
+    dialect_cls = PostgresDialectJSON
+    compiler_cls = PostgresCompiler
+
+    def test_registered_for_postgres_adapters(self):
+        from pydal.backends.postgres import JDBCPostgres, PostgresPsycoNew
+
+        def registered(adapter_cls):
+            for cls in adapter_cls.__mro__:
+                if cls in compilers._registry_:
+                    return compilers._registry_[cls]
+
+        self.assertIs(registered(PostgresPsycoNew), PostgresCompiler)
+        self.assertIs(registered(JDBCPostgres), JDBCPostgresCompiler)
+        self.assertEqual(JDBCPostgresCompiler.placeholder_style, "qmark")
+
+    def test_select_binds_format_params(self):
+        p = self.db.person
+        self.assertSQL(
+            self.select((p.name == "bob") & (p.age > 3) & (p.active == True)),
+            'SELECT "person"."id" FROM "person" WHERE ((("person"."name" = %s) '
+            'AND ("person"."age" > %s)) AND ("person"."active" = %s));',
+            ("bob", 3, "T"),
+        )
+
+    def test_percent_doubled_when_params_bound(self):
+        p = self.db.person
+        self.assertSQL(
+            self.select(p.name.like("a%") & ((p.age % 2) == 1)),
+            'SELECT "person"."id" FROM "person" WHERE (("person"."name" '
+            "LIKE 'a%%' ESCAPE '\\') AND ((\"person\".\"age\" %% %s) = %s));",
+            (2, 1),
+        )
+        # No params: the driver won't interpolate, so no doubling.
+        self.assertSQL(
+            self.select(p.name.like("a%")),
+            'SELECT "person"."id" FROM "person" WHERE ("person"."name" '
+            "LIKE 'a%' ESCAPE '\\');",
+            (),
+        )
+
+    def test_ilike_regexp_and_cast(self):
+        p = self.db.person
+        self.assertEqual(
+            self.select(p.name.ilike("A%")),
+            'SELECT "person"."id" FROM "person" WHERE ("person"."name" '
+            "ILIKE 'A%' ESCAPE '\\');",
+        )
+        self.assertEqual(
+            self.select(p.age.like("1%")),
+            'SELECT "person"."id" FROM "person" WHERE (CAST("person"."age" '
+            "AS CHAR(512)) LIKE '1%' ESCAPE '\\');",
+        )
+        self.assertEqual(
+            self.select(p.name.regexp("^a")),
+            'SELECT "person"."id" FROM "person" WHERE ("person"."name" ~ \'^a\');',
+        )
+
+    def test_insert_returning_id(self):
+        p = self.db.person
+        self.assertSQL(
+            self.compiler.compile_insert(
+                table_to_insert(p, [(p.name, "x"), (p.age, 1)])
+            ),
+            'INSERT INTO "person"("name","age") VALUES (%s,%s) RETURNING "id";',
+            ("x", 1),
+        )
+        self.assertSQL(
+            self.compiler.compile_insert(
+                table_to_insert_many(p, [[(p.name, "x")], [(p.name, "y")]])
+            ),
+            'INSERT INTO "person"("name") VALUES (%s),(%s) RETURNING "id";',
+            ("x", "y"),
+        )
+
+    def test_upsert_on_conflict_returning_id(self):
+        p = self.db.person
+        rows = [[(p.name, "x"), (p.age, 1)]]
+        self.assertSQL(
+            self.compiler.compile_upsert(table_to_upsert(p, ["name"], rows, ["age"])),
+            'INSERT INTO "person"("name","age") VALUES (%s,%s) ON CONFLICT '
+            '("name") DO UPDATE SET "age"=excluded."age" RETURNING "id";',
+            ("x", 1),
+        )
+        self.assertSQL(
+            self.compiler.compile_upsert(table_to_upsert(p, ["name"], rows)),
+            'INSERT INTO "person"("name","age") VALUES (%s,%s) ON CONFLICT '
+            '("name") DO NOTHING RETURNING "id";',
+            ("x", 1),
+        )
+        self.assertEqual(
+            self.compiler.compile_insert(table_to_insert(p, [])),
+            'INSERT INTO "person" DEFAULT VALUES;',
+        )
+
+    def test_writes_returning_columns(self):
+        p = self.db.person
+        rows = [[(p.name, "x"), (p.age, 1)], [(p.name, "y"), (p.age, 2)]]
+        self.assertSQL(
+            self.compiler.compile_insert(
+                table_to_insert_many(p, rows, ["id", "name"])
+            ),
+            'INSERT INTO "person"("name","age") VALUES (%s,%s),(%s,%s) '
+            'RETURNING "id","name";',
+            ("x", 1, "y", 2),
+        )
+        dbset = self.db(p.age > 1)
+        self.assertSQL(
+            self.compiler.compile_update(
+                set_to_update(dbset, [(p.name, "z")], ["id", "name"])
+            ),
+            'UPDATE "person" SET "name"=%s WHERE ("person"."age" > %s) '
+            'RETURNING "id","name";',
+            ("z", 1),
+        )
+        self.assertSQL(
+            self.compiler.compile_delete(set_to_delete(dbset, ["age"])),
+            'DELETE FROM "person" WHERE ("person"."age" > %s) RETURNING "age";',
+            (1,),
+        )
+
+    def test_bulk_update_case(self):
+        p = self.db.person
+        rows = [
+            [(p.id, 1), (p.name, "x"), (p.age, 5)],
+            [(p.id, 2), (p.name, "y"), (p.age, 6)],
+        ]
+        self.assertSQL(
+            self.compiler.compile_bulk_update(table_to_bulk_update(p, p.id, rows)),
+            'UPDATE "person" SET '
+            '"name"=CASE "id" WHEN 1 THEN %s WHEN 2 THEN %s ELSE "name" END,'
+            '"age"=CASE "id" WHEN 1 THEN %s WHEN 2 THEN %s ELSE "age" END '
+            'WHERE "id" IN (1,2);',
+            ("x", "y", 5, 6),
+        )
+
+    def test_json_operators(self):
+        p = self.db.person
+        self.assertEqual(
+            self.select(p.data.json_key("a").json_key_value("b") == "c"),
+            'SELECT "person"."id" FROM "person" WHERE '
+            "(\"person\".\"data\"->'a'->>'b' = 'c');",
+        )
+        self.assertEqual(
+            self.select(p.data.json_path_value("{a,b}") == "c"),
+            'SELECT "person"."id" FROM "person" WHERE '
+            "(\"person\".\"data\"#>>'{a,b}' = 'c');",
+        )
+        self.assertEqual(
+            self.select(p.data.json_contains('{"a": 1}')),
+            'SELECT "person"."id" FROM "person" WHERE '
+            "\"person\".\"data\"::jsonb@>'{\"a\": 1}'::jsonb;",
+        )
+
+    def test_bare_booleans(self):
+        self.assertEqual(self.compiler.visit(ast.Literal(True)), "TRUE")
+        self.assertEqual(self.compiler.visit(ast.Literal(False)), "FALSE")
+
+    def test_large_in_list_binds_an_array(self):
+        p = self.db.person
+        sql = self.select(p.age.belongs(list(range(1500))))
+        self.assertSQL(
+            sql,
+            'SELECT "person"."id" FROM "person" WHERE ("person"."age" = ANY(%s));',
+            (list(range(1500)),),
+        )
+        sql = self.select(p.id.belongs(list(range(1500))))
+        self.assertSQL(
+            sql,
+            'SELECT "person"."id" FROM "person" WHERE ("person"."id" = ANY(%s));',
+            (list(range(1500)),),
+        )
+        self.db.define_table("pet", Field("owner", "reference person"))
+        sql = self.compiler.compile_select(
+            set_to_select(
+                self.db(self.db.pet.owner.belongs(list(range(1500)))),
+                (self.db.pet.id,),
+                {},
+            )
+        )
+        self.assertSQL(
+            sql,
+            'SELECT "pet"."id" FROM "pet" WHERE ("pet"."owner" = ANY(%s));',
+            (list(range(1500)),),
+        )
+        # types without a matching array element are chunked instead
+        sql = self.select(p.active.belongs([True] * 1500))
+        self.assertEqual(str(sql).count(" IN ("), 2)
+        self.assertEqual(len(sql.params), 1500)
+
+    def test_cursor_receives_sql_and_params(self):
+        p = self.db.person
+        executed = self.run_with_fake_cursor(
+            lambda: (
+                self.db(p.name == "bob").select(p.id),
+                self.db(p.name == "amy").select(p.id),
+                self.db(p.age < 10).update(name="kid"),
+            )
+        )
+        select = 'SELECT "person"."id" FROM "person" WHERE ("person"."name" = %s);'
+        self.assertEqual(
+            executed,
+            [
+                (select, ("bob",)),
+                (select, ("amy",)),
+                ('UPDATE "person" SET "name"=%s WHERE ("person"."age" < %s);',
+                 ("kid", 10)),
+            ],
+        )
+
+    def test_batch_groups_identical_statements(self):
+        p = self.db.person
+
+        def writes():
+            with self.db.batch():
+                for age in (1, 2, 3):
+                    self.db(p.age == age).update(name="n%s" % age)
+                self.db(p.age == 9).delete()
+                self.db(p.age == 4).update(name="x")
+
+        executed = self.run_with_fake_cursor(writes)
+        update = 'UPDATE "person" SET "name"=%s WHERE ("person"."age" = %s);'
+        self.assertEqual(
+            executed[0], (update, [("n1", 1), ("n2", 2), ("n3", 3)])
+        )
+        # the grouped run goes through the adapter: it is timed like the rest
+        self.assertIn(update, [str(sql) for sql, _ in self.db._timings])
+        self.assertEqual(
+            executed[-1],
+            ('UPDATE "person" SET "name"=%s WHERE ("person"."age" = %s);',
+             ("x", 4)),
+        )
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestMySQLCompiler(_DialectCase):
+    dialect_cls = MySQLDialect
+    compiler_cls = MySQLCompiler
+
+    def test_select_backticks_and_params(self):
+        p = self.db.person
+        self.assertSQL(
+            self.select((p.name == "bob") & (p.active == False)),
+            "SELECT `person`.`id` FROM `person` WHERE ((`person`.`name` = %s) "
+            "AND (`person`.`active` = %s));",
+            ("bob", "F"),
+        )
+
+    def test_bare_booleans(self):
+        self.assertEqual(self.compiler.visit(ast.Literal(True)), "1")
+        self.assertEqual(self.compiler.visit(ast.Literal(False)), "0")
+
+    def test_upsert_on_duplicate_key(self):
+        p = self.db.person
+        rows = [[(p.name, "x"), (p.age, 1)], [(p.name, "y"), (p.age, 2)]]
+        self.assertSQL(
+            self.compiler.compile_upsert(table_to_upsert(p, ["name"], rows, ["age"])),
+            "INSERT INTO `person`(`name`,`age`) VALUES (%s,%s),(%s,%s) ON DUPLICATE "
+            "KEY UPDATE `id`=LAST_INSERT_ID(`id`),`age`=VALUES(`age`);",
+            ("x", 1, "y", 2),
+        )
+        self.assertEqual(
+            str(self.compiler.compile_upsert(table_to_upsert(p, ["name"], rows[:1]))),
+            "INSERT INTO `person`(`name`,`age`) VALUES (%s,%s) ON DUPLICATE "
+            "KEY UPDATE `name`=`name`;",
+        )
+
+    def test_delete_and_empty_insert(self):
+        p = self.db.person
+        executed = self.run_with_fake_cursor(
+            lambda: self.db(p.age < 3).delete()
+        )
+        # (the SQLite adapter underneath runs its cascade pre-select first)
+        self.assertEqual(
+            executed[-1],
+            ("DELETE `person` FROM `person` WHERE (`person`.`age` < %s);", (3,)),
+        )
+        self.assertEqual(
+            self.compiler.compile_insert(table_to_insert(p, [])),
+            "INSERT INTO `person` VALUES (DEFAULT);",
+        )
+
+    def test_large_in_list_chunked(self):
+        p = self.db.person
+        sql = self.select(p.age.belongs(list(range(2001))))
+        self.assertEqual(
+            str(sql).count("(`person`.`age` IN ("), 3
+        )
+        self.assertEqual(sql.params, tuple(range(2001)))
+
+    def test_function_spellings(self):
+        p = self.db.person
+        self.assertEqual(
+            self.select(p.id > 0, p.name[1:3], p.age + 1, p.name + "!"),
+            "SELECT SUBSTRING(`person`.`name`,%s,(4 - 2)), (`person`.`age` + %s), "
+            "CONCAT(`person`.`name`,'!') FROM `person` WHERE (`person`.`id` > 0);",
+        )
+        self.assertEqual(
+            self.select(p.name.regexp("^a")),
+            "SELECT `person`.`id` FROM `person` WHERE (`person`.`name` REGEXP '^a');",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""AST optimizer: simplified statements return the same rows.
+
+``ast_optimize.optimize`` is checked on hand-built nodes, then end to
+end on a DAL opened with ``adapter_args=dict(ast_optimize=True)``.
+"""
+
+import datetime
+from functools import reduce
+
+from pydal import DAL, Field
+from pydal import ast
+from pydal.ast_optimize import optimize
+
+from ._adapt import IS_NOSQL
+from ._compat import unittest
+
+
+A = ast.FieldRef("t", "a", '"t"."a"')
+B = ast.FieldRef("t", "b", '"t"."b"')
+
+
+def eq(col, value, type_="integer"):
+    return ast.BinOp("eq", col, ast.Literal(value, type_))
+
+
+def and_(*terms):
+    return reduce(lambda x, y: ast.BinOp("and", x, y), terms)
+
+
+def or_(*terms):
+    return reduce(lambda x, y: ast.BinOp("or", x, y), terms)
+
+
+class TestOptimizeExpressions(unittest.TestCase):
+    def test_untouched_tree_is_returned_as_is(self):
+        node = and_(eq(A, 1), ast.BinOp("gt", B, ast.Literal(2, "integer")))
+        self.assertIs(optimize(node), node)
+
+    def test_duplicates_dropped(self):
+        gt = ast.BinOp("gt", B, ast.Literal(2, "integer"))
+        self.assertEqual(optimize(and_(gt, eq(A, 1), gt)), and_(gt, eq(A, 1)))
+        # equal-comparing but differently rendered values are kept apart
+        s1 = ast.BinOp("eq", B, ast.Literal(1, "string"))
+        strue = ast.BinOp("eq", B, ast.Literal(True, "string"))
+        self.assertEqual(optimize(and_(s1, strue)), and_(s1, strue))
+
+    def test_boolean_literals_folded(self):
+        true, false = ast.Literal(True), ast.Literal(False)
+        self.assertEqual(optimize(and_(eq(A, 1), true)), eq(A, 1))
+        self.assertEqual(optimize(and_(eq(A, 1), false)), false)
+        self.assertEqual(optimize(or_(eq(A, 1), true)), true)
+        self.assertEqual(optimize(or_(false, eq(A, 1))), eq(A, 1))
+        self.assertEqual(optimize(ast.UnaryOp("not", or_(false, false))), true)
+
+    def test_or_of_equalities_becomes_in_list(self):
+        node = or_(eq(A, 1), eq(B, "x", "string"), eq(A, 2),
+                   ast.InList(A, (ast.Literal(3, "integer"),
+                                  ast.Literal(1, "integer"))))
+        self.assertEqual(
+            optimize(node),
+            or_(
+                ast.InList(A, tuple(ast.Literal(v, "integer") for v in (1, 2, 3))),
+                eq(B, "x", "string"),
+            ),
+        )
+        # JSON comparisons don't render like IN lists: left alone
+        json = or_(eq(A, "x", "json"), eq(A, "y", "json"))
+        self.assertIs(optimize(json), json)
+
+    def test_long_chains_rebuilt_balanced(self):
+        terms = [ast.BinOp("gt", A, ast.Literal(i, "integer")) for i in range(5000)]
+        node = optimize(and_(*terms))
+        depth, item = 0, node
+        while isinstance(item, ast.BinOp) and item.op == "and":
+            depth, item = depth + 1, item.left
+        self.assertEqual(depth, 13)
+        self.assertEqual(node, optimize(node))
+
+    def test_select_where_that_folds_to_true_is_dropped(self):
+        node = ast.Select(
+            fields=(A,), sources=(ast.TableRef("t"),),
+            where=and_(ast.Literal(True), ast.Literal(True)),
+        )
+        self.assertIsNone(optimize(node).where)
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestOptimizeThroughAdapter(unittest.TestCase):
+    def setUp(self):
+        self.db = DAL("sqlite:memory", adapter_args=dict(ast_optimize=True))
+        self.db.define_table("owner", Field("name"))
+        self.db.define_table(
+            "t", Field("a", "integer"), Field("b"), Field("owner", "reference owner")
+        )
+        o = self.db.owner.insert(name="o")
+        for i in range(10):
+            self.db.t.insert(a=i, b=str(i), owner=o if i % 2 else None)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_huge_or_chain_executes(self):
+        t = self.db.t
+        query = reduce(lambda x, y: x | y, [t.a == i for i in range(5000)])
+        self.assertEqual(self.db(query).count(), 10)
+        self.assertIn('"t"."a" IN (', self.db(query)._select(t.id))
+
+    def test_redundant_filter_simplified(self):
+        t = self.db.t
+        query = (t.a > 3) & (t.a > 3) & ((t.b == "4") | (t.b == "5") | False)
+        self.assertEqual(
+            self.db(query)._select(t.id),
+            'SELECT "t"."id" FROM "t" WHERE (("t"."a" > 3) AND '
+            "(\"t\".\"b\" IN ('4','5')));",
+        )
+        self.assertEqual([r.a for r in self.db(query).select(t.a)], [4, 5])
+
+    def test_unused_left_join_on_unique_key_pruned(self):
+        db, t = self.db, self.db.t
+        left = db.owner.on(db.owner.id == t.owner)
+        self.assertNotIn("JOIN", db(t.a > 7)._select(t.id, left=left))
+        self.assertIn("LEFT JOIN", db(t.a > 7)._select(t.id, db.owner.name, left=left))
+        self.assertIn(
+            "LEFT JOIN",
+            db(t.a > 7)._select(t.id, left=left, orderby=db.owner.name),
+        )
+        # a non-unique ON may multiply rows: kept
+        self.assertIn(
+            "LEFT JOIN",
+            db(t.a > 7)._select(t.id, left=db.owner.on(db.owner.name == t.b)),
+        )
+        self.assertEqual(len(db(t.a > 7).select(t.id, left=left)), 2)
+
+    def test_off_by_default(self):
+        db = DAL("sqlite:memory")
+        db.define_table("t", Field("a", "integer"))
+        try:
+            self.assertEqual(
+                db((db.t.a == 1) | (db.t.a == 2))._select(db.t.id),
+                'SELECT "t"."id" FROM "t" WHERE (("t"."a" = 1) OR ("t"."a" = 2));',
+            )
+        finally:
+            db.close()
+
+
+class TestSargableRewrites(unittest.TestCase):
+    def _year(self, op, value, unit="year"):
+        extract = ast.FuncCall("extract", (A,), opts=(("unit", unit),))
+        return ast.BinOp(op, extract, ast.Literal(value, "integer"))
+
+    def _optimize(self, node, ctype="date"):
+        return optimize(node, column_type=lambda table, name: ctype)
+
+    def test_year_comparisons_become_ranges(self):
+        y24, y25 = (ast.Literal(datetime.date(y, 1, 1), "date") for y in (2024, 2025))
+        self.assertEqual(
+            self._optimize(self._year("eq", 2024)),
+            and_(ast.BinOp("gte", A, y24), ast.BinOp("lt", A, y25)),
+        )
+        self.assertEqual(self._optimize(self._year("lte", 2024)), ast.BinOp("lt", A, y25))
+        self.assertEqual(self._optimize(self._year("gt", 2024)), ast.BinOp("gte", A, y25))
+        # a lone month() is not a range; nor is anything on a non-date column
+        month = self._year("eq", 3, "month")
+        self.assertIs(self._optimize(month), month)
+        year = self._year("eq", 2024)
+        self.assertIs(self._optimize(year, "integer"), year)
+        self.assertIs(optimize(year), year)
+
+    def test_year_month_day_conjunction(self):
+        node = and_(self._year("eq", 2024), ast.BinOp("gt", B, ast.Literal(1, "integer")),
+                    self._year("eq", 12, "month"))
+        self.assertEqual(
+            self._optimize(node, "datetime"),
+            and_(
+                ast.BinOp("gte", A, ast.Literal(datetime.datetime(2024, 12, 1), "datetime")),
+                ast.BinOp("lt", A, ast.Literal(datetime.datetime(2025, 1, 1), "datetime")),
+                ast.BinOp("gt", B, ast.Literal(1, "integer")),
+            ),
+        )
+        day = and_(self._year("eq", 2024), self._year("eq", 2, "month"),
+                   self._year("eq", 29, "day"))
+        self.assertEqual(
+            self._optimize(day),
+            and_(ast.BinOp("gte", A, ast.Literal(datetime.date(2024, 2, 29), "date")),
+                 ast.BinOp("lt", A, ast.Literal(datetime.date(2024, 3, 1), "date"))),
+        )
+
+    def test_lower_equality_uses_collation(self):
+        lower = ast.BinOp("eq", ast.UnaryOp("lower", B), ast.Literal("ab", "string"))
+        self.assertIs(optimize(lower), lower)
+        self.assertEqual(
+            optimize(lower, nocase="NOCASE"),
+            ast.BinOp("eq", B, ast.Literal("ab", "string"), opts=(("collate", "NOCASE"),)),
+        )
+        # 'Ab' can never equal lower(b); non-ASCII folding differs: both kept
+        for value in ("Ab", "\xe9t\xe9"):
+            node = ast.BinOp("eq", ast.UnaryOp("lower", B), ast.Literal(value, "string"))
+            self.assertIs(optimize(node, nocase="NOCASE"), node)
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestSargableThroughAdapter(unittest.TestCase):
+    def test_same_rows_without_extract(self):
+        dbs = [DAL("sqlite:memory", adapter_args=dict(ast_optimize=flag))
+               for flag in (False, True)]
+        try:
+            for db in dbs:
+                db.define_table("t", Field("d", "date"), Field("dt", "datetime"),
+                                Field("name"))
+                for y in (2023, 2024, 2025):
+                    for m in (1, 2, 12):
+                        db.t.insert(d=datetime.date(y, m, 28), name="Ab%d" % m,
+                                    dt=datetime.datetime(y, m, 28, 23, 59))
+            queries = [
+                lambda t: t.d.year() == 2024,
+                lambda t: t.dt.year() >= 2024,
+                lambda t: t.dt.year() < 2025,
+                lambda t: (t.dt.year() == 2024) & (t.dt.month() == 12),
+                lambda t: (t.d.year() == 2024) & (t.d.month() == 2) & (t.d.day() == 28),
+                lambda t: t.name.lower() == "ab12",
+            ]
+            for query in queries:
+                plain, optimized = (
+                    [r.id for r in db(query(db.t)).select(db.t.id, orderby=db.t.id)]
+                    for db in dbs
+                )
+                self.assertEqual(plain, optimized)
+                sql = dbs[1](query(dbs[1].t))._select(dbs[1].t.id)
+                self.assertNotIn("web2py_extract", sql)
+                self.assertNotIn("LOWER", sql)
+        finally:
+            for db in dbs:
+                db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -238,6 +238,49 @@ class TestAstParamExecution(unittest.TestCase):
         rows = self.db(self.db.t.age.belongs([25, 30])).select(orderby=self.db.t.age)
         self.assertEqual([r.name for r in rows], ["bob", "alice"])
 
+    def test_large_belongs_binds_one_json_array(self):
+        t = self.db.t
+        ages = list(range(0, 100000, 2))  # more values than SQLite has variables
+        sql = self.db._adapter.compiler.compile_select(
+            set_to_select(self.db(t.age.belongs(ages)), (t.id,), {})
+        )
+        self.assertEqual(
+            str(sql),
+            'SELECT "t"."id" FROM "t" WHERE ("t"."age" IN '
+            "(SELECT value FROM json_each(?)));",
+        )
+        self.assertEqual(len(sql.params), 1)
+        rows = self.db(t.age.belongs(ages)).select(orderby=t.age)
+        self.assertEqual([r.name for r in rows], ["alice", "carol"])
+        names = ["x%d" % i for i in range(2000)] + ["bob"]
+        self.assertEqual(self.db(~t.name.belongs(names)).count(), 2)
+
+    def test_large_belongs_on_id_and_reference_binds_one_json_array(self):
+        t = self.db.t
+        self.db.define_table("pet", Field("owner", "reference t"))
+        self.db.pet.insert(owner=2)
+        ids = list(range(2, 10000, 2))
+        for query in (t.id.belongs(ids), self.db.pet.owner.belongs(ids)):
+            sql = self.db._adapter.compiler.compile_select(
+                set_to_select(self.db(query), (t.id,), {})
+            )
+            self.assertIn("IN (SELECT value FROM json_each(?))", str(sql))
+            self.assertEqual(len(sql.params), 1)
+        rows = self.db(t.id.belongs(ids)).select()
+        self.assertEqual([r.name for r in rows], ["bob"])
+        self.assertEqual(self.db(self.db.pet.owner.belongs(ids)).count(), 1)
+        # non-int ids keep the chunked inline lists
+        sql = self.db(t.id.belongs([str(i) for i in ids]))._select(t.id)
+        self.assertEqual(sql.count(" IN ("), 5)
+
+    def test_large_belongs_inline_is_chunked(self):
+        t = self.db.t
+        self.db._adapter.compiler.parameterize = False
+        sql = self.db(t.age.belongs(list(range(2500))))._select(t.id)
+        self.assertEqual(sql.count(" IN ("), 3)
+        self.assertEqual(sql.count(" OR "), 2)
+        self.assertEqual(self.db(t.age.belongs(list(range(2500)))).count(), 3)
+
     def test_insert_via_parameterized_path(self):
         # Insert goes through the AST pipeline too — verify the new row
         # round-trips.
@@ -246,6 +289,49 @@ class TestAstParamExecution(unittest.TestCase):
         row = self.db(self.db.t.id == int(rid)).select().first()
         self.assertEqual((row.name, row.age), ("dave", 17))
 
+    def test_bulk_insert_batches_multi_row_inserts(self):
+        adapter, executed = self.db._adapter, []
+        execute = adapter.execute
+
+        def counting(*args, **kwargs):
+            executed.append(str(args[0]))
+            return execute(*args, **kwargs)
+
+        adapter.execute = counting
+        try:
+            ids = self.db.t.bulk_insert(
+                [dict(name="n%d" % i, age=i) for i in range(5)], batch_size=2
+            )
+        finally:
+            del adapter.execute
+        self.assertEqual([int(i) for i in ids], [4, 5, 6, 7, 8])
+        self.assertEqual(len(executed), 3)
+        self.assertEqual(executed[0].count("(?,?)"), 2)
+        self.assertEqual([self.db.t[i].age for i in ids], list(range(5)))
+
+    def test_bulk_insert_mixed_columns_and_explicit_ids(self):
+        t = self.db.t
+        ids = t.bulk_insert(
+            [dict(name="a"), dict(name="b", age=1), dict(id=100, name="c"), dict()]
+        )
+        self.assertEqual([int(i) for i in ids], [4, 5, 100, 101])
+        self.assertEqual([t[i].name for i in ids], ["a", "b", "c", None])
+
+    def test_bulk_inserted_ids_follow_the_increment(self):
+        # auto_increment_increment > 1 (MySQL multi-master): ids of one
+        # multi-row INSERT are spaced by the step, from the first or last
+        t, adapter = self.db.t, self.db._adapter
+        rows = [[(t.name, "x")]] * 3
+        adapter.lastrowid = lambda table: 17
+        adapter.bulk_insert_id_step = 5
+        try:
+            self.assertEqual(adapter._bulk_inserted_ids(t, rows), [7, 12, 17])
+            adapter.bulk_insert_ids = "first"
+            self.assertEqual(adapter._bulk_inserted_ids(t, rows), [17, 22, 27])
+        finally:
+            del adapter.lastrowid, adapter.bulk_insert_id_step
+            del adapter.bulk_insert_ids
+
 
 @unittest.skipIf(IS_NOSQL, "SQL-only")
 class TestAstParamTypedFilters(unittest.TestCase):
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""Prepared selects: ``db.Param`` placeholders + ``Set.prepare_select``.
+
+A prepared select is translated and compiled once; each call only binds
+the supplied values, executes and parses. These tests cover the
+``ast.Param`` translation, the compiled template, value binding and
+the error paths.
+"""
+
+from pydal import DAL, Field
+from pydal import ast
+from pydal.ast_translate import to_ast
+from pydal.objects import PreparedSelect
+
+from ._adapt import IS_NOSQL
+from ._compat import unittest
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestPreparedSelect(unittest.TestCase):
+    def setUp(self):
+        self.db = DAL("sqlite:memory")
+        self.db.define_table(
+            "person",
+            Field("email"),
+            Field("name"),
+            Field("age", "integer"),
+            Field("active", "boolean"),
+        )
+        for i, name in enumerate(["alice", "bob", "carol"]):
+            self.db.person.insert(
+                email="%s@example.com" % name, name=name, age=20 + i,
+                active=name != "bob",
+            )
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_translates_to_param_node(self):
+        node = to_ast(self.db.person.email == self.db.Param("email"))
+        self.assertEqual(node.right, ast.Param("email", "string"))
+
+    def test_explicit_type_wins(self):
+        node = to_ast(self.db.person.name == self.db.Param("n", "integer"))
+        self.assertEqual(node.right, ast.Param("n", "integer"))
+
+    def test_prepare_and_call(self):
+        person = self.db.person
+        q = self.db(person.email == self.db.Param("email")).prepare_select(
+            person.id, person.name
+        )
+        self.assertIsInstance(q, PreparedSelect)
+        self.assertEqual(q.names, frozenset(["email"]))
+        self.assertEqual(q.colnames, ["person.id", "person.name"])
+        rows = q(email="bob@example.com")
+        self.assertEqual([r.name for r in rows], ["bob"])
+        rows = q(email="carol@example.com")
+        self.assertEqual([r.name for r in rows], ["carol"])
+        self.assertEqual(len(q(email="nobody")), 0)
+
+    def test_params_mixed_with_literals(self):
+        person = self.db.person
+        q = self.db(
+            (person.age >= self.db.Param("lo")) & (person.age < 22)
+            & (person.active == self.db.Param("active"))
+        ).prepare_select(person.name, orderby=person.age)
+        self.assertEqual([r.name for r in q(lo=20, active=True)], ["alice"])
+        self.assertEqual([r.name for r in q(lo=20, active=False)], ["bob"])
+
+    def test_bind_adapts_values(self):
+        person = self.db.person
+        q = self.db(person.active == self.db.Param("a")).prepare_select()
+        self.assertEqual(q.bind(a=True).params, ("T",))
+        self.assertEqual(q.bind(a=False).params, ("F",))
+
+    def test_rows_keep_record_operators(self):
+        person = self.db.person
+        q = self.db(person.id == self.db.Param("id")).prepare_select()
+        row = q(id=1).first()
+        row.update_record(name="alicia")
+        self.assertEqual(person[1].name, "alicia")
+
+    def test_limitby_and_orderby(self):
+        person = self.db.person
+        q = self.db(person.age > self.db.Param("age")).prepare_select(
+            person.name, orderby=~person.age, limitby=(0, 1)
+        )
+        self.assertEqual([r.name for r in q(age=0)], ["carol"])
+
+    def test_missing_and_unexpected_values(self):
+        q = self.db(self.db.person.email == self.db.Param("email")).prepare_select()
+        with self.assertRaises(TypeError):
+            q()
+        with self.assertRaises(TypeError):
+            q(email="x", other=1)
+
+    def test_param_outside_prepare_raises(self):
+        s = self.db(self.db.person.email == self.db.Param("email"))
+        with self.assertRaises(RuntimeError):
+            s.select()
+
+    def test_inline_compiler_rejects_prepare(self):
+        compiler = self.db._adapter.compiler
+        compiler.parameterize = False
+        try:
+            with self.assertRaises(NotImplementedError):
+                self.db(self.db.person.email == self.db.Param("e")).prepare_select()
+        finally:
+            compiler.parameterize = True
+
+
+if __name__ == "__main__":
+    unittest.main()
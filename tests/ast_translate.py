@@ -4,7 +4,7 @@ import pickle
 
 from pydal import DAL, Field
 from pydal import ast
-from pydal.ast_translate import to_ast
+from pydal.ast_translate import plan_select, to_ast
 from pydal.objects import Expression
 
 from ._adapt import IS_NOSQL
@@ -255,3 +255,45 @@ class TestAstTranslateSubqueries(unittest.TestCase):
             self.assertIsInstance(n.values[0], ast.Select)
         finally:
             db.close()
+
+
+@unittest.skipIf(IS_NOSQL, "AST translator targets the SQL DSL surface")
+class TestSelectPlan(unittest.TestCase):
+    """plan_select must agree with the legacy colname/parse bookkeeping."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DAL("sqlite:memory")
+        cls.db.define_table("a", Field("name"), Field("n", "integer"))
+        cls.db.define_table("b", Field("a_id", "reference a"), Field("name"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+
+    def _check(self, query, fields, attrs):
+        adapter = self.db._adapter
+        plan = plan_select(self.db(query), fields, attrs)
+        expanded = adapter.expand_select(query, fields, attrs)
+        colnames, _ = adapter._select_wcols(query, expanded, **attrs)
+        self.assertEqual(plan.colnames, colnames)
+        self.assertEqual(len(plan.parse_plan[2]), len(colnames))
+        self.assertIsInstance(plan.node, ast.Select)
+        return plan
+
+    def test_all_fields(self):
+        plan = self._check(self.db.a.n > 0, (), {})
+        self.assertEqual(plan.colnames, ["a.id", "a.name", "a.n"])
+        self.assertEqual(sorted(plan.tablemap), ["a"])
+
+    def test_expressions_and_aliases(self):
+        a = self.db.a
+        self._check(a.n > 0, (a.name, a.n.sum(), a.name.upper().with_alias("u")),
+                    dict(groupby=a.name))
+
+    def test_join(self):
+        a, b = self.db.a, self.db.b
+        plan = self._check(
+            a.n > 0, (a.name, b.name), dict(join=b.on(b.a_id == a.id))
+        )
+        self.assertEqual(sorted(plan.tablemap), ["a", "b"])
@@ -63,6 +63,25 @@ class TestCache(DALtest):
         r4 = db().select(db.tt.ALL, cache=(cache, 1000), cacheable=True)
         self.assertEqual(len(r0), len(r4))
 
+    def testBoundValuesInKey(self):
+        cache = SimpleCache()
+        cache.clear()
+        db = self.connect()
+        db.define_table("tt", Field("aa"))
+        db.tt.insert(aa="1")
+        db.tt.insert(aa="2")
+        for cacheable in (False, True):
+            for value in ("1", "2", "1"):
+                rows = db(db.tt.aa == value).select(
+                    db.tt.aa, cache=(cache, 1000), cacheable=cacheable
+                )
+                self.assertEqual([r.aa for r in rows], [value])
+            for ids in ([1, 2], [2], [1, 2]):
+                rows = db(db.tt.aa.belongs([str(i) for i in ids])).select(
+                    db.tt.aa, orderby=db.tt.aa, cache=(cache, 1000), cacheable=cacheable
+                )
+                self.assertEqual([r.aa for r in rows], [str(i) for i in ids])
+
     @unittest.skipIf(IS_MSSQL, "Class nesting in ODBC driver breaks pickle")
     def testPickling(self):
         db = self.connect()
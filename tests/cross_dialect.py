@@ -12,8 +12,9 @@ These tests don't require any real backend driver — they exercise
 the dialect-swap claim from layer 1: build a query once, render it
 against any dialect.
 
-Implementation note: the AST compiler is currently registered only
-for SQLite. For other dialects we **disable the AST path**
+Implementation note: swapping the dialect leaves the SQLite adapter's
+own compiler in place (the Postgres/MySQL compilers have their own
+suite in ``ast_dialects``). Here we **disable the AST path**
 (``adapter.compiler = None``) so the SQL flows through the legacy
 ``DialectOp`` dispatch — which is exactly what guarantees per-dialect
 overrides (Postgres ``~`` for regexp, MSSQL ``[brackets]`` for
@@ -198,6 +199,78 @@ class TestCrossDialectSQLGeneration(unittest.TestCase):
                     self._close(db)
 
 
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestCrossDialectUpsert(unittest.TestCase):
+    """Upserts render as ON CONFLICT, ON DUPLICATE KEY or MERGE."""
+
+    EXPECTATIONS = {
+        "sqlite": 'INSERT INTO "person"("name","age") VALUES (\'a\',1) '
+        'ON CONFLICT ("name") DO UPDATE SET "age"=excluded."age" RETURNING "id";',
+        "mysql": "INSERT INTO `person`(`name`,`age`) VALUES ('a',1) "
+        "ON DUPLICATE KEY UPDATE `id`=LAST_INSERT_ID(`id`),`age`=VALUES(`age`);",
+        "mssql": 'MERGE INTO "person" WITH (HOLDLOCK) AS tgt USING '
+        "(VALUES ('a',1)) AS src (\"name\",\"age\") ON "
+        'tgt."name"=src."name" WHEN MATCHED THEN UPDATE SET "age"=src."age" '
+        'WHEN NOT MATCHED THEN INSERT ("name","age") VALUES '
+        '(src."name",src."age");',
+        "oracle": 'MERGE INTO "person" tgt USING (SELECT \'a\' "name",1 "age" '
+        'FROM DUAL) src ON (tgt."name"=src."name") WHEN MATCHED THEN UPDATE '
+        'SET tgt."age"=src."age" WHEN NOT MATCHED THEN INSERT ("name","age") '
+        'VALUES (src."name",src."age");',
+    }
+
+    def test_upsert_per_dialect(self):
+        dmap = dict(_all_sql_dialects())
+        for label, expected in self.EXPECTATIONS.items():
+            with self.subTest(dialect=label):
+                db = _make_db_with_dialect(dmap[label])
+                try:
+                    p = db.person
+                    # the id column is only rendered for adapters that
+                    # read it back
+                    db._adapter.upsert_ids = "returning"
+                    sql = db._adapter._upsert(
+                        p, [p.name], [[(p.name, "a"), (p.age, 1)]], [p.age]
+                    )
+                    self.assertEqual(sql, expected)
+                finally:
+                    db.close()
+
+
+@unittest.skipIf(IS_NOSQL, "SQL-only")
+class TestCrossDialectReturning(unittest.TestCase):
+    """Writes read rows back through RETURNING, or OUTPUT on MSSQL."""
+
+    EXPECTATIONS = {
+        "postgres": (
+            'UPDATE "person" SET "name"=\'b\' WHERE ("person"."id" = 1) '
+            'RETURNING "id","age";',
+            'DELETE FROM "person" WHERE ("person"."id" = 1) RETURNING "id","age";',
+        ),
+        "mssql": (
+            'UPDATE "person" SET "name"=\'b\' OUTPUT inserted."id",'
+            'inserted."age" FROM "person" WHERE ("person"."id" = 1);',
+            'DELETE "person" OUTPUT deleted."id",deleted."age" FROM "person" '
+            'WHERE ("person"."id" = 1);',
+        ),
+    }
+
+    def test_returning_per_dialect(self):
+        dmap = dict(_all_sql_dialects())
+        for label, (update, delete) in self.EXPECTATIONS.items():
+            with self.subTest(dialect=label):
+                db = _make_db_with_dialect(dmap[label])
+                try:
+                    p = db.person
+                    returning = [p.id, "age"]
+                    self.assertEqual(
+                        db(p.id == 1)._update(name="b", _returning=returning), update
+                    )
+                    self.assertEqual(db(p.id == 1)._delete(_returning=returning), delete)
+                finally:
+                    db.close()
+
+
 @unittest.skipIf(IS_NOSQL, "SQL-only")
 class TestCrossDialectQuoting(unittest.TestCase):
     """
@@ -3,19 +3,24 @@
 Basic unit tests
 """
 
+import array
+import copy
 import datetime
 import glob
 import json
 import os
 import pickle
+import tracemalloc
 import zoneinfo
 from unittest import skipIf
 
 from pydal import DAL, Field
 from io import BytesIO, StringIO
 from pydal.utils import to_bytes
+from pydal.helpers import serializers as serializers_module
 from pydal.helpers.classes import SQLALL, OpRow
-from pydal.objects import Expression, Row, Table
+from pydal.helpers.serializers import Serializers
+from pydal.objects import Expression, Row, SlotRow, Table
 
 from ._adapt import (
     DEFAULT_URI,
@@ -1702,6 +1707,130 @@ class TestMinMaxSumAvg(DALtest):
         self.assertEqual(db().select(s).first()[s], 2)
 
 
+class TestWindowFunctions(DALtest):
+    def testRun(self):
+        db = self.connect()
+        s = db.define_table(
+            "sale", Field("shop"), Field("dayno", "integer"), Field("amount", "integer")
+        )
+        for shop, amounts in (("a", [5, 1, 3]), ("b", [2, 2])):
+            for day, amount in enumerate(amounts):
+                s.insert(shop=shop, dayno=day, amount=amount)
+        total = s.amount.sum().over(partition_by=s.shop, orderby=s.dayno)
+        latest = (~s.dayno).row_number().over(partition_by=s.shop)
+        rank = (~s.amount).rank()
+        previous = s.amount.lag(1, 0).over(partition_by=s.shop, orderby=s.dayno)
+        rows = db(s).select(
+            s.shop, total, latest, rank, previous, orderby=s.shop | s.dayno
+        )
+        self.assertEqual(
+            [(r.sale.shop, r[total], r[latest], r[rank], r[previous]) for r in rows],
+            [("a", 5, 3, 1, 0), ("a", 6, 2, 5, 5), ("a", 9, 1, 2, 1),
+             ("b", 2, 2, 3, 0), ("b", 4, 1, 3, 2)],
+        )
+        moving = s.amount.max().over(
+            orderby=s.id, frame="ROWS BETWEEN 1 PRECEDING AND CURRENT ROW"
+        )
+        self.assertEqual(
+            [r[moving] for r in db(s).select(moving, orderby=s.id)], [5, 5, 3, 3, 2]
+        )
+
+
+class TestKeysetPagination(DALtest):
+    def testRun(self):
+        db = self.connect()
+        t = db.define_table("tt", Field("aa", "integer"), Field("dd", "datetime"))
+        start = datetime.datetime(2024, 1, 1)
+        for i in range(23):
+            t.insert(aa=i % 3, dd=start + datetime.timedelta(hours=i // 4))
+        orderby = ~t.dd | t.aa
+        expected = [r.id for r in db(t).select(orderby=~t.dd | t.aa | t.id)]
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = db(t).paginate(5, orderby=orderby, cursor=cursor)
+            seen.extend(r.id for r in rows)
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 5)
+        row = db(t.id == expected[7]).select().first()
+        self.assertEqual(
+            [r.id for r in db(t).select(orderby=orderby, after=row)], expected[8:]
+        )
+        values = (row.dd, row.aa, row.id)
+        self.assertEqual(
+            [r.id for r in db(t).select(t.id, orderby=orderby, after=values)],
+            expected[8:],
+        )
+        # plain id order by default
+        rows, cursor = db(t.aa == 0).paginate(3)
+        self.assertEqual([r.id for r in rows], [1, 4, 7])
+        with self.assertRaises(SyntaxError):
+            db(t).select(orderby=orderby, after=(row.dd,))
+        with self.assertRaises(SyntaxError):
+            db(t).paginate(5, limitby=(0, 5))
+        with self.assertRaises(ValueError):
+            db(t).paginate(5, orderby=t.aa, cursor=cursor)
+        # fields that leave out the keys get them added
+        seen, cursor = [], None
+        while True:
+            rows, cursor = db(t).paginate(5, t.dd, orderby=orderby, cursor=cursor)
+            seen.extend(r.id for r in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        row = db(t).select(t.dd, orderby=orderby, after=None).first()
+        self.assertEqual(
+            [r.id for r in db(t).select(t.dd, orderby=orderby, after=row)],
+            expected[1:],
+        )
+        with self.assertRaises(SyntaxError):
+            db(t).select(orderby=orderby, after=db(t).select(t.dd).first())
+
+    def testNulls(self):
+        db = self.connect()
+        t = db.define_table("tt", Field("aa", "integer"), Field("bb"))
+        for i in range(13):
+            t.insert(aa=None if i % 4 == 0 else i % 3, bb=None if i % 5 else "b%s" % (i % 2))
+        for orderby, tail in (
+            (t.aa, t.id), (~t.aa, ~t.id), (t.bb | ~t.aa, ~t.id), (~t.bb | t.aa, t.id),
+        ):
+            expected = [r.id for r in db(t).select(orderby=orderby | tail)]
+            seen, cursor = [], None
+            while True:
+                rows, cursor = db(t).paginate(2, orderby=orderby, cursor=cursor)
+                seen.extend(r.id for r in rows)
+                if cursor is None:
+                    break
+            self.assertEqual(seen, expected)
+            for k in range(len(expected)):
+                row = db(t.id == expected[k]).select().first()
+                self.assertEqual(
+                    [r.id for r in db(t).select(orderby=orderby, after=row)],
+                    expected[k + 1:],
+                )
+
+    def testCustomTypeKey(self):
+        from pydal.helpers.classes import SQLCustomType
+
+        db = self.connect()
+        native = "integer"
+        if hasattr(db._adapter, "types"):
+            native = db._adapter.types["integer"]
+        t = db.define_table("tt", Field("dd", SQLCustomType("integer", native)))
+        for i in range(7):
+            t.insert(dd=i // 2)
+        expected = [r.id for r in db(t).select(orderby=t.dd | t.id)]
+        seen, cursor = [], None
+        while True:
+            rows, cursor = db(t).paginate(3, orderby=t.dd, cursor=cursor)
+            seen.extend(r.id for r in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+
 class TestMigrations(unittest.TestCase):
     def testRun(self):
         db = DAL(DEFAULT_URI, check_reserved=["all"])
@@ -1931,6 +2060,58 @@ class TestReference(DALtest):
             self.tearDown()
 
 
+class TestRowsIndex(DALtest):
+    def testIndexBy(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        for n in range(4):
+            t0.insert(name="x%s" % n, n=n % 2)
+        rows = db(t0).select(orderby=t0.id)
+        index = rows.index_by(t0.name)
+        self.assertEqual(index["x2"].n, 0)
+        self.assertIs(rows.index_by("name"), rows.index_by("name"))
+        self.assertIs(rows.index_by(t0.name), index)
+        groups = rows.index_by(t0.n, unique=False)
+        self.assertEqual([r.name for r in groups[1]], ["x1", "x3"])
+        self.assertRaises(ValueError, rows.index_by, t0.n)
+        rows.append(Row(t0=Row(id=9, name="x9", n=5)))
+        self.assertEqual(rows.index_by(t0.name)["x9"].n, 5)
+        rows.exclude(lambda r: r.n == 5)
+        self.assertNotIn("x9", rows.index_by(t0.name))
+        # any change to the records list drops the index
+        rows.records[0] = Row(t0=Row(id=8, name="x8", n=1))
+        self.assertNotIn("x0", rows.index_by(t0.name))
+        self.assertEqual(rows.index_by(t0.name)["x8"].id, 8)
+        rows.records.pop()
+        self.assertNotIn("x3", rows.index_by(t0.name))
+        rows.records = [rows.records[0]]
+        self.assertEqual(list(rows.index_by(t0.name)), ["x8"])
+        rows = db(t0).select(t0.name, (t0.id * 10).with_alias("k"), orderby=t0.id)
+        self.assertEqual(rows.index_by("k")[20].t0.name, "x1")
+
+    def testSetOperations(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("payload", "json"))
+        for name in ("a", "b", "b", "c"):
+            t0.insert(name=name)
+        fields = [t0.name]
+        rows = db(t0).select(*fields, orderby=t0.id)
+        other = db(t0.name != "c").select(*fields, orderby=t0.id)
+        self.assertEqual([r.name for r in rows & other], ["a", "b", "b"])
+        self.assertEqual([r.name for r in other & rows.find(lambda r: r.name != "a")],
+                         ["b", "b"])
+        self.assertEqual([r.name for r in other | rows], ["a", "b", "b", "c"])
+        removed = rows.exclude(lambda r: r.name == "b")
+        self.assertEqual([r.name for r in rows], ["a", "c"])
+        self.assertEqual([r.name for r in removed], ["b", "b"])
+        # dict and list values are compared by content
+        db(t0.name == "a").update(payload={"k": [1, 2]})
+        rows = db(t0).select(t0.name, t0.payload, orderby=t0.id)
+        other = db(t0.name == "a").select(t0.name, t0.payload)
+        self.assertEqual(len(rows & other), 1)
+        self.assertEqual(len(rows | other), 4)
+
+
 class TestClientLevelOps(DALtest):
     def testRun(self):
         db = self.connect()
@@ -2220,6 +2401,108 @@ class TestImportExportUuidFields(DALtest):
         )
 
 
+class TestImportBatches(DALtest):
+    def testRestore(self):
+        db = self.connect()
+        db.define_table(
+            "person", Field("name"), Field("parent_id", "reference person"),
+            Field("friends", "list:reference person"),
+        )
+        db.define_table("pet", Field("friend", db.person), Field("name"))
+        for k in range(10):
+            id = db.person.insert(
+                name=str(k), parent_id=k // 2 or None, friends=list(range(1, k))
+            )
+            db.pet.insert(friend=id, name=str(k))
+        db(db.pet.id.belongs((3, 4, 8))).delete()
+        db.commit()
+        stream = StringIO()
+        db.export_to_csv_file(stream)
+        before = [db(t).select(orderby=t.id).as_list() for t in (db.person, db.pet)]
+        db(db.pet).delete()
+        db(db.person).delete()
+        # some ids already taken: the csv ids get shifted
+        db.person.insert(name="x")
+        calls = []
+        bulk_insert = db._adapter.bulk_insert
+        db._adapter.bulk_insert = lambda table, items, *a: (
+            calls.append(len(items)) or bulk_insert(table, items, *a)
+        )
+        try:
+            db.import_from_csv_file(
+                StringIO(stream.getvalue()), batch_size=4, threaded=True
+            )
+        finally:
+            del db._adapter.bulk_insert
+        # the first row of a stretch of consecutive ids goes alone, the
+        # others together
+        self.assertEqual(max(calls), 3)
+        offset = db(db.person.name == "0").select().first().id - 1
+        shift = lambda v: v + offset if v else v
+        people = db(db.person.name != "x").select(
+            db.person.id, db.person.name, db.person.parent_id, orderby=db.person.id
+        )
+        self.assertEqual(
+            [(r.id, r.name, r.parent_id) for r in people],
+            [
+                (shift(row["id"]), row["name"], shift(row["parent_id"]))
+                for row in before[0]
+            ],
+        )
+        pets = db(db.pet).select(orderby=db.pet.id).as_list()
+        self.assertEqual([row["name"] for row in pets], [row["name"] for row in before[1]])
+        self.assertEqual(
+            [row["friend"] for row in pets], [shift(row["friend"]) for row in before[1]]
+        )
+
+    def testUnique(self):
+        db = self.connect()
+        t0 = db.define_table(
+            "t0", Field("name"), Field("code"), Field("parent_id", "reference t0")
+        )
+        t0.insert(name="old", code="b")
+        stream = StringIO(
+            "t0.id,t0.name,t0.code,t0.parent_id\r\n"
+            "1,a,a,<NULL>\r\n"
+            "2,b,b,1\r\n"
+            "3,c,c,2\r\n"
+            "4,a2,a,3\r\n"
+            "5,d,d,4\r\n"
+        )
+        id_map = {}
+        t0.import_from_csv_file(stream, id_map=id_map, unique="code", batch_size=10)
+        rows = db(t0).select(orderby=t0.id)
+        self.assertEqual([(r.name, r.code) for r in rows], [("b", "b"), ("a2", "a"),
+                                                            ("c", "c"), ("d", "d")])
+        ids = id_map["t0"]
+        self.assertEqual(ids[1], ids[4])
+        self.assertEqual(t0(ids[2]).parent_id, ids[1])
+        self.assertEqual(t0(ids[5]).parent_id, ids[4])
+
+    def testUniqueConverted(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("code", "integer"))
+        t0.insert(name="old", code=7)
+        stream = StringIO("t0.name,t0.code\r\nnew,007\r\nother,8\r\n")
+        t0.import_from_csv_file(stream, unique="code")
+        rows = db(t0).select(orderby=t0.id)
+        self.assertEqual([(r.name, r.code) for r in rows], [("new", 7), ("other", 8)])
+
+    @unittest.skipIf(not IS_SQLITE, "Needs a case-insensitive collation")
+    def testUniqueCollation(self):
+        db = self.connect()
+        db.executesql(
+            "CREATE TABLE t0 (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " name CHAR(512), code CHAR(512) COLLATE NOCASE);"
+        )
+        t0 = db.define_table("t0", Field("name"), Field("code"), migrate=False)
+        t0.insert(name="old", code="ab")
+        stream = StringIO("t0.name,t0.code\r\nnew,AB\r\nother,cd\r\n")
+        t0.import_from_csv_file(stream, unique="code")
+        rows = db(t0).select(orderby=t0.id)
+        self.assertEqual([(r.name, r.code) for r in rows], [("new", "AB"), ("other", "cd")])
+
+
 class TestDALDictImportExport(unittest.TestCase):
     def testRun(self):
         db = DAL(DEFAULT_URI, check_reserved=["all"])
@@ -3582,6 +3865,262 @@ class TestUpdateInsert(DALtest):
         self.assertTrue(db(t0.name == "web2py2").count() == 1)
 
 
+class TestUpsert(DALtest):
+    def testRun(self):
+        db = self.connect()
+        t0 = db.define_table(
+            "t0", Field("code", unique=True), Field("name"), Field("n", "integer")
+        )
+        i_id = t0.upsert(["code"], code="a", name="first", n=1)
+        u_id = t0.upsert([t0.code], code="a", name="second")
+        if db._adapter.upsert_ids is not None:
+            self.assertEqual(u_id, i_id)
+        row = t0(code="a")
+        self.assertEqual((row.name, row.n), ("second", 1))
+        t0.bulk_upsert(
+            ["code"],
+            [dict(code="a", name="third"), dict(code="b", name="b"),
+             dict(code="c", name="c", n=3)],
+            batch_size=2,
+        )
+        self.assertEqual(db(t0).count(), 3)
+        self.assertEqual(
+            [(r.code, r.name, r.n) for r in db(t0).select(orderby=t0.code)],
+            [("a", "third", 1), ("b", "b", None), ("c", "c", 3)],
+        )
+        with self.assertRaises(SyntaxError):
+            t0.upsert(["code"], name="no code")
+
+    def testUpdateOrInsertOnUniqueKey(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("code", unique=True), Field("name"))
+        i_id = t0.update_or_insert(t0.code == "a", _upsert=True, code="a", name="first")
+        u_id = t0.update_or_insert(
+            dict(code="a"), _upsert=True, code="a", name="second"
+        )
+        self.assertTrue(i_id)
+        self.assertIsNone(u_id)
+        self.assertEqual(db(t0).count(), 1)
+        self.assertEqual(t0(i_id).name, "second")
+
+    def testUpdateOrInsertWithoutUniqueConstraint(self):
+        # unique in Python only: the table has no constraint to conflict on
+        db = self.connect()
+        db.define_table("t0", Field("code"), Field("name"))
+        t0 = db.define_table(
+            "t0",
+            Field("code", unique=True),
+            Field("name"),
+            migrate=False,
+            redefine=True,
+        )
+        i_id = t0.update_or_insert(t0.code == "a", code="a", name="first")
+        u_id = t0.update_or_insert(t0.code == "a", code="a", name="second")
+        self.assertTrue(i_id)
+        self.assertIsNone(u_id)
+        self.assertEqual([r.name for r in db(t0).select()], ["second"])
+
+
+class TestReturning(DALtest):
+    def testRun(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        rows = t0.bulk_insert(
+            [dict(name="a", n=1), dict(name="b", n=2), dict(name="c", n=3)],
+            returning=["id", t0.name],
+        )
+        self.assertEqual([r.name for r in rows], ["a", "b", "c"])
+        self.assertEqual([r.id for r in rows], [r.id for r in db(t0).select(orderby=t0.id)])
+        rows = db(t0.n > 1).update(n=t0.n + 10, _returning=[t0.name, "n"])
+        self.assertEqual(
+            sorted((r.name, r.n) for r in rows), [("b", 12), ("c", 13)]
+        )
+        rows = db(t0.name == "a").delete(_returning=["n"])
+        self.assertEqual([r.n for r in rows], [1])
+        self.assertEqual(db(t0).count(), 2)
+        self.assertEqual(len(db(t0.name == "x").update(n=0, _returning=["id"])), 0)
+        self.assertRaises(TypeError, db(t0.name == "b").delete, ["n"])
+        self.assertRaises(TypeError, db(t0.name == "b")._update, ["n"], n=0)
+        self.assertEqual(db(t0).count(), 2)
+
+    def testWithoutNativeReturning(self):
+        db = self.connect()
+        db._adapter.can_returning = False
+        t0 = db.define_table("t0", Field("name"))
+        rows = t0.bulk_insert([dict(name="a"), dict(name="b")], returning=["name"])
+        self.assertEqual([r.name for r in rows], ["a", "b"])
+        rows = db(t0.name == "a").update(name="z", _returning=["name"])
+        self.assertEqual([r.name for r in rows], ["z"])
+        rows = db(t0.name == "z").delete(_returning=["name"])
+        self.assertEqual([r.name for r in rows], ["z"])
+        self.assertEqual(db(t0).count(), 1)
+
+
+class TestBulkUpdate(DALtest):
+    def _check(self, db):
+        t0 = db.define_table(
+            "t0", Field("name"), Field("n", "integer"), Field("d", "date")
+        )
+        ids = [t0.insert(name="x%s" % i, n=i) for i in range(5)]
+        d = datetime.date(2020, 1, 2)
+        count = t0.bulk_update(
+            [dict(id=ids[0], name="a", n=10), dict(id=ids[1], name="b", n=11),
+             dict(id=ids[3], d=d), dict(id=-1, name="gone")]
+        )
+        self.assertEqual(count, 3)
+        rows = db(t0).select(orderby=t0.id)
+        self.assertEqual(
+            [(r.name, r.n, r.d) for r in rows],
+            [("a", 10, None), ("b", 11, None), ("x2", 2, None), ("x3", 3, d),
+             ("x4", 4, None)],
+        )
+        self.assertEqual(t0.bulk_update([dict(name="a", n=0)], key="name"), 1)
+        self.assertEqual(db(t0.name == "a").select().first().n, 0)
+        self.assertEqual(
+            t0.bulk_update([dict(id=ids[4], name="q", n=7)], fields=["n"]), 1
+        )
+        self.assertEqual(db(t0.id == ids[4]).select().first().name, "x4")
+        with self.assertRaises(SyntaxError):
+            t0.bulk_update([dict(name="a")])
+        return t0
+
+    def testRun(self):
+        db = self.connect()
+        self._check(db)
+
+    def testSmallBatches(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("n", "integer"))
+        ids = [t0.insert(n=i) for i in range(7)]
+        count = t0.bulk_update([dict(id=i, n=-i) for i in ids], batch_size=3)
+        self.assertEqual(count, 7)
+        self.assertEqual(sum(r.n for r in db(t0).select()), -sum(ids))
+
+    @unittest.skipIf(IS_NOSQL, "SQL-only")
+    def testLegacyDialect(self):
+        db = self.connect()
+        db._adapter.compiler = None
+        self._check(db)
+
+    def testRowsSave(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        for i in range(4):
+            t0.insert(name="x%s" % i, n=i)
+        rows = db(t0).select(orderby=t0.id)
+        self.assertEqual(rows.save(), 0)
+        rows[0].name = "a"
+        rows[2].n = 20
+        rows[3].name, rows[3].n = "d", 30
+        # someone else changes a column we did not touch
+        db(t0.id == rows[0].id).update(n=100)
+        self.assertEqual(rows.save(), 3)
+        self.assertEqual(
+            [(r.name, r.n) for r in db(t0).select(orderby=t0.id)],
+            [("a", 100), ("x1", 1), ("x2", 20), ("d", 30)],
+        )
+        self.assertEqual(rows.save(), 0)
+        rows[1].n = 5
+        self.assertEqual(rows.save(), 1)
+        # reordered or filtered rows are still matched to what was selected
+        rows = db(t0).select(orderby=t0.id)
+        rows.records.reverse()
+        rows[0].name = "r"
+        db(t0.id == rows[1].id).update(n=200)
+        self.assertEqual(rows.save(), 1)
+        self.assertIn('"name"=', db._lastsql[0])
+        self.assertNotIn('"n"=', db._lastsql[0])
+        rows = db(t0).select(orderby=t0.id).sort(lambda r: -r.id)
+        rows[0].n = 40
+        self.assertEqual(rows.save(), 1)
+        rows = db(t0).select(orderby=t0.id)
+        rows.exclude(lambda r: r.id == rows[0].id)
+        rows[0].name = "e"
+        self.assertEqual(rows.save(), 1)
+        self.assertEqual(
+            [(r.name, r.n) for r in db(t0).select(orderby=t0.id)],
+            [("a", 100), ("e", 5), ("x2", 200), ("r", 40)],
+        )
+        # a select without the id can't be written back
+        rows = db(t0).select(t0.name)
+        rows[0].name = "z"
+        self.assertEqual(rows.save(), 0)
+
+
+class TestBatch(DALtest):
+    def testRun(self):
+        db = self.connect()
+        person = db.define_table("person", Field("name"))
+        pet = db.define_table("pet", Field("person_id", "reference person"), Field("name"))
+        counter = db.define_table("counter", Field("n", "integer"))
+        counter.insert(n=0)
+        inserted = []
+        pet._after_insert.append(lambda row, id: inserted.append(id))
+        with db.batch() as batch:
+            bob = person.insert(name="Bob")
+            amy = person.insert(name="Amy")
+            pet.insert(person_id=bob, name="Rex")
+            for k in range(3):
+                db(counter.id > 0).update(n=counter.n + 1)
+            self.assertEqual(len(batch), 6)
+            self.assertEqual(inserted, [])
+            with self.assertRaises(SyntaxError):
+                bob.value
+            gone = db(person.name == "nobody").delete()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(int(bob), int(db(person.name == "Bob").select().first().id))
+        self.assertNotEqual(amy.value, bob.value)
+        self.assertEqual(db(pet).select().first().person_id, bob.value)
+        self.assertEqual(inserted, [db(pet).select().first().id])
+        self.assertEqual(db(counter).select().first().n, 3)
+        # row counts are only reported to tables with callbacks that need them
+        self.assertIsNone(gone.value)
+        deleted = []
+        person._after_delete.append(lambda s: deleted.append(s))
+        with db.batch():
+            gone = db(person.name == "Amy").delete()
+            nobody = db(person.name == "nobody").delete()
+        self.assertEqual((gone.value, nobody.value, len(deleted)), (1, 0, 1))
+
+    def testReadsSeeQueuedWrites(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"))
+        with db.batch() as batch:
+            t0.insert(name="a")
+            self.assertEqual(db(t0).count(), 1)
+            self.assertEqual(len(batch), 0)
+            db(t0.name == "a").update(name="b")
+            with db.batch():
+                db(t0.name == "b").update(name="c")
+            self.assertEqual(len(batch), 2)
+        self.assertEqual(db(t0).select().first().name, "c")
+
+    def testReadsFlushRowByRowInserts(self):
+        # keyed tables and _on_insert_error go through insert one by one
+        db = self.connect()
+        k = db.define_table("tk", Field("code"), Field("name"), primarykey=["code"])
+        t0 = db.define_table("t0", Field("name"))
+        t0._on_insert_error = lambda table, fields, e: None
+        with db.batch():
+            k.insert(code="a", name="x")
+            t0.insert(name="y")
+            self.assertEqual(db(k).count(), 1)
+            self.assertEqual(db(t0).count(), 1)
+            rid = t0.insert(name="z")
+        self.assertEqual(int(rid), 2)
+        self.assertEqual(db(t0).count(), 2)
+
+    def testErrorDropsQueue(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"))
+        with self.assertRaises(ZeroDivisionError):
+            with db.batch():
+                t0.insert(name="a")
+                1 / 0
+        self.assertEqual(db(t0).count(), 0)
+        self.assertIsInstance(t0.insert(name="b"), int)
+
+
 class TestBulkInsert(DALtest):
     def testRun(self):
         db = self.connect()
@@ -3694,6 +4233,352 @@ class TestSerializers(DALtest):
             )
 
 
+class TestRecordAttributes(DALtest):
+    def testRun(self):
+        db = self.connect()
+        person = db.define_table("person", Field("name"))
+        pet = db.define_table("pet", Field("name"), Field("person_id", "reference person"))
+        person_id = person.insert(name="amy")
+        pet.insert(name="rex", person_id=person_id)
+        row = db(person).select().first()
+        self.assertIsInstance(row, Row)
+        self.assertIn("update_record", row)
+        self.assertEqual(row.as_dict(), dict(id=person_id, name="amy"))
+        self.assertEqual(
+            sorted(row.keys()), ["delete_record", "id", "name", "pet", "update_record"]
+        )
+        self.assertEqual(sorted(row), sorted(dict(row)))
+        self.assertIn("pet", repr(row))
+        self.assertIs(row.update_record, row.update_record)
+        self.assertIs(row.pet, row["pet"])
+        self.assertEqual(row.pet.select().first().name, "rex")
+        self.assertEqual(row["pet"].count(), 1)
+        row.update_record(name="bob")
+        self.assertEqual(person[person_id].name, "bob")
+        self.assertEqual(type(copy.copy(row)), type(row))
+        self.assertIsNot(copy.copy(row).update_record, row.update_record)
+        self.assertEqual(copy.deepcopy(row).pet.count(), 1)
+        self.assertEqual(pickle.loads(pickle.dumps(row)), Row(id=person_id, name="bob"))
+        self.assertEqual(type(pickle.loads(pickle.dumps(row))), Row)
+        row = db(person).select(rowtype="compact").first()
+        self.assertEqual(
+            sorted(row.keys()), ["delete_record", "id", "name", "pet", "update_record"]
+        )
+        self.assertIs(row.delete_record, row.delete_record)
+        self.assertEqual(pickle.loads(pickle.dumps(row)), Row(id=person_id, name="bob"))
+        rows = db(db.person).select(cacheable=True)
+        self.assertIs(type(rows.first()), Row)
+        # tables and operators defined later are seen
+        db.define_table("toy", Field("person_id", "reference person"))
+        db.record_operators = dict(
+            db.record_operators, greet=lambda row, table, id: "hi %s" % id
+        )
+        row = db(person).select().first()
+        self.assertEqual(row.toy.count(), 0)
+        self.assertEqual(row.greet, "hi %s" % person_id)
+        joined = db(person.id == pet.person_id).select().first()
+        joined.pet.delete_record()
+        self.assertEqual(db(pet).count(), 0)
+
+    def testColumnWins(self):
+        db = self.connect()
+        person = db.define_table("person", Field("pet"))
+        db.define_table("pet", Field("person_id", "reference person"))
+        person.insert(pet="rex")
+        self.assertEqual(db(person).select().first().pet, "rex")
+
+    def testRedefinedReferences(self):
+        db = self.connect()
+        person = db.define_table("person", Field("name"))
+        db.define_table("pet", Field("person_id", "reference person"))
+        person.insert(name="amy")
+        self.assertIn("pet", db(person).select().first())
+        db.pet.drop()
+        db.define_table("toy", Field("person_id", "reference person"))
+        row = db(person).select().first()
+        self.assertNotIn("pet", row)
+        self.assertEqual(row.toy.count(), 0)
+
+
+class TestRowParser(DALtest):
+    def _legacy(self, db, rows):
+        adapter = db._adapter
+        fields_virtual, fields_lazy, tmps = adapter._parse_expand_colnames(rows.fields)
+        return [
+            adapter._parse(row, tmps, rows.fields, rows.colnames, True, False,
+                           fields_virtual, fields_lazy)
+            for row in rows.response
+        ]
+
+    def testSameRowsAsPerCellParse(self):
+        db = self.connect()
+        person = db.define_table(
+            "person",
+            Field("name"),
+            Field("born", "date"),
+            Field("tags", "list:string"),
+            Field("is_on", "boolean"),
+            Field("nick", filter_out=lambda v: v and v.upper()),
+        )
+        pet = db.define_table(
+            "pet", Field("person_id", "reference person"), Field("name")
+        )
+        person.shout = Field.Virtual("shout", lambda r: r.person.name + "!")
+        bob = person.insert(name="Bob", born=datetime.date(2000, 1, 2),
+                            tags=["a"], is_on=True, nick="bobby")
+        person.insert(name="Amy")
+        pet.insert(person_id=bob, name="Rex")
+        selects = [
+            db(person).select(orderby=person.id),
+            db(person.id == pet.person_id).select(),
+            db(person).select(person.name, person.id.count().with_alias("n"),
+                              groupby=person.name),
+            db(person).select(person.name.upper(), person.id),
+            db(pet).select(pet.ALL, person.name,
+                           left=person.on(person.id == pet.person_id)),
+            db(person).select(person.name.with_alias("person.alias")),
+        ]
+        for rows in selects:
+            self.assertEqual(
+                [repr(r) for r in rows.records],
+                [repr(r) for r in self._legacy(db, rows)],
+            )
+        rows = db(person.id == bob).select()
+        self.assertEqual(rows[0].nick, "BOBBY")
+        self.assertEqual(rows[0].shout, "Bob!")
+        self.assertEqual(rows[0].born, datetime.date(2000, 1, 2))
+        self.assertEqual(rows[0].pet.select()[0].name, "Rex")
+
+    def testCachedPerShape(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"))
+        t0.insert(name="x")
+        adapter = db._adapter
+        fields, colnames = [t0.id, t0.name], ["t0.id", "t0.name"]
+        parse_row = adapter._row_parser(fields, colnames)
+        self.assertIs(adapter._row_parser(fields, colnames), parse_row)
+        self.assertIsNot(adapter._row_parser(fields, colnames, cacheable=True),
+                         parse_row)
+        self.assertEqual(parse_row((1, "x")).t0.name, "x")
+        # virtual fields defined after the parser was built still apply
+        t0.upper = Field.Virtual("upper", lambda r: r.t0.name.upper())
+        self.assertEqual(parse_row((1, "x")).t0.upper, "X")
+        self.assertEqual([r.upper for r in db(t0).iterselect()], ["X"])
+
+
+class TestColumnarSelect(DALtest):
+    def testRun(self):
+        db = self.connect()
+        item = db.define_table(
+            "item",
+            Field("name"),
+            Field("qty", "integer"),
+            Field("price", "double"),
+            Field("is_on", "boolean"),
+            Field("tag", filter_out=lambda v: v and v.upper()),
+            Field("parent", "reference item"),
+        )
+        first = item.insert(name="a", qty=1, price=1.5, is_on=True, tag="x")
+        item.insert(name="b", qty=2, price=2.5, is_on=False, parent=first)
+        cols = db(item).select(orderby=item.id, rowtype="columns")
+        self.assertEqual(list(cols), ["item.%s" % name for name in item.fields])
+        self.assertEqual(cols["item.qty"], array.array("q", [1, 2]))
+        self.assertEqual(cols["price"], array.array("d", [1.5, 2.5]))
+        self.assertEqual(cols["is_on"], array.array("b", [1, 0]))
+        self.assertEqual(cols["name"], ["a", "b"])
+        self.assertEqual(cols["tag"], ["X", None])
+        self.assertEqual(cols["parent"], [None, first])
+        cols = db(item).select(
+            item.is_on, item.qty.sum().with_alias("total"), groupby=item.is_on,
+            orderby=item.is_on, rowtype="columns",
+        )
+        self.assertEqual(cols["total"], array.array("q", [2, 1]))
+        empty = db(item.id < 0).select(item.name, item.qty, rowtype="columns")
+        self.assertEqual(dict(empty), {"item.name": [], "item.qty": array.array("q")})
+        with self.assertRaises(KeyError):
+            cols["nothing"]
+        with self.assertRaises(ValueError):
+            db(item).select(rowtype="matrix")
+
+    def testExecutesql(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        t0.insert(name="a", n=3)
+        cols = db.executesql("SELECT id, name, n FROM t0;", rowtype="columns")
+        self.assertEqual(dict(cols), {"id": [1], "name": ["a"], "n": [3]})
+        cols = db.executesql("SELECT id, name, n FROM t0;", fields=t0, rowtype="columns")
+        self.assertEqual(cols["t0.n"], array.array("q", [3]))
+
+    def testConverters(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("n", "integer"))
+        t0.insert(n=3)
+        cols = db(t0).select(t0.n, rowtype="columns")
+        for name, method in (("numpy", cols.to_numpy), ("pandas", cols.to_pandas)):
+            try:
+                __import__(name)
+            except ImportError:
+                self.assertRaises(ImportError, method)
+            else:
+                self.assertEqual(list(method()["t0.n"]), [3])
+
+
+class TestTupleRowtype(DALtest):
+    def testRun(self):
+        db = self.connect()
+        person = db.define_table(
+            "person",
+            Field("name"),
+            Field("born", "date"),
+            Field("tag", filter_out=lambda v: v and v.upper()),
+        )
+        pet = db.define_table(
+            "pet", Field("name"), Field("person_id", "reference person"),
+            Field("is_on", "boolean"),
+        )
+        born = datetime.date(2000, 1, 2)
+        person_id = person.insert(name="amy", born=born, tag="x")
+        pet.insert(name="rex", person_id=person_id, is_on=True)
+        rows = db(person).select(rowtype="tuple")
+        self.assertEqual(rows, [(person_id, "amy", born, "X")])
+        self.assertIs(type(rows[0]), tuple)
+        fields = (person.name, pet.name, pet.is_on, person.born,
+                  pet.id.count().with_alias("total"))
+        joined = db(person.id == pet.person_id)
+        rows = joined.select(*fields, groupby=pet.id, rowtype="namedtuple")
+        record = rows[0]
+        self.assertEqual(record, ("amy", "rex", True, born, 1))
+        self.assertEqual(record._fields,
+                         ("person_name", "pet_name", "is_on", "born", "total"))
+        self.assertEqual((record.person_name, record.is_on), ("amy", True))
+        again = joined.select(*fields, groupby=pet.id, rowtype="namedtuple")
+        self.assertIs(type(again[0]), type(record))
+        self.assertEqual(db(person.id < 0).select(rowtype="tuple"), [])
+        with self.assertRaises(SyntaxError):
+            db(person).select(rowtype="tuple", processor=db._adapter.parse)
+
+    def testExecutesql(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        t0.insert(name="a", n=3)
+        rows = db.executesql("SELECT name, n FROM t0;", fields=[t0.name, t0.n],
+                             rowtype="namedtuple")
+        self.assertEqual((rows[0].name, rows[0].n), ("a", 3))
+        rows = db.executesql("SELECT name, n FROM t0;", rowtype="tuple")
+        self.assertEqual(rows, [("a", 3)])
+
+
+class TestLazyRows(DALtest):
+    def testRun(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        for n in range(5):
+            t0.insert(name="x%s" % n, n=n)
+        rows = db(t0).select(orderby=t0.id, rowtype="lazy")
+        raw = lambda: [r for r in list.__iter__(rows.records) if isinstance(r, tuple)]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(raw()), 5)
+        self.assertEqual(rows.first().name, "x0")
+        self.assertEqual(rows[-1].n, 4)
+        self.assertEqual(len(raw()), 3)
+        self.assertIs(rows[0], rows[0])
+        # a slice is a new Rows, parsing on its own
+        self.assertEqual([r.n for r in rows[1:3]], [1, 2])
+        self.assertEqual(len(raw()), 3)
+        eager = db(t0).select(orderby=t0.id)
+        self.assertEqual(rows, eager)
+        self.assertEqual(raw(), [])
+        rows = db(t0).select(orderby=t0.id, rowtype="lazy")
+        self.assertEqual(len(rows | eager), 5)
+        self.assertEqual(len(eager + rows), 10)
+        self.assertEqual([r.n for r in rows.sort(lambda r: -r.n)], [4, 3, 2, 1, 0])
+        self.assertEqual(rows.as_list(), eager.as_list())
+        rows = db(t0).select(orderby=t0.id, rowtype="lazy")
+        self.assertEqual(pickle.loads(pickle.dumps(rows.records)), eager.records)
+        rows = db(t0).select(orderby=t0.id, rowtype="lazy")
+        self.assertEqual([r.n for r in rows.find(lambda r: r.n % 2)], [1, 3])
+
+    def testUpdateRecord(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"))
+        t0.insert(name="a")
+        row = db(t0).select(rowtype="lazy").first()
+        row.update_record(name="b")
+        self.assertEqual(db(t0).select().first().name, "b")
+
+
+class TestCompactRows(DALtest):
+    def testRun(self):
+        db = self.connect()
+        db.define_table("person", Field("name"), Field("age", "integer"))
+        db.define_table(
+            "pet", Field("name"), Field("person_id", "reference person"),
+            Field("born", "date"),
+        )
+        db.person.upper = Field.Virtual("upper", lambda r: r.person.name.upper())
+        for n in range(3):
+            person_id = db.person.insert(name="p%s" % n, age=n)
+            db.pet.insert(name="d%s" % n, person_id=person_id, born="2024-01-01")
+        rows = db(db.person).select(orderby=db.person.id, rowtype="compact")
+        eager = db(db.person).select(orderby=db.person.id)
+        self.assertEqual(rows.as_list(), eager.as_list())
+        self.assertEqual(repr(rows[0]), repr(eager[0]))
+        row = rows[0]
+        self.assertIsInstance(row, SlotRow)
+        self.assertEqual(row.name, "p0")
+        self.assertEqual(row["name"], "p0")
+        self.assertEqual(row["person.name"], "p0")
+        self.assertEqual(row.upper, "P0")
+        self.assertEqual(row.get("missing", 1), 1)
+        self.assertNotIn("missing", row)
+        # the columns are slots: no __dict__ until another key is set
+        self.assertTrue(row._more)  # the record attributes listed above
+        fresh = db(db.person).select(rowtype="compact").first()
+        self.assertEqual(fresh.upper, "P0")
+        self.assertFalse(fresh._more)
+        self.assertEqual(row.pet.select().first().name, "d0")
+        row.update_record(name="q0")
+        self.assertEqual(row.name, "q0")
+        self.assertEqual(db.person(row.id).name, "q0")
+        row.note = "x"
+        self.assertEqual(row.as_dict()["note"], "x")
+        del row["note"]
+        self.assertNotIn("note", row)
+        loaded = pickle.loads(pickle.dumps(row))
+        self.assertIs(type(loaded), Row)
+        self.assertEqual(loaded, row)
+        self.assertEqual(copy.deepcopy(row), row)
+        # joins, aliases and _extra
+        total = db.person.age.sum().with_alias("total")
+        query = db.person.id == db.pet.person_id
+        args = (db.person.name, db.pet.ALL, total)
+        rows = db(query).select(*args, groupby=db.pet.id, rowtype="compact")
+        eager = db(query).select(*args, groupby=db.pet.id)
+        self.assertEqual(rows.as_list(), eager.as_list())
+        self.assertEqual(rows[0].total, 0)
+        self.assertEqual(rows[0]["pet.born"], datetime.date(2024, 1, 1))
+        self.assertEqual(rows[0].pet.person_id.name, "q0")
+
+    def testMemory(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        fields = list(t0)
+        colnames = [f.longname for f in fields]
+        raw = [(k, "x", k) for k in range(1000)]
+        adapter = db._adapter
+
+        def size(parse):
+            parse(raw[:1], fields, colnames)
+            tracemalloc.start()
+            rows = parse(raw, fields, colnames)
+            used = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            self.assertEqual(len(rows), 1000)
+            return used
+
+        self.assertLess(size(adapter.parse_compact), size(adapter.parse) * 0.6)
+
+
 class TestIterselect(DALtest):
     def testRun(self):
         db = self.connect()
@@ -3749,6 +4634,72 @@ class TestIterselect(DALtest):
         for n in names:
             self.assertEqual(next(rows).t0.name, n)
 
+    def testBatches(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("nn", "integer"))
+        for n in range(5):
+            t0.insert(nn=n)
+        rows = db(t0).iterselect(orderby=t0.id, batch_size=2)
+        self.assertIsNot(rows.cursor, db._adapter.cursor)
+        self.assertEqual(next(rows).nn, 0)
+        self.assertEqual(len(rows._buffer), 1)
+        others = db(t0).iterselect(t0.nn, orderby=~t0.id)
+        self.assertEqual(db(t0).count(), 5)
+        self.assertEqual([r.nn for r in others], [4, 3, 2, 1, 0])
+        self.assertEqual([r.nn for r in rows], [1, 2, 3, 4])
+        self.assertIsNone(rows.cursor)
+        rows = db(t0).iterselect(orderby=t0.id, batch_size=2)
+        next(rows)
+        rows.close()
+        self.assertRaises(StopIteration, next, rows)
+
+    @unittest.skipIf(not IS_SQLITE, "Needs a second connection to a sqlite file")
+    def testStreamBlocksConnection(self):
+        import shutil
+        import tempfile
+
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        db = self.connect("sqlite://streams.sqlite", folder=folder)
+        t0 = db.define_table("t0", Field("nn", "integer"))
+        for n in range(6):
+            t0.insert(nn=n)
+        db.commit()
+        adapter = db._adapter
+        # as on MySQL: each stream reads on a connection of its own
+        adapter.stream_blocks_connection = True
+        try:
+            up = db(t0).iterselect(orderby=t0.id, batch_size=2)
+            down = db(t0).iterselect(orderby=~t0.id, batch_size=2)
+            self.assertIsNot(up._connection, adapter.connection)
+            self.assertIsNot(up._connection, down._connection)
+            self.assertIs(up.cursor.connection, up._connection)
+            pairs = []
+            for _ in range(6):
+                pairs.append((next(up).nn, next(down).nn))
+                self.assertEqual(db(t0).count(), 6)
+                # nothing is read ahead beyond the current batch
+                self.assertLessEqual(len(up._buffer), 1)
+                self.assertLessEqual(len(down._buffer), 1)
+            self.assertEqual(pairs, [(n, 5 - n) for n in range(6)])
+            self.assertRaises(StopIteration, next, up)
+            self.assertIsNone(up._connection)
+            down.close()
+            self.assertIsNone(down._connection)
+            # a rollback, or dropping the iterator, lets the cursor go
+            rows = db(t0).iterselect(batch_size=2)
+            next(rows)
+            db.rollback()
+            self.assertIsNone(rows._connection)
+            self.assertRaises(StopIteration, next, rows)
+            rows = db(t0).iterselect(batch_size=2)
+            next(rows)
+            self.assertEqual(len(adapter._streams), 1)
+            del rows
+            self.assertEqual(len(adapter._streams), 0)
+        finally:
+            del adapter.stream_blocks_connection
+
     @unittest.skipIf(IS_MSSQL, "Skip mssql")
     def testMultiSelect(self):
         # Iterselect holds the cursors until all elemets have been evaluated
@@ -3798,6 +4749,79 @@ class TestIterselect(DALtest):
         db._adapter.test_connection()
 
 
+
+class TestStreamSerialization(DALtest):
+    def testJson(self):
+        db = self.connect()
+        db.define_table("person", Field("name"), Field("born", "datetime"))
+        db.define_table("pet", Field("name"), Field("person_id", "reference person"))
+        for n in range(3):
+            person_id = db.person.insert(name="p%s" % n, born="2024-01-02 10:00:00")
+            db.pet.insert(name="d%s" % n, person_id=person_id)
+        query = db.person.id == db.pet.person_id
+        for q, args in ((db(db.person), ()), (db(query), (db.pet.name, db.person.ALL))):
+            out = StringIO()
+            q.stream_json(out, *args, orderby=db.person.id, batch_size=2)
+            self.assertEqual(
+                json.loads(out.getvalue()),
+                json.loads(q.select(*args, orderby=db.person.id).as_json()),
+            )
+        out = StringIO()
+        db(db.person.id < 0).stream_json(out)
+        self.assertEqual(out.getvalue(), "[]")
+        # the stdlib encoder writes what as_json writes
+        orjson = serializers_module.orjson
+        serializers_module.orjson = None
+        try:
+            out = StringIO()
+            db(db.person).stream_json(out, orderby=db.person.id)
+            self.assertEqual(
+                out.getvalue(), db(db.person).select(orderby=db.person.id).as_json()
+            )
+        finally:
+            serializers_module.orjson = orjson
+        Serializers._custom_["json_encoder"] = lambda value: str(value["id"])
+        try:
+            out = StringIO()
+            db(db.person).stream_json(out, orderby=db.person.id)
+            self.assertEqual(out.getvalue(), "[1, 2, 3]")
+        finally:
+            del Serializers._custom_["json_encoder"]
+
+    def testCsv(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        t0.bulk_insert([dict(name="x%s" % n, n=n or None) for n in range(3)])
+        out = StringIO()
+        db(t0).stream_csv(out, t0.name, t0.n, orderby=~t0.id, null="")
+        rows = db(t0).select(t0.name, t0.n, orderby=~t0.id)
+        self.assertEqual(out.getvalue(), str(rows).replace("<NULL>", ""))
+        out = StringIO()
+        db(t0).stream_csv(out, delimiter=";", write_colnames=False, orderby=t0.id)
+        self.assertEqual(out.getvalue().splitlines()[1], "2;x1;1")
+
+    def testMemory(self):
+        db = self.connect()
+        t0 = db.define_table("t0", Field("name"), Field("n", "integer"))
+        t0.bulk_insert([dict(name="x" * 50, n=n) for n in range(2000)])
+
+        class Sink(object):
+            def write(self, text):
+                pass
+
+        def peak(n):
+            query = db(t0.id <= n)
+            tracemalloc.start()
+            query.stream_json(Sink(), batch_size=100)
+            query.stream_csv(Sink(), batch_size=100)
+            used = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return used
+
+        peak(10)
+        self.assertLess(peak(2000), peak(200) * 1.5)
+
+
 if __name__ == "__main__":
     unittest.main()
     tearDownModule()